@@ -0,0 +1,233 @@
+"""
+Module Name: analysis.py
+
+    Position analysis API. A position is written as a string of column letters, the same letters as the move
+    dictionary from create_move_dict (e.g. "DDCEF" = Player 1 played D, Player 2 played D, Player 1 played C...).
+    analyze_position() returns the value of every legal column for one position, analyze_many() does the same for
+    a whole file or list of positions on a process pool. \n
+    Scores are from the point of view of the player to move: positive is good for them, 0 is even.
+    Anything above searchlogic.WIN_SCORE - (rows * columns) is a forced win, anything below the negative of that is a forced loss.
+
+    With --rollouts N, every position also gets the win rate of each column over N random playouts per column
+    (rolloutlogic's NumPy batch kernel), as a quick second opinion next to the search scores.
+
+    Usage: python analysis.py positions.txt --rows 6 --columns 7 --depth 6
+           python analysis.py positions.txt --rollouts 2000 --rollout-bias 0.5
+"""
+
+from __future__ import annotations
+from typing import *
+import argparse
+import json
+import os
+from collections import OrderedDict
+from string import ascii_uppercase
+
+from bitboard import BitBoard
+from searchlogic import NegamaxSearch
+
+
+DEFAULT_DEPTH = 6
+RESULT_CACHE_SIZE = 100_000                 # positions kept in the parent's result cache
+BATCH_SIZE = 1024                           # positions sent to the pool at a time
+DEFAULT_ROLLOUTS = 1000                     # random playouts per column for rollout_scores
+
+
+class PositionAnalysis(NamedTuple):
+
+    moves: str                              # the move string that was analyzed
+    status: str                             # "ok", "won" (the game was already over), "full" or "invalid: <reason>"
+    scores: Dict[str, int]                  # column letter -> score, for every legal column
+    best_move: Optional[str]
+    best_score: Optional[int]
+    nodes: int
+
+    def to_dict(self) -> dict:
+
+        return self._asdict()
+
+
+##########   Parsing   ###########
+
+def parse_move_string(move_string: str, rows: int, columns: int) -> BitBoard:
+    """ Plays the move string onto a new BitBoard. Raises ValueError if a letter is not a column or a column is full. """
+
+    board = BitBoard(rows, columns)
+    for position, letter in enumerate(move_string.strip().upper()):
+        col = ascii_uppercase.find(letter)
+        if col < 0 or col >= columns:
+            raise ValueError(f"'{letter}' at move {position + 1} is not a column on a {rows}x{columns} board.")
+        if not board.can_play(col):
+            raise ValueError(f"Column {letter} is already full at move {position + 1}.")
+        if board.moves and board.last_move_won():
+            raise ValueError(f"The game was already won before move {position + 1}.")
+        board.play(col)
+    return board
+
+
+##########   Single position   ###########
+
+def _search_scores(board: BitBoard, search: NegamaxSearch) -> Tuple[Dict[int, int], int]:
+    """ Exact score for every legal column, keyed by column index. """
+
+    result = search.search(board, all_scores=True)
+    return result.scores, result.nodes
+
+
+def _build_analysis(move_string: str, scores: Dict[int, int], nodes: int) -> PositionAnalysis:
+
+    letter_scores = {ascii_uppercase[col]: score for col, score in sorted(scores.items())}
+    best_col = max(scores, key=lambda col: scores[col])
+    return PositionAnalysis(move_string, "ok", letter_scores, ascii_uppercase[best_col], scores[best_col], nodes)
+
+
+def _finished_analysis(move_string: str, board: BitBoard) -> Optional[PositionAnalysis]:
+    """ Returns an analysis for positions where there's nothing to search, otherwise None. """
+
+    if board.moves and board.last_move_won():
+        return PositionAnalysis(move_string, "won", {}, None, None, 0)
+    if board.is_full():
+        return PositionAnalysis(move_string, "full", {}, None, None, 0)
+    return None
+
+
+def analyze_position(move_string: str, rows: int = 6, columns: int = 7, depth: int = DEFAULT_DEPTH,
+                     search: Optional[NegamaxSearch] = None) -> PositionAnalysis:
+    """ Returns the value of every legal column in the position. Pass the same NegamaxSearch in again
+    to keep its transposition table warm between positions. """
+
+    board = parse_move_string(move_string, rows, columns)
+    finished = _finished_analysis(move_string, board)
+    if finished:
+        return finished
+
+    search = search or NegamaxSearch(depth)
+    scores, nodes = _search_scores(board, search)
+    return _build_analysis(move_string, scores, nodes)
+
+
+def rollout_scores(move_string: str, rows: int = 6, columns: int = 7, playouts_per_move: int = DEFAULT_ROLLOUTS,
+                   bias: float = 0.0, seed: Optional[int] = None) -> Dict[str, float]:
+    """ Column letter -> win rate of that move over random playouts (draws count as half), for the player to move.
+    Empty if the game is already over. Needs NumPy, which is only imported here. """
+
+    from rolloutlogic import batch_rollouts, numpy_from_bitboard
+
+    board = parse_move_string(move_string, rows, columns)
+    if _finished_analysis(move_string, board):
+        return {}
+    stats = batch_rollouts(numpy_from_bitboard(board), board.player_to_move, playouts_per_move, bias, seed)
+    return {ascii_uppercase[col]: round(column_stats.score, 4) for col, column_stats in sorted(stats.items())}
+
+
+##########   Batch analysis   ###########
+
+_worker_searches: Dict[Tuple[int, int, int], NegamaxSearch] = {}
+
+
+def _analyze_worker(move_string: str, rows: int, columns: int, depth: int) -> Tuple[Dict[int, int], int]:
+    """ Worker task. Each worker keeps one NegamaxSearch per board size and depth, so its transposition table
+    is shared by every position that worker analyzes. """
+
+    settings = (rows, columns, depth)
+    if settings not in _worker_searches:
+        _worker_searches[settings] = NegamaxSearch(depth)
+    board = parse_move_string(move_string, rows, columns)
+    return _search_scores(board, _worker_searches[settings])
+
+
+def read_positions(source: Union[str, Iterable[str]]) -> Iterator[str]:
+    """ Accepts a file path or any iterable of move strings. Blank lines and lines starting with # are skipped. """
+
+    if isinstance(source, str):
+        with open(source, "r", encoding="utf-8") as file:
+            yield from read_positions(file)                    # streams the file, it's never read in all at once
+        return
+
+    for line in source:
+        line = line.strip()
+        if line and not line.startswith("#"):
+            yield line
+
+
+def analyze_many(source: Union[str, Iterable[str]], rows: int = 6, columns: int = 7, depth: int = DEFAULT_DEPTH,
+                 workers: Optional[int] = None) -> Iterator[PositionAnalysis]:
+    """ Analyzes many positions on a process pool and yields the results in the same order as the input. \n
+    Results are cached by canonical (mirror-symmetric) position key, so repeated positions and mirror images
+    of positions that were already analyzed are not searched again. """
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    workers = workers or os.cpu_count() or 1
+    cache: OrderedDict[int, Tuple[Dict[int, int], int]] = OrderedDict()     # canonical key -> (scores in canonical orientation, nodes)
+
+    def to_canonical(scores: Dict[int, int], board: BitBoard) -> Dict[int, int]:
+        """ Flipping is its own inverse, so the same function goes both ways. """
+        if not board.is_mirrored():
+            return scores
+        return {board.mirror_column(col): score for col, score in scores.items()}
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        positions = read_positions(source)
+
+        while True:
+            batch = [move_string for _, move_string in zip(range(BATCH_SIZE), positions)]
+            if not batch:
+                break
+
+            # parse everything in the parent first. It's cheap, and it tells us which positions are repeats
+            parsed: List[Tuple[str, Optional[BitBoard], Optional[PositionAnalysis]]] = []
+            to_search: Dict[int, str] = {}
+            for move_string in batch:
+                try:
+                    board = parse_move_string(move_string, rows, columns)
+                except ValueError as e:
+                    parsed.append((move_string, None, PositionAnalysis(move_string, f"invalid: {e}", {}, None, None, 0)))
+                    continue
+                finished = _finished_analysis(move_string, board)
+                parsed.append((move_string, board, finished))
+                if finished is None:
+                    key = board.canonical_key()
+                    if key not in cache and key not in to_search:
+                        to_search[key] = move_string
+
+            keys = list(to_search)
+            results = pool.map(_analyze_worker, [to_search[key] for key in keys], [rows] * len(keys),
+                               [columns] * len(keys), [depth] * len(keys), chunksize=max(1, len(keys) // (workers * 4)))
+            for key, (scores, nodes) in zip(keys, results):
+                searched_board = parse_move_string(to_search[key], rows, columns)
+                cache[key] = (to_canonical(scores, searched_board), nodes)
+
+            for move_string, board, finished in parsed:
+                if finished is not None:
+                    yield finished
+                    continue
+                key = board.canonical_key()
+                canonical_scores, nodes = cache[key]
+                cache.move_to_end(key)
+                yield _build_analysis(move_string, to_canonical(canonical_scores, board), nodes)
+
+            while len(cache) > RESULT_CACHE_SIZE:
+                cache.popitem(last=False)                      # forget the least recently used positions
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Analyze Connect Four positions given as column-letter move strings.")
+    parser.add_argument("positions", help="File with one move string per line, e.g. DDCEF")
+    parser.add_argument("--rows", type=int, default=6)
+    parser.add_argument("--columns", type=int, default=7)
+    parser.add_argument("--depth", type=int, default=DEFAULT_DEPTH)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--rollouts", type=int, default=0, help="Also add win rates from N random playouts per column (needs NumPy).")
+    parser.add_argument("--rollout-bias", type=float, default=0.0, help="0 is uniformly random, higher prefers the center columns.")
+    args = parser.parse_args()
+
+    if args.rollouts < 0 or args.rollout_bias < 0:
+        parser.error("--rollouts and --rollout-bias can't be negative.")
+
+    for analysis in analyze_many(args.positions, args.rows, args.columns, args.depth, args.workers):
+        record = analysis.to_dict()
+        if args.rollouts and analysis.status == "ok":
+            record["rollouts"] = rollout_scores(analysis.moves, args.rows, args.columns, args.rollouts, args.rollout_bias)
+        print(json.dumps(record), flush=True)
@@ -0,0 +1,132 @@
+"""
+Module Name: analysisworker.py
+
+    Long-running analysis process for pipelines. Reads one JSON request per line from stdin and writes one JSON
+    answer per line to stdout, flushing after every line. The search and its transposition table stay alive between
+    requests, so later requests reuse the work done by earlier ones. \n
+    Request:  {"id": 1, "rows": 6, "columns": 7, "moves": "DDCEF", "time": 0.5, "nodes": 100000, "depth": 12}
+              Only "moves" is required. "time" (seconds), "nodes" and "depth" are limits, whichever runs out first.
+    Answer:   {"id": 1, "status": "ok", "best_move": "D", "scores": {"A": 0, ...}, "nodes": 5012, "time": 0.21, "depth": 7}
+
+    Usage: python analysisworker.py < requests.jsonl > answers.jsonl
+"""
+
+from __future__ import annotations
+from typing import *
+import json
+import math
+import sys
+from collections import OrderedDict
+from string import ascii_uppercase
+
+from searchlogic import NegamaxSearch
+from analysis import parse_move_string
+
+
+DEFAULT_TIME_LIMIT = 1.0                    # seconds, used when a request has no limits at all
+MAX_BOARD_SIZES = 4                         # searches (and their tables) kept for this many board sizes at once
+TT_ENTRIES_PER_SIZE = 200_000               # keeps the memory use bounded no matter how many requests come in
+MAX_TIME_LIMIT = 3600.0                     # seconds. Limits outside these bounds get an error answer
+MAX_NODE_LIMIT = 10 ** 10
+MAX_DEPTH = 20 * 26                         # every cell of the biggest board
+
+
+def read_number(request: dict, name: str, low: float, high: float, whole: bool) -> Optional[Union[int, float]]:
+    """ Returns request[name] checked to be a finite number between low and high (an int if whole), or None if
+    it's missing. Raises ValueError otherwise, e.g. for 1e400, which JSON turns into infinity. """
+
+    value = request.get(name)
+    if value is None:
+        return None
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise ValueError(f"'{name}' must be a number.")
+    if not math.isfinite(value) or not low <= value <= high:
+        raise ValueError(f"'{name}' must be between {low} and {high}.")
+    if whole:
+        if value != int(value):
+            raise ValueError(f"'{name}' must be a whole number.")
+        return int(value)
+    return float(value)
+
+
+class AnalysisWorker:
+    """ Answers analysis requests. Keeps one NegamaxSearch per board size, least recently used sizes are dropped. """
+
+    def __init__(self):
+        self.searches: OrderedDict[Tuple[int, int], NegamaxSearch] = OrderedDict()
+
+    def get_search(self, rows: int, columns: int) -> NegamaxSearch:
+
+        size = (rows, columns)
+        if size in self.searches:
+            self.searches.move_to_end(size)
+        else:
+            self.searches[size] = NegamaxSearch(1, TT_ENTRIES_PER_SIZE)
+            while len(self.searches) > MAX_BOARD_SIZES:
+                self.searches.popitem(last=False)
+        return self.searches[size]
+
+    def handle(self, request: dict) -> dict:
+
+        rows = read_number(request, "rows", 4, 20, whole=True) or 6
+        columns = read_number(request, "columns", 4, 26, whole=True) or 7
+
+        moves = str(request.get("moves", ""))
+        time_limit = read_number(request, "time", 0.001, MAX_TIME_LIMIT, whole=False)    # all checked before anything runs
+        node_limit = read_number(request, "nodes", 1, MAX_NODE_LIMIT, whole=True)
+        max_depth = read_number(request, "depth", 1, MAX_DEPTH, whole=True)
+        if time_limit is None and node_limit is None and max_depth is None:
+            time_limit = DEFAULT_TIME_LIMIT
+
+        board = parse_move_string(moves, rows, columns)
+        answer = {"id": request.get("id"), "moves": moves}
+
+        if board.moves and board.last_move_won():
+            answer.update(status="won")
+            return answer
+        if board.is_full():
+            answer.update(status="full")
+            return answer
+
+        search = self.get_search(rows, columns)
+        result = search.search_with_budget(board, time_limit=time_limit, node_limit=node_limit, max_depth=max_depth,
+                                           all_scores=True)
+        answer.update(
+            status="ok",
+            best_move=ascii_uppercase[result.column],
+            best_score=result.score,
+            scores={ascii_uppercase[col]: score for col, score in sorted(result.scores.items())},
+            nodes=result.nodes,
+            time=round(result.elapsed, 4),
+            depth=result.depth,
+        )
+        return answer
+
+
+def run(input_stream: TextIO = sys.stdin, output_stream: TextIO = sys.stdout) -> None:
+    """ Main loop. A bad request gets an error answer, it never stops the worker. Ends when the input is closed. """
+
+    worker = AnalysisWorker()
+    for line in input_stream:
+        line = line.strip()
+        if not line:
+            continue
+
+        request_id = None
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError("Request must be a JSON object.")
+            request_id = request.get("id")
+            answer = worker.handle(request)
+        except (ValueError, TypeError) as e:                   # json.JSONDecodeError is a ValueError too
+            answer = {"id": request_id, "status": "error", "error": str(e)}
+        except Exception as e:                                 # anything else is a bug, but it still only fails this request
+            answer = {"id": request_id, "status": "error", "error": f"{type(e).__name__}: {e}"}
+
+        output_stream.write(json.dumps(answer) + "\n")
+        output_stream.flush()                                  # the other end of the pipe is waiting for this line
+
+
+if __name__ == "__main__":
+    run()
@@ -99,6 +99,50 @@ def get_size(obj: object) -> int:
     return size_mb
 
 
+def get_deep_size(obj: object, exclude: Iterable[object] = ()) -> int:
+    """ Get the size of an object in bytes, including everything it holds (containers, attributes, slots).
+    get_size only measures the object itself. Each object is counted once even if it's referenced more than once. \n
+    Anything in exclude isn't counted or followed. Use it to keep back-references (e.g. to a manager object) from
+    pulling the whole program into the count. Classes, modules, functions and Enum members are never counted. """
+
+    import types
+    skip_types = (type, types.ModuleType, types.FunctionType, types.BuiltinFunctionType, types.MethodType, Enum)
+
+    seen = {id(excluded) for excluded in exclude}
+    stack = [obj]
+    total = 0
+    while stack:                                  # not recursive, some of the game's structures are very deep
+        current = stack.pop()
+        if id(current) in seen or isinstance(current, skip_types):
+            continue
+        seen.add(id(current))
+        total += sys.getsizeof(current)
+
+        if isinstance(current, dict):
+            stack.extend(current.keys())
+            stack.extend(current.values())
+        elif isinstance(current, (list, tuple, set, frozenset, deque)):
+            stack.extend(current)
+        if hasattr(current, "__dict__"):
+            stack.append(vars(current))
+        slots = getattr(type(current), "__slots__", ())
+        for slot in ([slots] if isinstance(slots, str) else slots):
+            if hasattr(current, slot):
+                stack.append(getattr(current, slot))
+    return total
+
+
+def format_bytes(size_bytes: int) -> str:
+    """ Human readable size, e.g. 1536 -> '1.5 KB'. """
+
+    size = float(size_bytes)
+    for unit in ["B", "KB", "MB"]:
+        if abs(size) < 1024:
+            return f"{size:.1f} {unit}" if unit != "B" else f"{int(size)} B"
+        size /= 1024
+    return f"{size:.1f} GB"
+
+
 
 def print_env_variables(custom_variables: List[str] = None) -> None:
     """ Pass no arguments to print the default list of environment variables.
@@ -191,14 +235,15 @@ def format_elapsed(elapsed_time: float) -> str:
 
 
 
-def thread_runner(target) -> None:
-    """ Runs a function that you pass into it in a separate thread."""
+def thread_runner(target) -> threading.Thread:
+    """ Runs a function that you pass into it in a separate thread. Returns the thread, in case you want to join() it."""
 
     threadded = threading.Thread(target=target)
     threadded.daemon = True    # daemon threads are killed when the main program exits
     threadded.start()
 
     logging.debug(color(f"threadded.is_alive() = {threadded.is_alive()}"))
+    return threadded
 
 
 def count_lines_of_code(file_path, remove_comments=False):
@@ -0,0 +1,245 @@
+"""
+Module Name: bitboard.py
+
+    Holds the BitBoard class. This is a compact copy of the game position that the search code uses instead of
+    the grid of Cell objects. Each player's discs are stored as bits inside a single Python int, so placing a disc,
+    taking it back and checking for four in a row are all just a handful of integer operations.
+"""
+
+from __future__ import annotations
+from typing import *
+
+from cfenums import CellState
+
+if TYPE_CHECKING:
+    from gridmaker import Grid
+
+
+""" Notes about the bit layout:
+Every column gets (rows + 1) bits. The bottom cell of column 0 is bit 0, the cell above it is bit 1, and so on.
+The extra bit at the top of each column is always empty. It acts as a 'sentinel' so that shifting a line of discs
+never wraps around from the top of one column into the bottom of the next one.
+
+    Grid cell (x, y) -> bit  y * (rows + 1) + (rows - 1 - x)       (x = 0 is the TOP row in the Grid class)
+
+Python ints have no size limit, so this works for every board size the game allows (up to 20x26). """
+
+
+class BitBoard:
+    """ Bit-packed Connect Four position. \n
+    current holds the discs of the player whose turn it is, mask holds every disc on the board. """
+
+    def __init__(self, rows: int, columns: int):
+        self.rows = rows
+        self.columns = columns
+        self.stride = rows + 1                             # bits per column, including the sentinel bit
+        self.current = 0                                   # discs of the player to move
+        self.mask = 0                                      # all discs on the board
+        self.moves = 0                                     # number of discs played so far
+        self.heights = [0] * columns                       # number of discs in each column
+        self.history: List[int] = []                       # column indices, in the order they were played
+        self.mirror_current = 0                            # same as current and mask, but flipped left to right.
+        self.mirror_mask = 0                               # kept up to date on every move for canonical_key()
+        self.bottom_mask = sum(1 << (col * self.stride) for col in range(columns))     # bottom cell of every column
+        self.board_mask = self.bottom_mask * ((1 << rows) - 1)                         # every real cell, no sentinel bits
+
+    ##############  Constructors  ##############
+
+    @classmethod
+    def from_moves(cls, rows: int, columns: int, moves: Iterable[int]) -> BitBoard:
+        """ Builds a board by playing a sequence of column indices, Player 1 first. """
+
+        board = cls(rows, columns)
+        for col in moves:
+            if not board.can_play(col):
+                raise ValueError(f"Invalid move sequence: column {col} is full or out of range.")
+            board.play(col)
+        return board
+
+    @classmethod
+    def from_grid(cls, grid: Grid, player_num: int) -> BitBoard:
+        """ Copies a Grid into a new BitBoard. player_num is the player whose turn it is (1 or 2). \n
+        The move history is not known when copying a grid, so board.history starts out empty. """
+
+        board = cls(grid.rows, grid.columns)
+        player_bits = 0
+        for x, row in enumerate(grid.grid_matrix):
+            for y, cell in enumerate(row):
+                if cell.cell_state == CellState.EMPTY:
+                    continue
+                bit = 1 << board.bit_index(x, y)
+                mirror_bit = 1 << board.bit_index(x, grid.columns - 1 - y)
+                board.mask |= bit
+                board.mirror_mask |= mirror_bit
+                board.heights[y] += 1
+                if cell.cell_state.value == player_num:
+                    player_bits |= bit
+                    board.mirror_current |= mirror_bit
+
+        board.current = player_bits
+        board.moves = sum(board.heights)
+        return board
+
+    def copy(self) -> BitBoard:
+
+        board = BitBoard.__new__(BitBoard)
+        board.rows = self.rows
+        board.columns = self.columns
+        board.stride = self.stride
+        board.current = self.current
+        board.mask = self.mask
+        board.moves = self.moves
+        board.heights = self.heights[:]
+        board.history = self.history[:]
+        board.mirror_current = self.mirror_current
+        board.mirror_mask = self.mirror_mask
+        board.bottom_mask = self.bottom_mask
+        board.board_mask = self.board_mask
+        return board
+
+    ##############  Coordinates  ##############
+
+    def bit_index(self, x: int, y: int) -> int:
+        """ Converts Grid coordinates (x = row from the top, y = column) into a bit index. """
+
+        return y * self.stride + (self.rows - 1 - x)
+
+    def grid_row(self, col: int) -> int:
+        """ Returns the Grid row (x) that the next disc dropped in this column would land in. """
+
+        return self.rows - 1 - self.heights[col]
+
+    ##############  Moves  ##############
+
+    def can_play(self, col: int) -> bool:
+
+        return 0 <= col < self.columns and self.heights[col] < self.rows
+
+    def legal_columns(self) -> List[int]:
+
+        return [col for col in range(self.columns) if self.heights[col] < self.rows]
+
+    def move_bit(self, col: int) -> int:
+        """ The bit the next disc in this column would occupy. """
+
+        return 1 << (col * self.stride + self.heights[col])
+
+    def mirror_move_bit(self, col: int) -> int:
+        """ Same as move_bit, but for the mirrored board (column col lands in column columns - 1 - col). """
+
+        return 1 << ((self.columns - 1 - col) * self.stride + self.heights[col])
+
+    def play(self, col: int) -> None:
+        """ Drops a disc for the player to move. Does NOT check if the column is full. """
+
+        self.current ^= self.mask                          # current now holds the opponent's discs (they move next)
+        self.mask |= self.move_bit(col)
+        self.mirror_current ^= self.mirror_mask
+        self.mirror_mask |= self.mirror_move_bit(col)
+        self.heights[col] += 1
+        self.moves += 1
+        self.history.append(col)
+
+    def undo(self) -> int:
+        """ Takes back the last move and returns its column index. """
+
+        col = self.history.pop()
+        self.heights[col] -= 1
+        self.moves -= 1
+        self.mask ^= self.move_bit(col)
+        self.current ^= self.mask
+        self.mirror_mask ^= self.mirror_move_bit(col)
+        self.mirror_current ^= self.mirror_mask
+        return col
+
+    ##############  Win detection  ##############
+
+    def has_four(self, bits: int) -> bool:
+        """ Checks a set of discs for four in a row in any direction. """
+
+        # vertical: 1, horizontal: stride, the two diagonals: stride - 1 and stride + 1
+        for shift in (1, self.stride, self.stride - 1, self.stride + 1):
+            pairs = bits & (bits >> shift)
+            if pairs & (pairs >> (2 * shift)):
+                return True
+        return False
+
+    def is_winning_move(self, col: int) -> bool:
+        """ Checks if the player to move would win by playing this column. """
+
+        return self.has_four(self.current | self.move_bit(col))
+
+    def last_move_won(self) -> bool:
+        """ Checks if the player who just moved has four in a row. """
+
+        return self.has_four(self.current ^ self.mask)
+
+    ##############  Threats  ##############
+
+    def winning_cells(self, bits: int) -> int:
+        """ Every EMPTY cell that would complete four in a row for the discs in bits, found in one pass over the
+        whole board (no trial moves). The cells don't have to be playable yet, a threat can be floating in the air. \n
+        For each direction it lines up the discs shifted by 1, 2 and 3 steps. A cell is a winning cell if the 3 other
+        cells of some line through it are all filled: xxx_ , xx_x , x_xx or _xxx. """
+
+        # vertical: only xxx_ is possible, the empty cell has to be on top
+        cells = (bits << 1) & (bits << 2) & (bits << 3)
+
+        for shift in (self.stride, self.stride - 1, self.stride + 1):
+            pairs = (bits << shift) & (bits << 2 * shift)
+            cells |= pairs & (bits << 3 * shift)                # xxx_
+            cells |= pairs & (bits >> shift)                    # xx_x
+            pairs = (bits >> shift) & (bits >> 2 * shift)
+            cells |= pairs & (bits << shift)                    # x_xx
+            cells |= pairs & (bits >> 3 * shift)                # _xxx
+
+        return cells & (self.board_mask ^ self.mask)           # only empty cells that are really on the board
+
+    def playable_mask(self) -> int:
+        """ The cell each non-full column would take next, as one bitmask. Adding the bottom row to the mask carries
+        each column up into its first empty cell. """
+
+        return (self.mask + self.bottom_mask) & self.board_mask
+
+    def is_full(self) -> bool:
+
+        return self.moves == self.rows * self.columns
+
+    ##############  Misc  ##############
+
+    @property
+    def player_to_move(self) -> int:
+        """ Player 1 always moves first, so the move count tells us whose turn it is. """
+
+        return 1 if self.moves % 2 == 0 else 2
+
+    def key(self) -> int:
+        """ Unique integer key for the position. Adding mask sets one extra bit on top of each column,
+        which is enough to tell the two players' discs apart without storing them separately. """
+
+        return self.current + self.mask
+
+    def mirror_key(self) -> int:
+        """ key() of the same position flipped left to right. """
+
+        return self.mirror_current + self.mirror_mask
+
+    def canonical_key(self) -> int:
+        """ Same key for a position and its mirror image. Use this for anything that caches or counts positions,
+        since a position and its mirror always have the same value (just with the columns flipped). """
+
+        return min(self.current + self.mask, self.mirror_current + self.mirror_mask)
+
+    def is_mirrored(self) -> bool:
+        """ True if canonical_key() comes from the mirrored board. Anything stored per column under the
+        canonical key has to be flipped with mirror_column() when this is True. """
+
+        return self.mirror_current + self.mirror_mask < self.current + self.mask
+
+    def mirror_column(self, col: int) -> int:
+
+        return self.columns - 1 - col
+
+    def __repr__(self) -> str:
+
+        return f"BitBoard({self.rows}x{self.columns}, moves: {self.moves}, history: {self.history})"
@@ -2,7 +2,7 @@
 Module Name: cfenums.py
 
     'CF Enums' stands for 'Connect Four Enums'. \n
-    Contains the 3 enums used in the Connect Four game. Needs to be in its own file so it can be imported and used in all the other modules.
+    Contains the enums used in the Connect Four game. Needs to be in its own file so it can be imported and used in all the other modules.
 """
 
 
@@ -20,3 +20,11 @@ class CellState(Enum):
 class PlayerType(Enum):
     HUMAN = 0
     COMPUTER = 1
+    ENGINE = 2                  # an engine program in its own process, see engineprotocol.py
+
+
+class EngineType(Enum):
+    HEURISTIC = 0
+    SEARCH = 1
+    MCTS = 2
+    FOCUSED = 3                 # search with a fixed node budget per move, for big boards
@@ -26,7 +26,6 @@ class CheckingSystem:
         self.game_manager = game_manager
         self.grid = game_manager.grid
         self.grid_matrix = self.grid.grid_matrix
-        self.numpy_grid = self.grid.numpy_grid
 
 
     def check_column(self, column_index: int) -> Cell:
@@ -50,7 +49,6 @@ class CheckingSystem:
 
         grid = feed_grid
         grid_matrix = feed_grid.grid_matrix
-        numpy_grid = self.numpy_grid
 
         direction_dict = {
             "horizontal": (0, 1),             # right
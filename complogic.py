@@ -8,10 +8,15 @@ from __future__ import annotations
 from typing import *
 import logging
 from string import ascii_uppercase
-from copy import deepcopy
+from collections import OrderedDict
 import random
 
-from cfenums import TurnToken, PlayerType, CellState
+from cfenums import TurnToken, PlayerType, CellState, EngineType
+from bitboard import BitBoard
+import searchlogic
+import mctslogic
+import paritylogic
+import sharedcache
 import beesutils
 
 if TYPE_CHECKING:
@@ -20,11 +25,45 @@ if TYPE_CHECKING:
 
 """ 
 To Do:
--Implement MiniMax Algorithm
+-Implement MiniMax Algorithm          <- DONE (searchlogic.py, used when EngineType.SEARCH is chosen)
 -Convert entire function to a class    <- DONE
 -Make a numpy array to use for logic instead of directly on the grid/cell objects."""
 
 
+RESULT_CACHE_SIZE = 50_000          # positions kept in the heuristic AI's result cache (least recently used are dropped)
+
+# What's stored in the shared position cache (sharedcache.py). The first byte of every shared key.
+SHARED_RESULT_LISTS = 0             # the heuristic AI's result_list and result_list_opp
+SHARED_SEARCH_RESULT = 1            # the search engine's column and score, for one search depth
+
+RESULT_CODES = {CellState.EMPTY: 0, CellState.PLAYER1: 1, CellState.PLAYER2: 2, "FULL": 3, "BAD": 4}
+RESULT_VALUES = [CellState.EMPTY, CellState.PLAYER1, CellState.PLAYER2, "FULL", "BAD"]      # RESULT_CODES the other way round
+UNKNOWN_LIST = 255                  # marks a list that hasn't been worked out yet
+
+
+def encode_result_lists(cache_entry: List[Optional[list]], columns: int) -> bytes:
+    """ One byte per column for each list. A list that's still None is all UNKNOWN_LIST.
+    Only the two result lists are shared. The parity columns are cheap next to them and wouldn't fit a slot on wide boards. """
+
+    payload = b""
+    for results in cache_entry[:2]:
+        if results is None:
+            payload += bytes([UNKNOWN_LIST] * columns)
+        else:
+            payload += bytes(RESULT_CODES[result] for result in results)
+    return payload
+
+
+def decode_result_lists(payload: bytes, columns: int) -> List[Optional[list]]:
+
+    cache_entry = []
+    for start in (0, columns):
+        codes = payload[start:start + columns]
+        cache_entry.append(None if codes[0] == UNKNOWN_LIST else [RESULT_VALUES[code] for code in codes])
+    cache_entry.append(None)                                   # parity columns, worked out in this process
+    return cache_entry
+
+
 class ComputerMoveCalculator:
 
     def __init__(self, game_manager: GameManager):
@@ -32,10 +71,26 @@ class ComputerMoveCalculator:
         self.game_manager = game_manager
         self.grid = game_manager.grid
         self.move_dict = game_manager.move_dict
-        self.numpy_grid = game_manager.grid.numpy_grid
         self.check_column = game_manager.checking_system.check_column
         self.check_win = game_manager.checking_system.check_win
         self.update_cell = game_manager.update_cell
+        self.engine_type = game_manager.engine_type
+        self.search_depth = game_manager.search_depth
+        self.randomness_threshold = game_manager.randomness_threshold
+        self.search_workers = game_manager.search_workers
+        self.last_search: Optional[searchlogic.SearchResult] = None
+        self.mcts_engine: Optional[mctslogic.MCTSEngine] = None
+        if self.engine_type == EngineType.MCTS:
+            self.mcts_engine = mctslogic.MCTSEngine(game_manager.mcts_playouts, game_manager.mcts_time_limit)
+        self.focused_search: Optional[searchlogic.FocusedSearch] = None
+        if self.engine_type == EngineType.FOCUSED:
+            self.focused_search = searchlogic.FocusedSearch(game_manager.search_node_budget)
+
+        # Heuristic AI result lists by position. Lives as long as the calculator does, so it survives reset_game
+        # and the same opening positions in the next game are a dictionary lookup instead of a pile of deepcopies.
+        self.result_cache: OrderedDict[Tuple[int, int], List[Optional[list]]] = OrderedDict()
+        self.cache_hits = 0
+        self.cache_misses = 0
 
     def get_possible_moves(self) -> None:
         """ Appends either cells or the string "FULL" to the possible_moves list."""
@@ -54,71 +109,48 @@ class ComputerMoveCalculator:
     # It can also be the string "FULL" if the column is full.   
     
 
-    def attempt_possible_moves(self, updater_flip: bool = False, check_above: bool = True) -> List[Union[CellState, str]]:
-        """ This function attempts each possible move and returns a list which is the result of each move. \n
-        updater_flip: if True attempts moves for the opponent in possible_moves list. \n
-        check_above: if True, checks the cell above the current cell for the opponent's winning move. """
+    def attempt_possible_moves(self, updater_flip: bool = False, check_above: bool = True,
+                               board: Optional[BitBoard] = None) -> List[Union[CellState, str]]:
+        """ This function works out the result of each possible move and returns a list which is the result of each move. \n
+        updater_flip: if True checks the moves for the opponent in possible_moves list. \n
+        check_above: if True, checks the cell above the current cell for the opponent's winning move. \n
+        board: the current position as a BitBoard, if the caller already has one. \n
+        Nothing is actually placed. The winning cells of both players come from one pass over a BitBoard
+        (BitBoard.winning_cells), and each move is just looked up in them. """
 
         logging.debug(f"Starting attempt_possible_moves. updater_flip: {updater_flip}, check_above: {check_above}")
 
-        def get_cloned_cell_above(move: Cell, cloned_grid: Grid) -> Optional[Cell]:
-            """Checks if the current cell is in the top row. If not, returns the cell above it. If it is, returns None."""
-
-            if move.x > 0:                                                  # 0 = top row
-                return cloned_grid.grid_matrix[move.x-1][move.y]            # x-1 = cell above
-            return None
-        
-        def update_and_check(cloned_cell: Cell, cloned_grid: Grid, updater_flip: bool) -> CellState:
-
-            self.update_cell(cloned_cell, updater_flip)             # updating cloned cell updates the cloned grid
-            return self.check_win(cloned_grid, True)                # run check_win on cloned grid in Test mode
-            
-        def process_result(move: Cell) -> Union[CellState, str]:
-            """This function returns the result of the move. \n"""
+        if board is None:
+            board = self.current_bitboard()
+        player_bits = board.current                                 # the player whose turn it is
+        opponent_bits = board.current ^ board.mask
+        player_num = self.game_manager.turn_token.value
+        if updater_flip:                                            # checking the moves for the opponent instead
+            player_bits, opponent_bits = opponent_bits, player_bits
+            player_num = 3 - player_num                             # 1 <-> 2
 
-            cloned_cell_above = None 
-            cloned_grid = deepcopy(self.grid)                                    # clone the grid each time to start fresh
-            cloned_cell = cloned_grid.grid_matrix[move.x][move.y]           # get the cloned cell
-            if check_above:                                        
-                cloned_cell_above = get_cloned_cell_above(move, cloned_grid)
+        player_wins = board.winning_cells(player_bits)              # empty cells that complete four for this player
+        opponent_wins = board.winning_cells(opponent_bits) if check_above else 0
 
-            result: CellState = update_and_check(cloned_cell, cloned_grid, updater_flip)  # check for computer's winning move
-
-            if result != CellState.EMPTY:                                   # if computer sees its own winning move
-                return result                                       
-            
-            if cloned_cell_above:                                           # For this to happen: check above is true, and its not the top row
-
-                opp_result: CellState = update_and_check(cloned_cell_above, cloned_grid, True)
-                if opp_result != CellState.EMPTY:
-                    logging.debug(beesutils.color("Opponent has a winning move in cell above. Appending 'BAD'", "red"))
-                    return "BAD"
-                
-            # } else { 
-            return CellState.EMPTY 
-        
-        ##########   END OF HELPERS   ###########
-        #                                       #
-        ###### attempt_possible_moves CORE ######
-                   
         result_list = []
-        for move in self.possible_moves:                                       
+        for move in self.possible_moves:
             if move == "FULL":
                 result_list.append(move)
                 continue
 
-            result = process_result(move)
+            move_bit = 1 << board.bit_index(move.x, move.y)
 
-            if result != CellState.EMPTY:                   # if a winner is found
+            if move_bit & player_wins:                              # if a winner is found
                 logging.debug(beesutils.color(f"Winning move found in column {ascii_uppercase[move.y]}", "red"))
-                result_list.append(result)                  # result is a CellState (CellState.PLAYER1 or CellState.PLAYER2)
-                continue                              
+                result_list.append(CellState(player_num))           # CellState.PLAYER1 or CellState.PLAYER2
+                continue
 
-            if result == "BAD":                               # if the opponent has a winning move in the cell above
-                result_list.append(move)
+            if (move_bit << 1) & opponent_wins:                     # cell above (a sentinel bit if this is the top row, never a winning cell)
+                logging.debug(beesutils.color("Opponent has a winning move in cell above. Appending 'BAD'", "red"))
+                result_list.append("BAD")
                 continue
 
-            result_list.append(result)                      # it reaches this if: column is not full, not a bad move, and not a winner
+            result_list.append(CellState.EMPTY)                     # it reaches this if: column is not full, not a bad move, and not a winner
 
         logging.debug(f"Finished attempting possible moves.")
         return result_list
@@ -151,9 +183,11 @@ class ComputerMoveCalculator:
         return None                        # if it completes the loop without finding a winner, return None
     
     
-    def last_resort(self, result_list: List[Union[CellState, str]]) -> Cell:
+    def last_resort(self, result_list: List[Union[CellState, str]], cache_entry: Optional[List[Optional[list]]] = None,
+                    board: Optional[BitBoard] = None) -> Cell:
         """If there's no winners, this returns the best heuristic cell available, skipping bad moves. \n
-        Unless there's only bad moves, in which case it just returns those (results in losing the game) \n"""
+        Unless there's only bad moves, in which case it just returns those (results in losing the game) \n
+        cache_entry and board come from get_cache_entry, so the parity filter is only run once per position. """
 
         logging.debug("Didn't find anything good. Checking for neutral move...")
 
@@ -171,17 +205,60 @@ class ComputerMoveCalculator:
         avail_cells = move_types["NEUTRAL"] or move_types["BAD"]        # this is called a short-circuit evaluation
         # a short-circuit evaluation is when the first condition is True, it doesn't bother checking the second condition
         # so here, if there's neutral moves it will only use those, otherwise it will use the bad moves
+
+        if move_types["NEUTRAL"]:
+            if cache_entry is not None:
+                avail_cells = self.cached_parity_filter(avail_cells, cache_entry, board)
+            else:
+                avail_cells = self.parity_filter(avail_cells, board)
         
         for key, value in move_types.items():       # just for debugging
             for move in value:
                 logging.debug(beesutils.color(f"{key} move: Column {ascii_uppercase[move.y]}: {repr(move)} | heuristic_score: {move.heuristic_score}", "purple"))
 
-        best_heuristic_cell = self.get_best_heuristic_with_random(avail_cells)
+        best_heuristic_cell = self.get_best_heuristic_with_random(avail_cells, self.randomness_threshold)
 
         logging.debug(beesutils.color(f"Cell chosen: Column {ascii_uppercase[best_heuristic_cell.y]}: {repr(best_heuristic_cell)} | heuristic_score: {best_heuristic_cell.heuristic_score}", "green"))
         return best_heuristic_cell
     
     
+    def parity_filter(self, avail_cells: List[Cell], board: Optional[BitBoard] = None) -> List[Cell]:
+        """ Checks each move with the odd/even threat rules (paritylogic). If some moves leave an endgame the rules say we win,
+        only those are kept. Moves that leave an endgame the opponent wins are dropped, unless that's all there is. """
+
+        if board is None:
+            board = self.current_bitboard()
+        player_num = self.game_manager.turn_token.value
+        winning, unclear = [], []
+
+        for cell in avail_cells:
+            board.play(cell.y)
+            predicted_winner = paritylogic.predict_winner(board)
+            board.undo()
+            if predicted_winner == player_num:
+                winning.append(cell)
+            elif predicted_winner is None:
+                unclear.append(cell)
+
+        if winning or unclear:
+            logging.debug(beesutils.color(f"Parity filter: winning {[ascii_uppercase[c.y] for c in winning]}, "
+                                          f"unclear {[ascii_uppercase[c.y] for c in unclear]}", "purple"))
+        return winning or unclear or avail_cells
+
+    def cached_parity_filter(self, avail_cells: List[Cell], cache_entry: List[Optional[list]], board: BitBoard) -> List[Cell]:
+        """ parity_filter with the cache in front of it. The neutral moves only depend on the position, so the columns
+        it keeps are stored in the cache entry (canonical order) and only worked out the first time. """
+
+        mirrored = board.is_mirrored()
+        if cache_entry[2] is None:
+            kept = [cell.y for cell in self.parity_filter(avail_cells, board)]
+            cache_entry[2] = [board.mirror_column(col) for col in kept] if mirrored else kept
+        else:
+            logging.debug(beesutils.color("Result cache hit (parity)", "cyan"))
+
+        kept = {board.mirror_column(col) for col in cache_entry[2]} if mirrored else set(cache_entry[2])
+        return [cell for cell in avail_cells if cell.y in kept]
+
     def get_best_heuristic_with_random(self, avail_cells: List[Cell], randomness_threshold: float = 0.2) -> Cell:
         """ Adds a random element to the heuristic selection process. This is to prevent the computer from always making the same moves.
         The randomness_threshold is the probability of ignoring the heuristic score entirely. Otherwises randomizes from cells tied for best."""
@@ -196,8 +273,13 @@ class ComputerMoveCalculator:
         
         # Step 2: Collect all cells with the minimum heuristic score
         min_score_cells = [cell for cell in avail_cells if cell.heuristic_score == min_score]
+
+        # Step 3: Of those, keep the cells that are part of the most possible four-in-a-rows (from the cached static tables)
+        line_counts = self.grid.static_tables.line_counts
+        max_lines: int = max(line_counts[cell.x][cell.y] for cell in min_score_cells)
+        min_score_cells = [cell for cell in min_score_cells if line_counts[cell.x][cell.y] == max_lines]
         
-        # Step 3: Select a random cell from the list of cells with the minimum score
+        # Step 4: Select a random cell from the list of cells with the best score
         best_heuristic_cell = random.choice(min_score_cells)
         
         return best_heuristic_cell
@@ -209,29 +291,166 @@ class ComputerMoveCalculator:
 
     def computer_move(self) -> Cell:
 
+        if self.engine_type == EngineType.SEARCH:
+            return self.search_move()
+        elif self.engine_type == EngineType.MCTS:
+            return self.mcts_move()
+        elif self.engine_type == EngineType.FOCUSED:
+            return self.focused_move()
+
         self.get_possible_moves()
         if not self.possible_moves:
             raise ValueError(beesutils.color("Error in computer_move. Possible moves is empty. ", "red"))
 
         logging.debug(beesutils.color("Attempting possible moves for computer's turn...", "green"))
-        result_list = self.attempt_possible_moves()                          # index matches the column
+        cache_entry, board = self.get_cache_entry()
+        result_list = self.cached_result_list(cache_entry, board, opponent=False)        # index matches the column
 
         best_move: Optional[Cell] = self.examine_list(result_list, "current")                
         if best_move is not None:                                       # return early if a winner is found
             return best_move                     
 
         logging.debug(beesutils.color("Checking if opponent has winning move...", "green"))
-        result_list_opp = self.attempt_possible_moves(True, False)           # updater_flip True, check_above False
+        result_list_opp = self.cached_result_list(cache_entry, board, opponent=True)     # updater_flip True, check_above False
 
         best_move: Optional[Cell] = self.examine_list(result_list_opp, "opp")      
         if best_move is not None:                                       # return early if a winner is found
             return best_move
         
         if best_move is None:
-            last_resort_move: Cell = self.last_resort(result_list)
+            last_resort_move: Cell = self.last_resort(result_list, cache_entry, board)
             return last_resort_move
     
 
+    ###########   Result cache   ############
+
+    def get_cache_entry(self) -> Tuple[List[Optional[list]], BitBoard]:
+        """ Returns the cache entry for the current position, and the position as a BitBoard.
+        That BitBoard is the only one built for a heuristic move, everything after the lookup is handed it. \n
+        The entry is [result_list, result_list_opp, parity_columns], stored in canonical column order. Each one is None until it's been worked out.
+        After the lookup, the only thing left to do per move is the random tie-break in get_best_heuristic_with_random.
+        If this calculator hasn't seen the position, the shared cache (if this process has one) is asked before giving up. """
+
+        board = self.current_bitboard()
+        key = (self.game_manager.turn_token.value, board.canonical_key())    # the CellStates in the lists depend on whose turn it is
+
+        cache_entry = self.result_cache.get(key)
+        if cache_entry is None:
+            cache_entry = [None, None, None]
+            shared = sharedcache.shared_cache()
+            if shared is not None:
+                payload = shared.get(self.shared_key(SHARED_RESULT_LISTS, board))
+                if payload is not None:
+                    cache_entry = decode_result_lists(payload, board.columns)     # another process already worked it out
+            self.result_cache[key] = cache_entry
+            if len(self.result_cache) > RESULT_CACHE_SIZE:
+                self.result_cache.popitem(last=False)           # forget the least recently used position
+        else:
+            self.result_cache.move_to_end(key)
+        return cache_entry, board
+
+    def cached_result_list(self, cache_entry: List[Optional[list]], board: BitBoard, opponent: bool) -> List[Union[CellState, str]]:
+        """ attempt_possible_moves with the cache in front of it. Only works the list out the first time a position is seen. """
+
+        index = 1 if opponent else 0
+        mirrored = board.is_mirrored()
+        if cache_entry[index] is None:
+            self.cache_misses += 1
+            if opponent:
+                result_list = self.attempt_possible_moves(True, False, board)
+            else:
+                result_list = self.attempt_possible_moves(board=board)
+            cache_entry[index] = result_list[::-1] if mirrored else result_list     # flip a mirrored position back to canonical order
+
+            shared = sharedcache.shared_cache()
+            if shared is not None:
+                shared.put(self.shared_key(SHARED_RESULT_LISTS, board), encode_result_lists(cache_entry, board.columns))
+        else:
+            self.cache_hits += 1
+            logging.debug(beesutils.color(f"Result cache hit ({'opp' if opponent else 'current'})", "cyan"))
+
+        return cache_entry[index][::-1] if mirrored else list(cache_entry[index])   # copy, so nobody can change what's cached
+
+    def shared_key(self, kind: int, board: BitBoard, setting: int = 0) -> bytes:
+        """ Key for the shared cache: what's stored, a setting it depends on (e.g. search depth), whose turn it is,
+        the board size, and the canonical position key. """
+
+        position_key = board.canonical_key()
+        return (bytes([kind]) + setting.to_bytes(2, "little")                # 2 bytes, a search depth can go past 255
+                + bytes([self.game_manager.turn_token.value, board.rows, board.columns])
+                + position_key.to_bytes((position_key.bit_length() + 7) // 8, "little"))
+
+
+    ###########   Search engine   ############
+
+    def current_bitboard(self) -> BitBoard:
+        """ Copies the main grid into a BitBoard for the search code. """
+
+        return BitBoard.from_grid(self.grid, self.game_manager.turn_token.value)
+
+    def search_move(self) -> Cell:
+        """ Picks a move with the negamax search instead of the heuristic AI.
+        If search_workers is more than 1, the root columns are split across a process pool. """
+
+        board = self.current_bitboard()
+
+        shared = sharedcache.shared_cache()
+        shared_key = self.shared_key(SHARED_SEARCH_RESULT, board, self.search_depth) if shared is not None else b""
+        payload = shared.get(shared_key) if shared is not None else None
+
+        if payload is not None:                                 # another process already searched this position
+            column = board.mirror_column(payload[0]) if board.is_mirrored() else payload[0]
+            score = int.from_bytes(payload[1:9], "little", signed=True)
+            result = searchlogic.SearchResult(column, score, {column: score}, 0, 0.0, self.search_depth)
+        else:
+            if self.search_workers > 1:
+                result = searchlogic.parallel_search(board, self.search_depth, self.search_workers)
+            else:
+                result = searchlogic.NegamaxSearch(self.search_depth).search(board)
+            if shared is not None:
+                canonical_column = board.mirror_column(result.column) if board.is_mirrored() else result.column
+                shared.put(shared_key, bytes([canonical_column]) + result.score.to_bytes(8, "little", signed=True))
+
+        self.last_search = result
+        logging.debug(beesutils.color(f"Search scores: {result.scores}", "purple"))
+        logging.debug(beesutils.color(f"Search chose column {ascii_uppercase[result.column]} (score {result.score}) | "
+                                      f"{result.nodes} nodes in {result.elapsed:.3f}s, workers: {self.search_workers}", "green"))
+
+        return self.check_column(result.column)
+
+    def focused_move(self) -> Cell:
+        """ Picks a move with the focused search. Same node budget per move on every board size,
+        only the columns around the recent moves and any threats are searched. """
+
+        result = self.focused_search.choose_move(self.current_bitboard(), self.game_manager.move_columns)
+
+        self.last_search = result
+        logging.debug(beesutils.color(f"Focused search columns: {[ascii_uppercase[col] for col in result.scores]}", "purple"))
+        logging.debug(beesutils.color(f"Focused search chose column {ascii_uppercase[result.column]} (score {result.score}) | "
+                                      f"{result.nodes} nodes in {result.elapsed:.3f}s, depth {result.depth}", "green"))
+
+        return self.check_column(result.column)
+
+    def mcts_move(self) -> Cell:
+        """ Picks a move with the Monte Carlo Tree Search engine. The engine keeps its tree between turns. """
+
+        column = self.mcts_engine.choose_move(self.current_bitboard())
+        logging.debug(beesutils.color(f"MCTS chose column {ascii_uppercase[column]}", "green"))
+        return self.check_column(column)
+
+    def report_parallel_speedup(self) -> Dict[str, float]:
+        """ Times the single-process search against the parallel search on the current position and prints the speedup. """
+
+        workers = self.search_workers if self.search_workers > 1 else None     # None = every CPU core
+        report = searchlogic.measure_speedup(self.current_bitboard(), self.search_depth, workers)
+
+        print(beesutils.color(f"Depth {self.search_depth} search with {report['workers']} workers:", "cyan"))
+        print(f"Single-process: {report['serial_time']:.3f}s ({report['serial_nodes']} nodes) | "
+              f"Parallel: {report['parallel_time']:.3f}s ({report['parallel_nodes']} nodes)")
+        print(beesutils.color(f"Speedup: {report['speedup']:.2f}x", "green"))
+        return report
+
+
     ### NOTES ON HOW IT WORKS ###
 
     # possible_moves is a list of cell objects. Each cell object is the lowest empty cell in the column.
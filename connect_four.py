@@ -1,25 +1,30 @@
+from __future__ import annotations
+import argparse
 import logging
 from typing import *
 import random
 from collections import deque
 from datetime import datetime
 from string import ascii_uppercase
-import turtle
 
 from cfenums import PlayerType, CellState
 import beesutils
 from gridmaker import Grid, Cell
 from gamemanager import GameManager
-from display import Display
+from display import Display, make_display
 from simmode import GameSimulator
+from prewarm import Prewarmer
+from engine import create_move_dict                 # the headless engine module, see engine.py
+import inputfuncs
+
+if TYPE_CHECKING:
+    import profiling                                # only loaded when a session is started, see GameManager.start_debug_session
 
 
 ####### GLOBAL VARIABLES ######
 
 time_format = "%H:%M:%S"                         ## for the timestamp.
 
-beesutils.logging_initializer("DEBUG")           ## can specifiy a log file here if needed. Check docstring for details.
-
 
 #############    General game functions    ##############
 
@@ -31,25 +36,14 @@ def inform_user_about_debug() -> None:
     if choice in ["off", "debug"]:
         beesutils.log_level_toggle()
 
-def create_move_dict(grid: Grid) -> dict:
-    """ Generates a connect-four move dictionary from whatever grid is passed into it. (Columns only) \n
-    This could be in the Grid class, but the dictionary is different for every type of game so I figured it makes more sense
-    to have it here.""" 
-
-    columns = grid.columns                          # This move dictionary is very simple. 
-    move_dict = {}                                  # It goes A:0, B:1, C:2, etc.
-
-    for col in range(columns):
-        move_dict[ascii_uppercase[col]] = col
-
-    return move_dict 
-
 
 #############   START OF MAIN GAME   ##############
 
-def main_game(game_manager: GameManager) -> None:
+def main_game(game_manager: GameManager, sessions: Sequence[profiling.Session] = ()) -> Display:
     """ Contains the initialization, the main game loop function,
-    and controls running the simulation mode. """
+    and controls running the simulation mode. \n
+    sessions are profiling sessions from the command line, they start once the game is set up.
+    Returns the display so the caller can close the turtle window when the session ends. """
 
 
     def game_loop(hide_board: bool = False, ultrasim: bool = False) -> CellState:
@@ -91,11 +85,11 @@ def main_game(game_manager: GameManager) -> None:
             logging.debug(f"game_manager.remaining_cells = {game_manager.remaining_cells}")
 
             # this pauses the game every turn if both players are computer and debug is on
-            if game_manager.player1_type == PlayerType.COMPUTER and game_manager.player2_type == PlayerType.COMPUTER:
+            if PlayerType.HUMAN not in (game_manager.player1_type, game_manager.player2_type):
                 if logging.getLogger().getEffectiveLevel() == logging.DEBUG:
                 
                     while True:
-                        debug_wait = input("avail: 'debug', 'heuristic', 'numpy' | Anything else continues: ").lower()
+                        debug_wait = input("avail: 'debug', 'heuristic', 'numpy', 'speedup', 'profile', 'memory' | Anything else continues: ").lower()
                         if debug_wait == "debug":
                             beesutils.log_level_toggle()
                             break
@@ -105,6 +99,16 @@ def main_game(game_manager: GameManager) -> None:
                         elif debug_wait == "numpy":
                             game_display.toggle_feature("numpy")
                             break
+                        elif debug_wait == "speedup":
+                            game_manager.comp_move_calc.report_parallel_speedup()      # parallel vs single-process search
+                            continue
+                        elif debug_wait in ("profile", "memory"):
+                            length = inputfuncs.choose_session_length(debug_wait)
+                            if length is not None:
+                                import profiling
+                                session_class = profiling.ProfileSession if debug_wait == "profile" else profiling.MemorySession
+                                game_manager.start_debug_session(session_class(length))
+                            continue
                         else:
                             break
 
@@ -113,6 +117,8 @@ def main_game(game_manager: GameManager) -> None:
             # update the board and the numpy grid with the cell we got from move_system
             game_manager.update_cell(current_cell)
             game_manager.update_numpy(current_cell)
+            game_manager.record_move(current_cell)
+            game_manager.tick_debug_sessions("moves")                                  # 'profile' and 'memory' sessions
 
             game_manager.move_counter()                                                 # keep track of moves made and remaining           
             winner: CellState = game_manager.checking_system.check_win(grid)            # returns CellState.EMPTY if no winner
@@ -141,14 +147,18 @@ def main_game(game_manager: GameManager) -> None:
                         print(f"They won in {game_manager.player2_moves} moves.\n")
 
                     print(f"The game took {elapsed_formatted}\n")         
+                game_manager.tick_debug_sessions("games")
                 return winner    
                                                            
-            elif game_manager.remaining_cells == 0:                           # no winner, board full
+            elif game_manager.remaining_cells == 0 or game_manager.is_dead_draw:  # no winner, board full or nobody can win anymore
                 
                 if not ultrasim:
                     game_display.display_func()    
                     logging.debug(beesutils.color(f"game_manager.remaining_cells = {game_manager.remaining_cells}"))         
-                    print("It's a draw!")                                   
+                    print("It's a draw!")
+                    if game_manager.remaining_cells:
+                        print(f"Neither player can make four in a row anymore, so the last {game_manager.remaining_cells} cells weren't played.")
+                game_manager.tick_debug_sessions("games")
                 return CellState.EMPTY  
             else:                                                           # no winner, board not full
                 previous_player = game_manager.turn_token                   # this is an Enum member
@@ -168,9 +178,18 @@ def main_game(game_manager: GameManager) -> None:
     game_manager.player_types_bridge()                                  # sets self.player1_type and self.player2_type
     logging.debug(f"Player 1: {game_manager.player1_type}, Player 2: {game_manager.player2_type}")    # PlayerType enum    
 
+    prewarmer = Prewarmer(game_manager)                                 # start-up work runs while the prompts wait
+    prewarmer.start_engines()
+
+    if PlayerType.COMPUTER in (game_manager.player1_type, game_manager.player2_type):
+        game_manager.choose_engine_bridge()                             # heuristic AI, search or MCTS engine
+        logging.debug(f"Engine: {game_manager.engine_type}, search workers: {game_manager.search_workers}")
+        prewarmer.start_search_pool()
+
     rows: int
     columns: int
     rows, columns = game_manager.choose_size_bridge()                   # Can be default or custom
+    prewarmer.warm_size(rows, columns)
 
     grid: Grid = Grid(rows, columns)                 
     logging.debug(beesutils.color(f"Grid initialized. grid.rows = {grid.rows}, grid.columns = {grid.columns}"))
@@ -178,41 +197,90 @@ def main_game(game_manager: GameManager) -> None:
     move_dict: dict = create_move_dict(grid)                            # Format: A:0, B:1, C:2, etc.
     logging.debug(beesutils.color(f"Move dictionary: {move_dict}"))     # scales automatically with grid size
 
-    game_display: Display = Display(grid)
+    use_turtle: bool = game_manager.choose_display_bridge()             # terminal or turtle window
+    game_display: Display = make_display(grid, use_turtle)
 
     game_manager.attach_grid(grid, move_dict)
     game_manager.init_check_system()                                    # checking system class
     game_manager.init_move_calculators()                                # move calculator classes for human and computer
+    game_manager.human_move_calc.redraw = game_display.display_func     # 'undo' and 'redo' at the move prompt show the board again
+    prewarmer.wait()                                                    # usually done already
 
     """ Notes about initialization:
     There's 5 things being initialized here:
      1. The grid, 2. The move dictionary, 3. The display, 4. The checking system, 5. The move calculators.
-     All of them are classes except for the move dictionary, which is just a dictionary. """
+     All of them are classes except for the move dictionary, which is just a dictionary.
+     The Prewarmer has been building the tables and starting processes for them in the background since the prompts. """
 
-    if game_manager.player1_type == PlayerType.COMPUTER and game_manager.player2_type == PlayerType.COMPUTER:
-        
-        simulator = GameSimulator(game_manager, game_loop, game_display)
-        simulator.run_simulations()
+    for session in sessions:
+        game_manager.start_debug_session(session)
 
-    else:        # if sim mode is not on
+    try:
+        if PlayerType.HUMAN not in (game_manager.player1_type, game_manager.player2_type):   # computers and/or external engines
 
-        game_loop()
+            simulator = GameSimulator(game_manager, game_loop, game_display)
+            game_manager.debug_tracked["simulator"] = simulator
+            simulator.run_simulations()
+
+        else:        # if sim mode is not on
+
+            game_loop()
+
+    except BaseException:
+        game_display.close()                                            # crashed or Ctrl+C, don't leave the turtle window behind
+        raise
+
+    finally:
+        game_manager.finish_debug_sessions()                            # report sessions that didn't reach their count
+        game_manager.close_engines()                                    # external engine processes, if there are any
+
+    return game_display
 
 #################################################################        
 
-def external_loop():
+def external_loop(sessions: Sequence[profiling.Session] = ()):
     """I'm not sure it really matters much to initialize the game manager outside the main game loop. \n
-    At least I get to use the play_again function. I suppose I could add in save games or a menu or something."""
+    At least I get to use the play_again function. I suppose I could add in save games or a menu or something.
+    The profiling sessions from the command line only run in the first game."""
 
     logging.debug("External loop initialized.")                     
     
     while True:                                            
 
         game_manager = GameManager()      
-        main_game(game_manager)  
+        game_display = main_game(game_manager, sessions)  
+        sessions = ()
         if not game_manager.play_again():
+            game_display.close()                                    # the turtle window stays open between games, closed here
             print("Goodbye!")
             break
 
+def parse_run_options() -> List[profiling.Session]:
+    """ Command line options. Everything else is still chosen with the prompts. """
+
+    parser = argparse.ArgumentParser(description="Connect Four. Everything is set up with prompts, these options are for profiling.")
+    parser.add_argument("--profile-moves", type=int, help="cProfile the next N moves and print the hottest functions.")
+    parser.add_argument("--profile-games", type=int, help="Same as --profile-moves, over N games.")
+    parser.add_argument("--profile-sort", default="cumulative", help="pstats sort key for the profile report, e.g. 'tottime'.")
+    parser.add_argument("--memory-moves", type=int, help="Memory report (tracemalloc + size of each subsystem) over the next N moves.")
+    parser.add_argument("--memory-games", type=int, help="Same as --memory-moves, over N games.")
+    args = parser.parse_args()
+
+    sessions: List[profiling.Session] = []
+    if not any((args.profile_moves, args.profile_games, args.memory_moves, args.memory_games)):
+        return sessions                                 # the usual case, profiling.py isn't even imported
+    import profiling
+    for count, unit in ((args.profile_moves, "moves"), (args.profile_games, "games")):
+        if count:
+            sessions.append(profiling.ProfileSession(profiling.SessionLength(count, unit), args.profile_sort))
+    for count, unit in ((args.memory_moves, "moves"), (args.memory_games, "games")):
+        if count:
+            sessions.append(profiling.MemorySession(profiling.SessionLength(count, unit)))
+    return sessions
+
+
 if __name__ == "__main__":
-    external_loop()
\ No newline at end of file
+    # Logging is only set up when the game is run directly, so importing this file has no side effects.
+    run_sessions = parse_run_options()
+    beesutils.logging_initializer("DEBUG")           ## can specifiy a log file here if needed. Check docstring for details.
+    external_loop(run_sessions)
\ No newline at end of file
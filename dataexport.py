@@ -0,0 +1,156 @@
+"""
+Module Name: dataexport.py
+
+    Holds the TrainingDataExporter class. During a simulation it saves every position that was reached,
+    together with the side to move, the move that was played and how the game ended, into fixed-size NumPy .npy
+    shard files. The shards can be opened with load_shard() as memory maps, so reading them copies nothing.
+"""
+
+from __future__ import annotations
+from typing import *
+import logging
+import os
+
+import numpy as np
+
+import beesutils
+from cfenums import CellState
+
+
+DEFAULT_SHARD_BYTES = 64 * 1024 * 1024  # buffer (and shard file) size. Positions per shard depend on the board size
+
+
+def position_dtype(rows: int, columns: int) -> np.dtype:
+    """ One record per position. board uses the Grid.numpy_grid layout (0 empty, 1 Player 1, 2 Player 2, row 0 at the top).
+    result is from the point of view of the side to move: 1 = went on to win, 0 = draw, -1 = lost. """
+
+    return np.dtype([
+        ("board", np.int8, (rows, columns)),
+        ("to_move", np.int8),
+        ("move", np.int8),
+        ("result", np.int8),
+    ])
+
+
+class TrainingDataExporter:
+    """ Buffers positions in one preallocated array and writes it out as a shard file every time it fills up.
+    Memory use is one shard_bytes buffer no matter how many games are exported or how big the board is. \n
+    resume_index is the shard index saved in a simulation checkpoint (see checkpoint()). Shards from that index on
+    were written after the checkpoint, by games that the resumed run plays again, so they're deleted. """
+
+    def __init__(self, folder: str, rows: int, columns: int, shard_bytes: int = DEFAULT_SHARD_BYTES,
+                 resume_index: Optional[int] = None):
+
+        self.folder = folder
+        self.rows = rows
+        self.columns = columns
+        self.dtype = position_dtype(rows, columns)
+        self.shard_size = max(1, shard_bytes // self.dtype.itemsize)     # positions per shard
+        self.buffer = np.zeros(self.shard_size, dtype=self.dtype)
+        self.count = 0                                      # positions in the buffer right now
+        self.total_positions = 0
+        self.shards_written = 0
+
+        os.makedirs(folder, exist_ok=True)
+        if resume_index is not None:
+            self.discard_from(resume_index)
+        self.shard_index = self.next_free_index()           # don't overwrite shards from an earlier (or resumed) run
+        logging.debug(beesutils.color(f"Training data export to {folder}, starting at shard {self.shard_index}, "
+                                      f"{self.shard_size} positions per shard.", "cyan"))
+
+    def shard_indexes(self) -> List[int]:
+
+        return [int(name[6:11]) for name in os.listdir(self.folder)
+                if name.startswith("shard_") and name.endswith(".npy") and name[6:11].isdigit()]
+
+    def discard_from(self, first_index: int) -> None:
+
+        for index in self.shard_indexes():
+            if index >= first_index:
+                os.remove(os.path.join(self.folder, f"shard_{index:05}.npy"))
+                logging.debug(beesutils.color(f"Removed shard {index}, it was written after the checkpoint.", "cyan"))
+
+    def checkpoint(self) -> dict:
+        """ Flushes the buffer so every game so far is on disk, and returns what the simulation checkpoint needs
+        to line the shards up with it on resume. """
+
+        self.flush()
+        return {"folder": os.path.abspath(self.folder), "shard_index": self.shard_index}
+
+    def next_free_index(self) -> int:
+
+        indexes = self.shard_indexes()
+        return max(indexes) + 1 if indexes else 0
+
+    def add_game(self, move_columns: List[int], game_result: CellState) -> None:
+        """ Adds every position of a finished game. Player 1 always moves first.
+        All the positions of the game are built in one array and copied into the shard buffer in bulk. """
+
+        moves = len(move_columns)
+        if moves == 0:
+            return
+
+        cols = np.array(move_columns, dtype=np.intp)
+        to_move = np.where(np.arange(moves) % 2 == 0, 1, 2).astype(np.int8)
+
+        # work out which row each disc landed in: count earlier discs in the same column
+        heights = np.zeros(self.columns, dtype=np.intp)
+        rows_landed = np.empty(moves, dtype=np.intp)
+        for i, col in enumerate(move_columns):
+            rows_landed[i] = self.rows - 1 - heights[col]
+            heights[col] += 1
+
+        # position k is the board BEFORE move k. Each disc shows up in every position after the one it was played in.
+        boards = np.zeros((moves, self.rows, self.columns), dtype=np.int8)
+        for i in range(moves - 1):
+            boards[i + 1:, rows_landed[i], cols[i]] = to_move[i]
+
+        if game_result == CellState.EMPTY:
+            results = np.zeros(moves, dtype=np.int8)
+        else:
+            results = np.where(to_move == game_result.value, 1, -1).astype(np.int8)
+
+        start = 0
+        while start < moves:                                # a game can be split across two shards
+            space = self.shard_size - self.count
+            chunk = min(space, moves - start)
+            target = self.buffer[self.count:self.count + chunk]
+            target["board"] = boards[start:start + chunk]
+            target["to_move"] = to_move[start:start + chunk]
+            target["move"] = cols[start:start + chunk]
+            target["result"] = results[start:start + chunk]
+            self.count += chunk
+            start += chunk
+            if self.count == self.shard_size:
+                self.flush()
+
+        self.total_positions += moves
+
+    def flush(self) -> None:
+        """ Writes whatever is in the buffer to the next shard file. """
+
+        if self.count == 0:
+            return
+        path = os.path.join(self.folder, f"shard_{self.shard_index:05}.npy")
+        np.save(path, self.buffer[:self.count])
+        logging.debug(beesutils.color(f"Wrote {self.count} positions to {path}", "cyan"))
+        self.shard_index += 1
+        self.shards_written += 1
+        self.count = 0
+
+    def close(self) -> None:
+
+        self.flush()
+        print(beesutils.color(f"Exported {self.total_positions} positions to {self.shards_written} shard(s) in {self.folder}", "green"))
+
+
+def load_shard(path: str) -> np.ndarray:
+    """ Opens a shard as a read-only memory map. Nothing is read from disk until it's used. """
+
+    return np.load(path, mmap_mode="r")
+
+
+def shard_paths(folder: str) -> List[str]:
+
+    return sorted(os.path.join(folder, name) for name in os.listdir(folder)
+                  if name.startswith("shard_") and name.endswith(".npy"))
@@ -5,7 +5,7 @@ Module Name: display.py
 """
 
 # TO DO - add a feature to display the NumPy array instead of the grid matrix
-# TO DO - divide display into subclasses and add turtle graphics
+# TO DO - divide display into subclasses and add turtle graphics     <- turtle graphics DONE (TurtleDisplay below)
 
 from __future__ import annotations
 from typing import *
@@ -14,6 +14,8 @@ import abc
 import logging
 from string import ascii_uppercase
 
+from cfenums import CellState
+
 if TYPE_CHECKING:
     from gridmaker import Cell, Grid
 
@@ -95,6 +97,134 @@ class Display:
             logging.debug(beesutils.color(f"{feature.capitalize()} scores turned {status}.", "green"))
             logging.debug(f"Feature dict outgoing: {feature_dict}")
 
+    def close(self) -> None:
+        """ Nothing to close for the terminal display. TurtleDisplay closes its window here. """
+
+
+class TurtleDisplay(Display):
+    """ Graphical display in a turtle window. Same interface as Display, so the game loop and the simulator can use either. \n
+    The board (frame, empty holes and column letters) is drawn once with the animation turned off. After that,
+    display_func only draws the discs that changed since the last call, and refreshes the screen once. """
+
+    disc_colors = {1: "red", 2: "gold"}             # Player 1, Player 2
+    board_color = "royalblue"
+    hole_color = "white"
+
+    def __init__(self, grid: Grid):
+        super().__init__(grid)
+
+        import turtle                               # only imported if the turtle display is actually used
+        self.screen = turtle.Screen()
+        self.screen.clear()                         # a new game in the same session reuses the window
+        self.screen.title("Connect Four")
+        self.screen.tracer(0, 0)                    # no animation, nothing shows up until screen.update()
+        self.pen = turtle.Turtle(visible=False)
+        self.pen.speed(0)
+        self.pen.penup()
+        self.draw_board()
+
+    def cell_center(self, x: int, y: int) -> Tuple[float, float]:
+        """ Screen position of a grid cell (x = 0 is the top row, same as grid_matrix). """
+
+        return (self.left + (y + 0.5) * self.cell_size,
+                self.bottom + (self.grid.rows - 1 - x + 0.5) * self.cell_size)
+
+    def draw_board(self) -> None:
+        """ Draws the static part of the board. Only runs when the display is created or the board size changes. """
+
+        grid = self.grid
+        self.cell_size = max(12, min(64, 900 // (grid.columns + 1), 700 // (grid.rows + 2)))    # fits 6x7 and 20x26 on screen
+        self.left = -grid.columns * self.cell_size / 2
+        self.bottom = -grid.rows * self.cell_size / 2
+        self.disc_size = self.cell_size * 0.8
+        self.drawn_heights = [0] * grid.columns     # discs already drawn in each column
+
+        self.screen.setup(int(grid.columns * self.cell_size + 2 * self.cell_size), int(grid.rows * self.cell_size + 3 * self.cell_size))
+        self.pen.clear()
+
+        pen = self.pen
+        pen.goto(self.left, self.bottom)
+        pen.color(self.board_color)
+        pen.begin_fill()
+        for side in (grid.columns, grid.rows, grid.columns, grid.rows):
+            pen.forward(side * self.cell_size)
+            pen.left(90)
+        pen.end_fill()
+
+        for x in range(grid.rows):
+            for y in range(grid.columns):
+                pen.goto(self.cell_center(x, y))
+                pen.dot(self.disc_size, self.hole_color)
+
+        font_size = max(8, self.cell_size // 4)
+        for y in range(grid.columns):
+            center_x, _ = self.cell_center(grid.rows - 1, y)
+            pen.goto(center_x, self.bottom - font_size * 2)
+            pen.write(ascii_uppercase[y], align="center", font=("Arial", font_size, "bold"))
+
+        self.screen.update()
+
+    def draw_disc(self, x: int, y: int, color: str) -> None:
+
+        self.pen.goto(self.cell_center(x, y))
+        self.pen.dot(self.disc_size, color)
+
+    def display_func(self) -> None:
+        """ Draws whatever changed since the last call, then refreshes the window once. \n
+        Discs only ever get added on top of a column (or taken off the top by an undo), so each column just compares
+        its drawn height with the grid. That's one check per column instead of one per cell. """
+
+        grid = self.grid
+        rows = grid.rows
+        for y in range(grid.columns):
+            height = self.drawn_heights[y]
+            while height < rows and grid.grid_matrix[rows - 1 - height][y].cell_state != CellState.EMPTY:
+                x = rows - 1 - height
+                self.draw_disc(x, y, self.disc_colors[grid.grid_matrix[x][y].cell_state.value])
+                height += 1
+            while height > 0 and grid.grid_matrix[rows - height][y].cell_state == CellState.EMPTY:
+                self.draw_disc(rows - height, y, self.hole_color)       # taken back
+                height -= 1
+            self.drawn_heights[y] = height
+        self.screen.update()
+
+        if self.show_heuristic or self.show_numpy:
+            super().display_func()                  # the debug views are text only, they go to the terminal as before
+
+    def reset_display(self, grid: Grid) -> None:
+        """ Empties the board for the next game. Only the discs that were drawn get painted over. """
+
+        size_changed = (grid.rows, grid.columns) != (self.grid.rows, self.grid.columns)
+        super().reset_display(grid)
+        if size_changed:
+            self.draw_board()
+            return
+
+        for y, height in enumerate(self.drawn_heights):
+            for h in range(height):
+                self.draw_disc(grid.rows - 1 - h, y, self.hole_color)
+        self.drawn_heights = [0] * grid.columns
+        self.screen.update()
+
+    def close(self) -> None:
+        """ Closes the turtle window. Called once at the end of the session, a new game in the same session keeps the window. """
+
+        try:
+            self.screen.bye()
+        except Exception as e:                      # the window was already closed by hand (turtle.Terminator / TclError)
+            logging.debug(f"Turtle window was already closed: {e}")
+
+
+def make_display(grid: Grid, use_turtle: bool = False) -> Display:
+    """ Returns a TurtleDisplay if it was asked for and a window can be opened, otherwise the terminal Display. """
+
+    if use_turtle:
+        try:
+            return TurtleDisplay(grid)
+        except Exception as e:                      # no tkinter, or no screen to open a window on
+            print(beesutils.color(f"Could not open the turtle window ({e}). Using the terminal display instead.", "red"))
+    return Display(grid)
+
 
 
 
@@ -141,26 +271,3 @@ class Display:
 #         """Override toggle feature function for terminal."""
 #         # Terminal toggle feature logic
 #         pass
-
-# class TurtleDisplay(Display):
-#     """Turtle display implementation."""
-
-#     def __init__(self, grid: object):
-#         # Initialize TurtleDisplay specific attributes
-#         pass
-
-#     def display_func(self) -> None:
-#         """Override display function for Turtle."""
-#         # Turtle display logic
-#         pass
-
-#     def reset_display(self, grid) -> None:
-#         """Override reset display function for Turtle."""
-#         # Turtle reset display logic
-#         pass
-
-#     def toggle_feature(self, feature: str) -> None:
-#         """Override toggle feature function for Turtle."""
-#         # Turtle toggle feature logic
-#         pass
-
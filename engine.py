@@ -0,0 +1,68 @@
+"""
+Module Name: engine.py
+
+    Headless way in to the game: the grid, the rules (checking system) and the computer players, with no display,
+    no input prompts, no turtle and no logging setup. Worker processes and batch tools should import this module
+    instead of connect_four.py. \n
+    NumPy is only imported if something actually uses Grid.numpy_grid, and the process pool for the parallel
+    search is only imported if the parallel search runs.
+"""
+
+from __future__ import annotations
+from typing import *
+from string import ascii_uppercase
+
+from cfenums import TurnToken, PlayerType, CellState, EngineType
+from gridmaker import Grid, Cell, StaticTables, get_static_tables
+from gamemanager import GameManager
+from checkinglogic import CheckingSystem
+from complogic import ComputerMoveCalculator
+from bitboard import BitBoard
+from searchlogic import NegamaxSearch, SearchResult, parallel_search
+from mctslogic import MCTSEngine
+
+
+def create_move_dict(grid: Grid) -> dict:
+    """ Generates a connect-four move dictionary from whatever grid is passed into it. (Columns only) \n
+    This could be in the Grid class, but the dictionary is different for every type of game so I figured it makes more sense
+    to have it here."""
+
+    columns = grid.columns                          # This move dictionary is very simple.
+    move_dict = {}                                  # It goes A:0, B:1, C:2, etc.
+
+    for col in range(columns):
+        move_dict[ascii_uppercase[col]] = col
+
+    return move_dict
+
+
+def new_game(rows: int = 6, columns: int = 7, **settings) -> GameManager:
+    """ Sets up a GameManager with a grid, checking system and move calculators, without asking any questions. \n
+    Any GameManager setting can be passed in, e.g. new_game(6, 7, engine_type=EngineType.SEARCH, search_depth=4).
+    Both players are set to COMPUTER. """
+
+    game_manager = GameManager()
+    game_manager.player1_type = PlayerType.COMPUTER
+    game_manager.player2_type = PlayerType.COMPUTER
+    for name, value in settings.items():
+        if not hasattr(game_manager, name):
+            raise ValueError(f"Unknown GameManager setting: {name}")
+        setattr(game_manager, name, value)
+
+    grid = Grid(rows, columns)
+    game_manager.remaining_cells = grid.total_cells
+    game_manager.attach_grid(grid, create_move_dict(grid))
+    game_manager.init_check_system()
+    game_manager.init_move_calculators()
+    return game_manager
+
+
+def play_cell(game_manager: GameManager, current_cell: Cell) -> CellState:
+    """ Plays a cell for the player whose turn it is and returns the winner (CellState.EMPTY if no winner).
+    Same steps as the core of game_loop in connect_four.py. Does NOT switch the turn token. """
+
+    game_manager.update_cell(current_cell)
+    game_manager.update_numpy(current_cell)
+    game_manager.record_move(current_cell)
+    game_manager.move_counter()
+    return game_manager.checking_system.check_win(game_manager.grid)
@@ -0,0 +1,336 @@
+"""
+Module Name: engineprotocol.py
+
+    A small line-based text protocol for running Connect Four engines as separate processes, over stdin/stdout pipes.
+    EngineProcess is the host side: it starts an engine program and asks it for moves (used by PlayerType.ENGINE).
+    serve() is the engine side: it wraps the ComputerMoveCalculator from complogic, so any of the built-in engines
+    can be run as a protocol engine. \n
+    Usage (engine side): python engineprotocol.py --engine search:depth=6
+    The --engine option takes the same engine configs as tournament.py.
+"""
+
+from __future__ import annotations
+from typing import *
+import argparse
+import logging
+import os
+import queue
+import subprocess
+import sys
+import time
+from string import ascii_uppercase
+
+import beesutils
+
+
+""" Notes about the protocol:
+Every message is one line of text. Columns are letters, the same as the move dictionary (A = 0, B = 1...).
+Host -> engine:                                  Engine -> host:
+    cf                                               id name <name>, then cfok
+    isready                                          readyok
+    newgame <rows> <columns>                         (nothing)
+    position [moves <letters>]                       (nothing)
+    go [time <seconds>] [nodes <n>] [depth <n>]      any number of 'info ...' lines, then bestmove <letter>
+    quit                                             (the engine exits)
+Anything the engine can't handle gets an 'error <message>' line back instead.
+'info' lines look like: info depth 6 score 12 nodes 5012 time 0.210 (every field is optional).
+'position' always sends the whole game, Player 1 first, so the engine never has to keep the game in sync itself. """
+
+DEFAULT_MOVE_TIMEOUT = 60.0             # seconds the host waits for a bestmove when 'go' has no time limit
+TIMEOUT_GRACE = 5.0                     # extra seconds on top of the time limit before an engine counts as stuck
+HANDSHAKE_TIMEOUT = 10.0
+
+
+class EngineError(Exception):
+    """ The engine process crashed, sent something the host didn't understand, or didn't answer in time. """
+
+
+class EngineInfo(NamedTuple):
+    """ The last 'info' line the engine sent before its bestmove. """
+
+    depth: Optional[int] = None
+    score: Optional[int] = None
+    nodes: Optional[int] = None
+    time: Optional[float] = None
+
+
+##########   Host side   ###########
+
+class EngineProcess:
+    """ Runs an engine program as a subprocess and talks to it over pipes. \n
+    The engine's output is read on a background thread into a queue, so the host can wait with a timeout.
+    A stuck engine gets killed and an EngineError is raised, the host game keeps running. If the process is gone,
+    the next best_move() starts it again. """
+
+    def __init__(self, command: List[str], name: str = "engine"):
+
+        self.command = command
+        self.name = name
+        self.process: Optional[subprocess.Popen] = None
+        self.lines: queue.Queue = queue.Queue()
+        self.size: Optional[Tuple[int, int]] = None      # board size the engine was last given with newgame
+        self.last_move_count = 0
+        self.engine_name = name
+        self.last_info = EngineInfo()
+
+    def start(self) -> None:
+
+        logging.debug(beesutils.color(f"Starting engine {self.name}: {self.command}", "cyan"))
+        try:
+            self.process = subprocess.Popen(self.command, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                            text=True, bufsize=1)
+        except OSError as e:
+            raise EngineError(f"Could not start engine {self.name}: {e}")
+
+        self.lines = queue.Queue()                       # a fresh queue, so nothing from an old process gets mixed in
+        process, lines = self.process, self.lines
+
+        def read_output() -> None:
+            for line in process.stdout:
+                lines.put(line.strip())
+            lines.put(None)                              # end of output, the process closed its stdout
+
+        beesutils.thread_runner(read_output)
+        self.size = None
+
+        self.send("cf")
+        for line in self.read_until("cfok", HANDSHAKE_TIMEOUT):
+            if line.startswith("id name "):
+                self.engine_name = line[8:]
+
+    @property
+    def running(self) -> bool:
+
+        return self.process is not None and self.process.poll() is None
+
+    def send(self, line: str) -> None:
+
+        logging.debug(f"{self.name} <- {line}")
+        try:
+            self.process.stdin.write(line + "\n")
+            self.process.stdin.flush()
+        except (OSError, ValueError) as e:               # broken pipe, or stdin already closed
+            self.kill()
+            raise EngineError(f"Engine {self.name} is not running: {e}")
+
+    def read_until(self, prefix: str, timeout: float) -> List[str]:
+        """ Collects lines until one starts with prefix, and returns all of them (the matching one last). """
+
+        deadline = time.perf_counter() + timeout
+        received = []
+        while True:
+            try:
+                line = self.lines.get(timeout=max(0.0, deadline - time.perf_counter()))
+            except queue.Empty:
+                self.kill()
+                raise EngineError(f"Engine {self.name} didn't answer within {timeout:.1f} seconds, it was stopped.")
+            if line is None:
+                self.kill()
+                raise EngineError(f"Engine {self.name} quit unexpectedly.")
+
+            logging.debug(f"{self.name} -> {line}")
+            received.append(line)
+            if line.startswith("error"):
+                raise EngineError(f"Engine {self.name}: {line}")
+            if line.startswith(prefix):
+                return received
+
+    def best_move(self, rows: int, columns: int, move_columns: List[int], time_limit: Optional[float] = None,
+                  node_limit: Optional[int] = None, depth: Optional[int] = None) -> int:
+        """ Sends the position and asks for a move. Returns the column index. """
+
+        if not self.running:
+            self.start()
+
+        # a different board size, or fewer moves than last time, means a new game has started
+        if self.size != (rows, columns) or len(move_columns) < self.last_move_count:
+            self.send(f"newgame {rows} {columns}")
+            self.size = (rows, columns)
+        self.last_move_count = len(move_columns)
+
+        self.send("position moves " + "".join(ascii_uppercase[col] for col in move_columns))
+        go = "go"
+        if time_limit is not None:
+            go += f" time {time_limit}"
+        if node_limit is not None:
+            go += f" nodes {node_limit}"
+        if depth is not None:
+            go += f" depth {depth}"
+        self.send(go)
+
+        timeout = time_limit + TIMEOUT_GRACE if time_limit is not None else DEFAULT_MOVE_TIMEOUT
+        received = self.read_until("bestmove", timeout)
+
+        self.last_info = EngineInfo()
+        for line in received:
+            if line.startswith("info"):
+                self.last_info = parse_info(line)
+
+        letter = received[-1].split()[1] if len(received[-1].split()) > 1 else ""
+        column = ascii_uppercase.find(letter.upper())
+        if len(letter) != 1 or column < 0 or column >= columns:
+            raise EngineError(f"Engine {self.name} sent an invalid move: {received[-1]}")
+        return column
+
+    def close(self) -> None:
+        """ Asks the engine to quit, and kills it if it doesn't. """
+
+        if not self.running:
+            return
+        try:
+            self.send("quit")
+            self.process.wait(timeout=2)
+        except (EngineError, subprocess.TimeoutExpired):
+            self.kill()
+
+    def kill(self) -> None:
+
+        if self.process is not None and self.process.poll() is None:
+            self.process.kill()
+            self.process.wait()
+
+
+def parse_info(line: str) -> EngineInfo:
+
+    words = line.split()[1:]
+    fields = dict(zip(words[::2], words[1::2]))
+    try:
+        return EngineInfo(
+            depth=int(fields["depth"]) if "depth" in fields else None,
+            score=int(fields["score"]) if "score" in fields else None,
+            nodes=int(fields["nodes"]) if "nodes" in fields else None,
+            time=float(fields["time"]) if "time" in fields else None,
+        )
+    except ValueError:
+        return EngineInfo()
+
+
+##########   Engine side   ###########
+
+class CalculatorEngine:
+    """ The protocol engine built from complogic's ComputerMoveCalculator. The position is rebuilt with
+    GameManager.replay_moves, then the calculator picks the move exactly like it does in the game. """
+
+    def __init__(self, config_text: str):
+
+        from tournament import parse_engine_config       # tournament pulls in the whole game, only load it on the engine side
+        self.config = parse_engine_config(config_text)
+        self.game_manager = None
+        self.calculator = None
+
+    def new_game(self, rows: int, columns: int) -> None:
+
+        import engine
+        from tournament import build_calculator
+
+        if not (4 <= rows <= 20 and 4 <= columns <= 26):
+            raise ValueError("Board size must be between 4x4 and 20x26.")
+        self.game_manager = engine.new_game(rows, columns)
+        self.calculator = build_calculator(self.game_manager, self.config)
+        self.game_manager.comp_move_calc = self.calculator
+
+    def set_position(self, moves: str) -> None:
+
+        if self.game_manager is None:
+            self.new_game(6, 7)
+        game_manager = self.game_manager
+        winner = game_manager.replay_moves(moves)
+        # a dead draw is over too, and replay_moves leaves the turn on the side that just moved, like game_loop does
+        if winner.value != 0 or game_manager.remaining_cells == 0 or game_manager.is_dead_draw:
+            game_manager.replay_moves("")                # so a 'go' after the error doesn't search a finished game
+            raise ValueError("The game in that position is already over.")
+
+    def go(self, time_limit: Optional[float], node_limit: Optional[int], depth: Optional[int]) -> Tuple[int, Optional[str]]:
+        """ Returns (column, info line or None). Limits are used by the engines that have a matching setting. """
+
+        from cfenums import EngineType
+        import searchlogic
+
+        calculator = self.calculator
+        if calculator.engine_type == EngineType.SEARCH and (time_limit is not None or node_limit is not None):
+            result = searchlogic.NegamaxSearch(1).search_with_budget(calculator.current_bitboard(), time_limit,
+                                                                     node_limit, depth or calculator.search_depth)
+            calculator.last_search = result
+            column = result.column
+        else:
+            # The limits only count for this one move. The configured setting is put back afterwards,
+            # so a later 'go' without limits searches the way the engine was set up.
+            owner, attribute, limit = None, "", None          # the one setting this 'go' overrides, if any
+            if calculator.engine_type == EngineType.MCTS and time_limit is not None:
+                owner, attribute, limit = calculator.mcts_engine, "time_limit", time_limit
+            elif calculator.engine_type == EngineType.FOCUSED and node_limit is not None:
+                owner, attribute, limit = calculator.focused_search, "node_budget", node_limit
+            elif calculator.engine_type == EngineType.SEARCH and depth is not None:
+                owner, attribute, limit = calculator, "search_depth", depth
+
+            configured = getattr(owner, attribute) if owner is not None else None
+            try:
+                if owner is not None:
+                    setattr(owner, attribute, limit)
+                calculator.last_search = None
+                column = calculator.computer_move().y
+            finally:
+                if owner is not None:
+                    setattr(owner, attribute, configured)
+
+        result = calculator.last_search
+        if result is None:
+            return column, None
+        return column, f"info depth {result.depth} score {result.score} nodes {result.nodes} time {result.elapsed:.3f}"
+
+
+def serve(engine: CalculatorEngine, input_stream: TextIO = sys.stdin, output_stream: TextIO = sys.stdout) -> None:
+    """ Engine main loop. Answers commands until 'quit' or the end of the input. """
+
+    def reply(line: str) -> None:
+        output_stream.write(line + "\n")
+        output_stream.flush()                            # the host is waiting for this line
+
+    for line in input_stream:
+        words = line.split()
+        if not words:
+            continue
+        command, args = words[0], words[1:]
+
+        try:
+            if command == "cf":
+                reply(f"id name {engine.config.name}")
+                reply("cfok")
+            elif command == "isready":
+                reply("readyok")
+            elif command == "newgame":
+                engine.new_game(int(args[0]), int(args[1]))
+            elif command == "position":
+                engine.set_position(args[1] if len(args) > 1 and args[0] == "moves" else "")
+            elif command == "go":
+                limits = dict(zip(args[::2], args[1::2]))
+                column, info = engine.go(float(limits["time"]) if "time" in limits else None,
+                                         int(limits["nodes"]) if "nodes" in limits else None,
+                                         int(limits["depth"]) if "depth" in limits else None)
+                if info:
+                    reply(info)
+                reply(f"bestmove {ascii_uppercase[column]}")
+            elif command == "quit":
+                break
+            else:
+                reply(f"error unknown command {command}")
+        except (ValueError, IndexError) as e:
+            reply(f"error {e}")
+
+
+def default_engine_command(config_text: str = "heuristic") -> List[str]:
+    """ Command line that runs this module as an engine, with the same Python as the host. """
+
+    return [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "engineprotocol.py"),
+            "--engine", config_text]
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Run one of the built-in Connect Four engines over the text protocol.")
+    parser.add_argument("--engine", default="heuristic",
+                        help="Engine config, e.g. 'heuristic', 'search:depth=6', 'mcts:time=0.5', 'focused:nodes=20000'.")
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)                        # stdout is the protocol, nothing else can be printed there
+    serve(CalculatorEngine(args.engine))
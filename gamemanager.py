@@ -10,7 +10,7 @@ from typing import *
 import logging
 from string import ascii_uppercase
 
-from cfenums import TurnToken, PlayerType, CellState
+from cfenums import TurnToken, PlayerType, CellState, EngineType
 import inputfuncs
 import complogic
 import checkinglogic
@@ -18,6 +18,8 @@ import beesutils
 
 if TYPE_CHECKING:
     from gridmaker import Grid, Cell
+    from engineprotocol import EngineProcess
+    from profiling import DebugSessions, Session
 # TO DO
 # Create an enum array inside the grid class
 # make complogic use the enum array instead of the grid_matrix
@@ -40,6 +42,22 @@ class GameManager:
         self.remaining_cells = 0
         self.winner_direction = None                 # for display victory direction
         self.win_starting_column = None
+        self.move_columns: List[int] = []            # every column played this game, in order. This is the move stack
+        self.redo_columns: List[int] = []            # moves that were taken back, the next one to redo is at the end
+        self.column_heights: List[int] = []          # discs in each column, so undo can find the top disc without a scan
+        self.engine_type = EngineType.HEURISTIC      # which AI the computer players use
+        self.randomness_threshold = 0.2              # heuristic AI: chance of playing a completely random move
+        self.search_depth = 6                        # plies, only used by the search engine
+        self.search_workers = 1                      # more than 1 turns on the parallel root-split search
+        self.mcts_playouts = 2000                    # playouts per move, only used by the MCTS engine
+        self.mcts_time_limit = None                  # seconds per move (replaces the playout count if set)
+        self.search_node_budget = 20_000             # nodes per move, only used by the focused search engine
+        self.use_turtle_display = False              # show the board in a turtle window instead of the terminal
+        self.engine_commands: Dict[int, List[str]] = {}      # player number -> command line, for PlayerType.ENGINE players
+        self.engine_players: Dict[int, EngineProcess] = {}
+        self.engine_time_limit: Optional[float] = 1.0        # seconds per move sent to external engines
+        self.debug_sessions: Optional[DebugSessions] = None  # 'profile' and 'memory' sessions, see profiling.py
+        self.debug_tracked: Dict[str, object] = {}           # extra objects the 'memory' session measures, e.g. the simulator
         self.initialization_message()
 
     def attach_grid(self, grid: Grid, move_dict: dict) -> None:
@@ -47,6 +65,8 @@ class GameManager:
 
         self.grid = grid
         self.move_dict = move_dict
+        self.column_heights = [0] * grid.columns
+        self.reset_line_tracking()
         logging.debug(beesutils.color(f"Grid and move dictionary attached to GameManager."))
 
 
@@ -62,6 +82,10 @@ class GameManager:
 
         self.comp_move_calc = complogic.ComputerMoveCalculator(self)
         self.human_move_calc = inputfuncs.HumanMoveReturner(self)
+        for player_num, command in self.engine_commands.items():
+            if player_num not in self.engine_players:
+                import engineprotocol                               # subprocess and friends, only loaded if there's an engine player
+                self.engine_players[player_num] = engineprotocol.EngineProcess(command, f"Player {player_num} engine")
         logging.debug(beesutils.color(f"Move Calculators initialized."))
 
 
@@ -93,6 +117,10 @@ class GameManager:
         self.remaining_cells = total_cells
         self.winner_direction = None
         self.win_starting_column = None
+        self.move_columns = []
+        self.redo_columns = []
+        self.column_heights = [0] * len(self.column_heights)
+        self.reset_line_tracking()
         self.turn_token = TurnToken.PLAYER1
 
 
@@ -102,6 +130,26 @@ class GameManager:
         self.player1_type = player1
         self.player2_type = player2
 
+        for player_num, player_type in ((1, player1), (2, player2)):
+            if player_type == PlayerType.ENGINE:
+                self.engine_commands[player_num] = inputfuncs.choose_engine_command(player_num)
+
+
+    def choose_engine_bridge(self) -> None:
+
+        engine_type, workers = inputfuncs.choose_engine()
+        self.engine_type = engine_type
+        self.search_workers = workers
+
+        if engine_type == EngineType.MCTS:
+            self.mcts_playouts, self.mcts_time_limit = inputfuncs.choose_mcts_budget()
+
+
+    def choose_display_bridge(self) -> bool:
+
+        self.use_turtle_display = inputfuncs.choose_display()
+        return self.use_turtle_display
+
 
     def choose_size_bridge(self) -> Tuple[int, int]:
 
@@ -121,6 +169,172 @@ class GameManager:
             self.remaining_cells -= 1
 
 
+    def record_move(self, current_cell: Cell) -> None:
+        """ Remembers which column was played. Used by the simulation statistics, the training data export and undo. \n
+        A new move means the moves that were taken back can't be redone anymore. """
+
+        self.redo_columns.clear()
+        self.push_move(current_cell.y)
+
+    def push_move(self, column: int) -> None:
+
+        player_num = len(self.move_columns) % 2 + 1                 # Player 1 always moves first
+        x = self.grid.rows - 1 - self.column_heights[column]        # the row the disc landed in
+        self.move_columns.append(column)
+        self.column_heights[column] += 1
+        self.block_lines(x, column, player_num, 1)
+
+    @property
+    def first_move_column(self) -> Optional[int]:
+
+        return self.move_columns[0] if self.move_columns else None
+
+    @property
+    def last_move_column(self) -> Optional[int]:
+
+        return self.move_columns[-1] if self.move_columns else None
+
+
+    #################   Move history   ##################
+
+    """ Notes about the move history:
+    move_columns is a stack of column indexes, nothing else. The cell a move landed in is worked out from
+    column_heights, so undo and redo are O(1) and never scan the grid.
+    Player 1 always moves first, so whose turn it is comes from the number of moves played. """
+
+    def set_turn_from_history(self) -> None:
+
+        self.turn_token = TurnToken.PLAYER1 if len(self.move_columns) % 2 == 0 else TurnToken.PLAYER2
+
+    def undo_move(self) -> Optional[Cell]:
+        """ Takes back the last move and returns the cell it was in (now empty), or None if there's nothing to undo.
+        Afterwards it's the turn of the player whose move was taken back. """
+
+        if not self.move_columns:
+            return None
+
+        column = self.move_columns.pop()
+        self.column_heights[column] -= 1
+        self.redo_columns.append(column)
+        cell = self.grid.grid_matrix[self.grid.rows - 1 - self.column_heights[column]][column]
+        self.block_lines(cell.x, column, len(self.move_columns) % 2 + 1, -1)
+
+        self.set_turn_from_history()                                    # back to the player who made the move
+        if self.turn_token == TurnToken.PLAYER1:
+            self.player1_moves -= 1
+        else:
+            self.player2_moves -= 1
+        self.remaining_cells += 1
+        self.winner_direction = None                                    # the move might have been the winning one
+        self.win_starting_column = None
+
+        cell.cell_state = CellState.EMPTY
+        if self.grid.has_numpy_grid:
+            self.grid.numpy_grid[cell.x, cell.y] = 0
+
+        logging.debug(beesutils.color(f"Took back move in column {ascii_uppercase[column]}", "cyan"))
+        return cell
+
+    def redo_move(self) -> Optional[Cell]:
+        """ Plays the last move that was taken back again and returns its cell, or None if there's nothing to redo.
+        Doesn't check for a win, the caller can run check_win if it needs to. Afterwards it's the other player's turn. """
+
+        if not self.redo_columns:
+            return None
+
+        column = self.redo_columns.pop()
+        cell = self.grid.grid_matrix[self.grid.rows - 1 - self.column_heights[column]][column]
+
+        self.set_turn_from_history()
+        self.update_cell(cell)
+        self.update_numpy(cell)
+        self.push_move(column)                                          # not record_move, that would clear the redo stack
+        self.move_counter()
+        self.switch_player()
+
+        logging.debug(beesutils.color(f"Redid move in column {ascii_uppercase[column]}", "cyan"))
+        return cell
+
+    def replay_moves(self, move_string: str) -> CellState:
+        """ Resets the game and plays a whole move string (column letters, e.g. "DDCEF") straight into the grid. \n
+        The discs are placed directly, with no win check after each move. Only the final position is checked,
+        so it returns the winner (CellState.EMPTY if none). Raises ValueError for a bad letter or a full column,
+        and leaves the grid reset if it does. """
+
+        grid = self.grid
+        grid.reset_grid()
+        self.reset_game(grid.total_cells)
+
+        try:
+            for position, letter in enumerate(move_string.strip().upper()):
+                if letter not in self.move_dict:
+                    raise ValueError(f"'{letter}' at move {position + 1} is not a column on this board.")
+                column = self.move_dict[letter]
+                if self.column_heights[column] == grid.rows:
+                    raise ValueError(f"Column {letter} is already full at move {position + 1}.")
+
+                cell = grid.grid_matrix[grid.rows - 1 - self.column_heights[column]][column]
+                cell.cell_state = CellState(position % 2 + 1)                  # Player 1 always moves first
+                self.push_move(column)
+        except ValueError:
+            grid.reset_grid()
+            self.reset_game(grid.total_cells)
+            raise
+
+        moves = len(self.move_columns)
+        self.player1_moves = (moves + 1) // 2
+        self.player2_moves = moves // 2
+        self.remaining_cells = grid.total_cells - moves
+        if grid.has_numpy_grid:
+            for row, numpy_row in zip(grid.grid_matrix, grid.numpy_grid):      # one copy at the end instead of one per move
+                numpy_row[:] = [cell.cell_state.value for cell in row]
+
+        self.set_turn_from_history()
+        winner = self.checking_system.check_win(grid) if moves else CellState.EMPTY
+        if winner != CellState.EMPTY or self.remaining_cells == 0 or self.is_dead_draw:
+            self.turn_token = TurnToken((moves - 1) % 2 + 1)          # same as game_loop: the turn doesn't switch once the game is over
+        logging.debug(beesutils.color(f"Replayed {moves} moves. Winner: {winner}", "cyan"))
+        return winner
+
+
+    #################   Dead draw tracking   ##################
+
+    """ Notes about the dead draw tracking:
+    A player can only still win with a line (any possible four-in-a-row from the static tables) that has none of the
+    opponent's discs in it. line_blockers[player] counts the opponent's discs in each line, and live_lines[player] is how
+    many of that player's lines are still at 0. Every disc only touches the lines through its own cell (cell_lines),
+    so keeping this up to date costs a handful of steps per move. Once neither player has a live line left,
+    the game is a draw no matter how the rest of the board gets filled. """
+
+    def reset_line_tracking(self) -> None:
+
+        line_count = len(self.grid.static_tables.lines)
+        self.line_blockers = [bytearray(), bytearray(line_count), bytearray(line_count)]    # indexed by player number, 0 is unused
+        self.live_lines = [0, line_count, line_count]
+
+    def block_lines(self, x: int, y: int, player_num: int, step: int) -> None:
+        """ A disc of player_num at (x, y) blocks every line through that cell for the opponent (step 1),
+        or unblocks them again when the disc is taken back (step -1). """
+
+        opponent = 3 - player_num
+        blockers = self.line_blockers[opponent]
+        for index in self.grid.static_tables.cell_lines[x][y]:
+            if step > 0:
+                if blockers[index] == 0:
+                    self.live_lines[opponent] -= 1
+                blockers[index] += 1
+            else:
+                blockers[index] -= 1
+                if blockers[index] == 0:
+                    self.live_lines[opponent] += 1
+
+    @property
+    def is_dead_draw(self) -> bool:
+        """ True once neither player can ever complete four in a row. """
+
+        return self.live_lines[1] == 0 and self.live_lines[2] == 0
+
+
     def update_win_counters(self, direction: str) -> None:
         """ This function increments the win counters based on the direction of the win. """
 
@@ -165,6 +379,11 @@ class GameManager:
         
         
     def update_numpy(self, current_cell: Cell) -> None:
+        """ Keeps the numpy grid in sync. If nothing has asked for the numpy grid yet, there's nothing to update
+        (it gets built from the cells when it's first used). """
+
+        if not self.grid.has_numpy_grid:
+            return
 
         x = current_cell.x
         y = current_cell.y
@@ -203,6 +422,9 @@ class GameManager:
         elif player_type == PlayerType.COMPUTER:
             current_cell = self.comp_move_calc.computer_move()      # self-method of ComputerMoveCalculator
 
+        elif player_type == PlayerType.ENGINE:
+            current_cell = self.engine_move()
+
         else:
             logging.error(f"Error in move_system. self.turn_token: {self.turn_token}", "red")
             current_cell = None
@@ -210,6 +432,55 @@ class GameManager:
         return current_cell
             
 
+    def engine_move(self) -> Cell:
+        """ Asks the external engine of the current player for a move. If the engine crashes, hangs or sends a bad move,
+        it gets stopped and the built-in computer plays this move instead, so the game carries on.
+        The engine is started again on its next turn. """
+
+        import engineprotocol
+
+        engine_player = self.engine_players[self.turn_token.value]
+        try:
+            column = engine_player.best_move(self.grid.rows, self.grid.columns, self.move_columns, self.engine_time_limit)
+            current_cell = self.checking_system.check_column(column)
+            if current_cell is None:
+                raise engineprotocol.EngineError(f"{engine_player.name} played full column {ascii_uppercase[column]}")
+            logging.debug(beesutils.color(f"{engine_player.engine_name} chose column {ascii_uppercase[column]} | {engine_player.last_info}", "green"))
+            return current_cell
+
+        except engineprotocol.EngineError as e:
+            engine_player.kill()
+            print(beesutils.color(f"{e} The built-in computer plays this move instead.", "red"))
+            return self.comp_move_calc.computer_move()
+
+    def start_debug_session(self, session: Session) -> None:
+        """ profiling (cProfile, tracemalloc...) is only loaded once somebody actually starts a session. """
+
+        if self.debug_sessions is None:
+            import profiling
+            self.debug_sessions = profiling.DebugSessions(self)
+        self.debug_sessions.start(session)
+
+    def tick_debug_sessions(self, unit: str) -> None:
+        """ Called by game_loop after every move ("moves") and every game ("games"). """
+
+        if self.debug_sessions is not None:
+            self.debug_sessions.tick(unit)
+
+    def finish_debug_sessions(self) -> None:
+        """ Reports whatever is still running when the run ends. """
+
+        if self.debug_sessions is not None:
+            self.debug_sessions.finish_all()
+
+    def close_engines(self) -> None:
+        """ Stops every external engine process. """
+
+        for engine_player in self.engine_players.values():
+            engine_player.close()
+        self.engine_players.clear()
+
+
     ####################   Extras  #####################
 
     @staticmethod
@@ -4,13 +4,10 @@ Module Name: gridmaker.py
     This is a 'grid generator' script. I'm hoping this will over time become a class that can be imported into other games.
 """
 
-import numpy as np
 from typing import *
 
 from cfenums import CellState
 
-# TO DO - add the NumPy array directly into the Grid class
-
 
 ANSI = {
     "red": "\033[31m",
@@ -20,6 +17,60 @@ ANSI = {
     "reset": "\033[0m",
 }
 
+class StaticTables(NamedTuple):
+    """ Per-cell tables that only depend on the board size. All indexed [x][y] like grid_matrix (x = 0 is the top row). """
+
+    heuristic: Tuple[Tuple[int, ...], ...]              # height + distance from center, lower is better (the original heuristic)
+    line_counts: Tuple[Tuple[int, ...], ...]            # how many possible four-in-a-rows go through the cell, higher is better
+    parity: Tuple[Tuple[int, ...], ...]                 # 1 if the cell is on an odd row counting from the bottom (1st, 3rd...), else 0
+    lines: Tuple[Tuple[Tuple[int, int], ...], ...]      # every possible four-in-a-row, as 4 (x, y) tuples
+    cell_lines: Tuple[Tuple[Tuple[int, ...], ...], ...] # indexes into lines for the lines going through each cell
+
+
+_static_tables: Dict[Tuple[int, int], StaticTables] = {}     # keyed by (rows, columns)
+
+
+def get_static_tables(rows: int, columns: int) -> StaticTables:
+    """ Builds the static tables for a board size the first time it's asked for, then returns the cached copy.
+    So every new Grid (and every simulated game) of the same size shares one set of tables. """
+
+    size = (rows, columns)
+    if size in _static_tables:
+        return _static_tables[size]
+
+    # Assigns the highest number to the top row and the lowest number to the bottom row. Lower is better.
+    row_scores = [i for i in range(rows, -1, -1)]
+    center = columns // 2      # // floor division, rounds down to the nearest whole number
+    col_scores = [abs(j - center) for j in range(columns)]
+    heuristic = tuple(tuple(row_scores[i] + col_scores[j] for j in range(columns)) for i in range(rows))
+
+    lines = []
+    for x in range(rows):
+        for y in range(columns):
+            for dx, dy in ((0, 1), (1, 0), (1, 1), (1, -1)):       # same 4 directions as check_win
+                end_x, end_y = x + 3 * dx, y + 3 * dy
+                if 0 <= end_x < rows and 0 <= end_y < columns:
+                    lines.append(tuple((x + i * dx, y + i * dy) for i in range(4)))
+
+    cell_lines = [[[] for _ in range(columns)] for _ in range(rows)]
+    for index, line in enumerate(lines):
+        for x, y in line:
+            cell_lines[x][y].append(index)
+
+    line_counts = tuple(tuple(len(cell_lines[x][y]) for y in range(columns)) for x in range(rows))
+    parity = tuple(tuple((rows - x) % 2 for _ in range(columns)) for x in range(rows))
+
+    tables = StaticTables(
+        heuristic=heuristic,
+        line_counts=line_counts,
+        parity=parity,
+        lines=tuple(lines),
+        cell_lines=tuple(tuple(tuple(indexes) for indexes in row) for row in cell_lines),
+    )
+    _static_tables[size] = tables
+    return tables
+
+
 class Cell:
     """ Defines the properties of each cell """
     
@@ -49,15 +100,16 @@ class Grid:
     """ This initializes a grid of cells. \n
     Takes number of rows and columns as arguments and generates grid dynamically. \n
     There's also a method to reset the grid to its default state, a method to assign heuristic scores to each cell, \n
-    and a NumPy array included in the init."""
+    and a numpy_grid property that builds the NumPy array the first time it's used (NumPy is only imported then)."""
 
     def __init__(self, rows: int, columns: int):
         self.rows = rows                   
         self.columns = columns
         self.total_cells = rows * columns
         self.grid_matrix = [[Cell(x, y) for y in range(columns)] for x in range(rows)]
+        self.static_tables = get_static_tables(rows, columns)       # shared by every grid of this size
         self.assign_heuristic_scores()
-        self.numpy_grid = np.zeros((rows, columns), dtype=int)
+        self._numpy_grid = None                  # built the first time numpy_grid is used, so NumPy only loads if it's needed
 
         # A line above (self.grid_matrix) is the list comprehension version of the following
         # this is just here for educational purposes, I'm still new to list comprehensions
@@ -71,21 +123,27 @@ class Grid:
         #     self.grid_matrix.append(row)        ## When row is finished, append to the grid
 
     def assign_heuristic_scores(self):
-        """ Assigns heuristic scores to each cell in the grid. """
-
-        # Assigns the highest number to the top row and the lowest number to the bottom row. Lower is better.
-        row_scores = [i for i in range(self.rows, -1, -1)]
-
-        center = self.columns // 2      # // floor division, rounds down to the nearest whole number
-        col_scores = []
-        for j in range(self.columns):
-            dist_from_center = abs(j - center)
-            col_scores.append(dist_from_center)
+        """ Assigns heuristic scores to each cell in the grid. The scores come from the cached static tables. """
 
+        heuristic = self.static_tables.heuristic
         for i in range(self.rows):
             for j in range(self.columns):
-                heuristic_score = row_scores[i] + col_scores[j]     # lower is better
-                self.grid_matrix[i][j].heuristic_score = heuristic_score
+                self.grid_matrix[i][j].heuristic_score = heuristic[i][j]     # lower is better
+
+    @property
+    def numpy_grid(self):
+        """ NumPy copy of the grid (0 = empty, 1 = Player 1, 2 = Player 2). NumPy is imported the first time this is used,
+        and the array is filled in from the current cell states, so it's correct no matter when it's first asked for. """
+
+        if self._numpy_grid is None:
+            import numpy as np
+            self._numpy_grid = np.array([[cell.cell_state.value for cell in row] for row in self.grid_matrix], dtype=int)
+        return self._numpy_grid
+
+    @property
+    def has_numpy_grid(self) -> bool:
+
+        return self._numpy_grid is not None
 
     def reset_grid(self):
         """ Resets the grid to its default state. """
@@ -93,4 +151,6 @@ class Grid:
         for row in self.grid_matrix:
             for cell in row:
                 cell.cell_state = CellState.EMPTY
+        if self._numpy_grid is not None:
+            self._numpy_grid.fill(0)             # the numpy copy has to be cleared too, or rollouts see the old game
 
@@ -7,13 +7,16 @@ Module Name: inputfuncs.py
 from __future__ import annotations
 from typing import *
 import logging
+import os
+import shlex
 
 if TYPE_CHECKING:
     from gamemanager import GameManager
     from gridmaker import Cell
+    from profiling import SessionLength
 
 
-from cfenums import TurnToken, PlayerType, CellState
+from cfenums import TurnToken, PlayerType, CellState, EngineType
 
 
 import beesutils
@@ -28,6 +31,7 @@ class HumanMoveReturner:
         self.game_manager = game_manager
         self.move_dict = game_manager.move_dict
         self.check_column = game_manager.checking_system.check_column
+        self.redraw: Optional[Callable[[], None]] = None     # set by main_game, shows the board again after an undo or redo
 
     def human_move(self) -> Cell:
 
@@ -37,8 +41,11 @@ class HumanMoveReturner:
             if move.upper() == "DEBUG":
                 beesutils.log_level_toggle()
                 continue
+            if move in ("UNDO", "REDO"):
+                self.take_back(undo=move == "UNDO")
+                continue
             if move not in self.move_dict:
-                print("Invalid move. Please enter a valid move.")
+                print("Invalid move. Please enter a valid move (a column letter, or 'undo' / 'redo').")
                 continue
             
             column_index: int = self.move_dict[move]
@@ -52,6 +59,27 @@ class HumanMoveReturner:
 
             logging.debug(f"lowest empty cell coordinates: {repr(lowest_cell)}")
             return lowest_cell
+
+    def take_back(self, undo: bool) -> None:
+        """ Undoes (or redoes) moves until it's a human's turn again: one move if both players are human,
+        otherwise this player's last move and the computer's (or engine's) reply to it. """
+
+        game_manager = self.game_manager
+        both_human = game_manager.player1_type == game_manager.player2_type == PlayerType.HUMAN
+        steps = 1 if both_human else 2
+        history = game_manager.move_columns if undo else game_manager.redo_columns
+        if len(history) < steps:
+            print(f"Nothing to {'undo' if undo else 'redo'}.")
+            return
+
+        for _ in range(steps):
+            if undo:
+                game_manager.undo_move()
+            else:
+                game_manager.redo_move()
+        if self.redraw is not None:
+            self.redraw()
+        print(beesutils.color(f"{'Took back' if undo else 'Played again'} {steps} move{'s' if steps > 1 else ''}.", "cyan"))
     
 
 ################### Setup functions #####################
@@ -106,6 +134,40 @@ def choose_size() -> Tuple[int, int]:
             rows = 6
             columns = 7
             return rows, columns
+
+
+def choose_engine_command(player_num: int) -> List[str]:
+    """ Asks for the command line of an external engine (PlayerType.ENGINE). Enter runs the built-in engines
+    as a separate process. Returns the command as a list, ready for subprocess. """
+
+    import engineprotocol                               # only needed when somebody picks an engine player
+
+    print(f"Player {player_num} is an external engine. Enter the command that starts it, or an engine config for the built-in one.")
+    print("Examples: 'search:depth=6', 'mcts:time=0.5', '/path/to/my_engine --threads 2'. Press Enter for the built-in heuristic AI.")
+
+    while True:
+        choice = input(f"Player {player_num} engine: ").strip()
+        if choice.lower() == "debug":
+            beesutils.log_level_toggle()
+            continue
+        if not choice:
+            return engineprotocol.default_engine_command()
+        if choice.split(":")[0].lower() in ("heuristic", "search", "mcts", "focused"):
+            return engineprotocol.default_engine_command(choice)
+        return shlex.split(choice)
+
+
+def choose_display() -> bool:
+    """ Asks if the board should be shown in a turtle graphics window instead of the terminal. Returns True for turtle. """
+
+    print("Type 't' to show the board in a turtle graphics window. Anything else uses the terminal.")
+
+    while True:
+        choice = input("'t' for turtle window, anything else for terminal: ").lower()
+        if choice == "debug":
+            beesutils.log_level_toggle()
+            continue
+        return choice == "t"
         
 
 def choose_player_types() -> Tuple[PlayerType, PlayerType]:
@@ -114,7 +176,7 @@ def choose_player_types() -> Tuple[PlayerType, PlayerType]:
     while True:
 
         while True:
-            player1_choice = input("First, set Player 1 to Human or Computer (H or C): ").upper()
+            player1_choice = input("First, set Player 1 to Human, Computer or external Engine (H, C or E): ").upper()
 
             if player1_choice == "H":
                 player1 = PlayerType.HUMAN
@@ -122,12 +184,15 @@ def choose_player_types() -> Tuple[PlayerType, PlayerType]:
             elif player1_choice == "C":
                 player1 = PlayerType.COMPUTER
                 break
+            elif player1_choice == "E":
+                player1 = PlayerType.ENGINE
+                break
             else:
-                print("Invalid input. Please enter H or C.")
+                print("Invalid input. Please enter H, C or E.")
                 continue
 
         while True:
-            player2_choice = input("Now, set Player 2 to Human or Computer (H or C): ").upper()
+            player2_choice = input("Now, set Player 2 to Human, Computer or external Engine (H, C or E): ").upper()
 
             if player2_choice == "H":
                 player2 = PlayerType.HUMAN
@@ -135,8 +200,11 @@ def choose_player_types() -> Tuple[PlayerType, PlayerType]:
             elif player2_choice == "C":
                 player2 = PlayerType.COMPUTER
                 break
+            elif player2_choice == "E":
+                player2 = PlayerType.ENGINE
+                break
             else:
-                print("Invalid input. Please enter H or C.")
+                print("Invalid input. Please enter H, C or E.")
                 continue
 
         print(f"Player 1 is {player1.name} and Player 2 is {player2.name}.")
@@ -144,4 +212,79 @@ def choose_player_types() -> Tuple[PlayerType, PlayerType]:
         if confirm == "N":
             continue
         else:
-            return player1, player2
\ No newline at end of file
+            return player1, player2
+
+
+def choose_engine() -> Tuple[EngineType, int]:
+    """ This function allows the user to choose which AI the computer players use.
+    Returns the engine type and the number of worker processes for the search. """
+
+    print("Choose the computer engine. Press Enter for the default heuristic AI.")
+    print("Type 's' for the search engine, or 'p' for the parallel search engine (uses every CPU core).")
+    print("Type 'm' for the Monte Carlo engine (best for big boards).")
+    print("Type 'f' for the focused search engine (same speed per move on every board size).")
+
+    while True:
+        choice = input("Enter for heuristic, 's' for search, 'p' for parallel search, 'm' for Monte Carlo, 'f' for focused: ").lower()
+
+        if choice == "debug":
+            beesutils.log_level_toggle()
+            continue
+        elif choice == "s":
+            return EngineType.SEARCH, 1
+        elif choice == "p":
+            workers = os.cpu_count() or 1
+            print(f"Parallel search will use {workers} worker processes.")
+            return EngineType.SEARCH, workers
+        elif choice == "m":
+            return EngineType.MCTS, 1
+        elif choice == "f":
+            return EngineType.FOCUSED, 1
+        else:
+            return EngineType.HEURISTIC, 1
+
+
+def choose_mcts_budget() -> Tuple[Optional[int], Optional[float]]:
+    """ This function asks how much work the Monte Carlo engine does per move.
+    Returns (playouts, time_limit). One of the two is always None. """
+
+    print("Enter the number of playouts per move, or a number of seconds ending in 's' for a time budget (e.g. 0.5s).")
+    print("Press Enter for the default of 2000 playouts. More playouts = stronger but slower.")
+
+    while True:
+        choice = input("Playouts or seconds: ").lower().strip()
+
+        if choice == "debug":
+            beesutils.log_level_toggle()
+            continue
+        if choice == "":
+            return 2000, None
+        try:
+            if choice.endswith("s"):
+                seconds = float(choice[:-1])
+                if seconds <= 0:
+                    raise ValueError
+                return None, seconds
+            playouts = int(choice)
+            if playouts < 1:
+                raise ValueError
+            return playouts, None
+        except ValueError:
+            print("Please enter a positive number, or a number of seconds like '0.5s'.")
+
+
+def choose_session_length(kind: str) -> Optional[SessionLength]:
+    """ Asks how long a 'profile' or 'memory' session should run. Returns None if the user backs out. """
+
+    import profiling
+
+    print(f"How long should the {kind} session run? e.g. '20 games' or '200 moves' (a plain number is games).")
+
+    while True:
+        choice = input("Length (Enter cancels): ").strip()
+        if not choice:
+            return None
+        try:
+            return profiling.parse_session_length(choice)
+        except ValueError as e:
+            print(beesutils.color(str(e), "red"))
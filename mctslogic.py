@@ -0,0 +1,219 @@
+"""
+Module Name: mctslogic.py
+
+    Holds the MCTSEngine class. This is a Monte Carlo Tree Search (UCT) engine. Instead of searching every line to a
+    fixed depth, it plays lots of quick random games (playouts) and spends more of its time on the moves that keep
+    winning. The strength and the cost can be dialed up or down just by changing the playout count or time budget,
+    which makes it a good fit for the big custom boards.
+"""
+
+from __future__ import annotations
+from typing import *
+import logging
+import math
+import random
+import time
+
+from bitboard import BitBoard
+import beesutils
+
+
+DEFAULT_PLAYOUTS = 2000
+EXPLORATION = 1.4                  # the 'c' in the UCT formula. Higher = tries more of the less visited moves
+
+
+class Node:
+    """ One position in the search tree. wins is counted from the point of view of the player who moved INTO this node. """
+
+    __slots__ = ("move", "parent", "children", "untried", "visits", "wins", "key", "player", "winner")
+
+    def __init__(self, board: BitBoard, move: Optional[int] = None, parent: Optional[Node] = None):
+        self.move = move                                   # column that was played to reach this node
+        self.parent = parent
+        self.children: Dict[int, Node] = {}
+        self.visits = 0
+        self.wins = 0.0
+        self.key = board.key()
+        self.player = 3 - board.player_to_move             # the player who just moved (1 or 2)
+
+        if move is not None and board.last_move_won():
+            self.winner = self.player
+            self.untried: List[int] = []
+        else:
+            self.winner = 0
+            self.untried = board.legal_columns()
+
+    def best_child(self, exploration: float) -> Node:
+        """ UCT selection. """
+
+        log_visits = math.log(self.visits)
+        return max(self.children.values(),
+                   key=lambda child: child.wins / child.visits + exploration * math.sqrt(log_visits / child.visits))
+
+
+##########   Fast playout   ###########
+
+def random_playout(board: BitBoard, rng: random.Random) -> int:
+    """ Plays random moves until the game ends and returns the winner (1 or 2), or 0 for a draw. \n
+    Works straight on the ints from the BitBoard, so there's no Cell objects, no copying and no full-grid check_win.
+    Only the discs of the player who just moved are checked for four in a row. """
+
+    rows = board.rows
+    stride = board.stride
+    current = board.current
+    mask = board.mask
+    heights = board.heights[:]
+    player = board.player_to_move
+    shifts = (1, stride, stride - 1, stride + 1)
+    open_cols = [col for col in range(board.columns) if heights[col] < rows]
+
+    while open_cols:
+        index = rng.randrange(len(open_cols))
+        col = open_cols[index]
+        bit = 1 << (col * stride + heights[col])
+
+        mover = current | bit
+        for shift in shifts:
+            pairs = mover & (mover >> shift)
+            if pairs & (pairs >> (2 * shift)):
+                return player
+
+        current ^= mask                                    # same as BitBoard.play(), just inlined for speed
+        mask |= bit
+        heights[col] += 1
+        if heights[col] == rows:
+            open_cols[index] = open_cols[-1]               # swap-remove, order doesn't matter here
+            open_cols.pop()
+        player = 3 - player
+
+    return 0
+
+
+############   MCTS Engine   #############
+
+class MCTSEngine:
+    """ UCT search. Keeps its tree between moves, so work done on the previous turn is reused. \n
+    playouts: number of playouts per move. time_limit: seconds per move. If both are given, whichever runs out first stops the search. """
+
+    def __init__(self, playouts: Optional[int] = DEFAULT_PLAYOUTS, time_limit: Optional[float] = None,
+                 exploration: float = EXPLORATION, seed: Optional[int] = None):
+
+        if playouts is None and time_limit is None:
+            raise ValueError("MCTSEngine needs a playout count, a time limit, or both.")
+
+        self.playouts = playouts
+        self.time_limit = time_limit
+        self.exploration = exploration
+        self.rng = random.Random(seed)
+        self.root: Optional[Node] = None
+        self.root_board: Optional[BitBoard] = None
+        self.last_playouts = 0                             # for debugging / reporting
+        self.reused_visits = 0
+
+    def reseed(self, seed: int) -> None:
+        """ Restarts the random numbers from seed and forgets the old tree, so the same seed plays the same games.
+        (With a time_limit the number of playouts still depends on the clock.) """
+
+        self.rng.seed(seed)
+        self.root = None
+        self.root_board = None
+
+    def reuse_tree(self, board: BitBoard) -> Optional[Node]:
+        """ Looks for the current position in the old tree, up to 2 moves below the old root
+        (our own move + the opponent's reply). Returns the matching node, or None if the tree can't be reused. """
+
+        if self.root is None or self.root_board is None:
+            return None
+        if (self.root_board.rows, self.root_board.columns) != (board.rows, board.columns):
+            return None
+
+        key = board.key()
+        if self.root.key == key:
+            return self.root
+
+        for child in self.root.children.values():
+            if child.key == key:
+                return child
+            for grandchild in child.children.values():
+                if grandchild.key == key:
+                    return grandchild
+        return None
+
+    def choose_move(self, board: BitBoard) -> int:
+        """ Runs the search from this position and returns the best column index. """
+
+        board = board.copy()
+        root = self.reuse_tree(board)
+        if root is None:
+            root = Node(board)
+        root.parent = None                                 # cut off the old part of the tree so it can be garbage collected
+        self.root = root
+        self.root_board = board
+        self.reused_visits = root.visits
+
+        if not root.untried and not root.children:
+            raise ValueError("Cannot search a full board.")
+
+        # if there's a winning move, don't bother searching
+        for col in board.legal_columns():
+            if board.is_winning_move(col):
+                return col
+
+        start = time.perf_counter()
+        deadline = start + self.time_limit if self.time_limit is not None else None
+        playouts = 0
+
+        while True:
+            self.run_playout(root, board)                  # always at least one, so the root has a child to pick
+            playouts += 1
+            if self.playouts is not None and playouts >= self.playouts:
+                break
+            if deadline is not None and playouts % 64 == 1 and time.perf_counter() >= deadline:
+                break
+
+        self.last_playouts = playouts
+        best = max(root.children.values(), key=lambda child: child.visits)
+
+        logging.debug(beesutils.color(f"MCTS: {playouts} playouts in {time.perf_counter() - start:.3f}s "
+                                      f"(reused {self.reused_visits} visits from the last move)", "purple"))
+        logging.debug(beesutils.color(f"MCTS visits: { {child.move: child.visits for child in root.children.values()} }", "purple"))
+        return best.move
+
+    def run_playout(self, root: Node, board: BitBoard) -> None:
+        """ One round of selection, expansion, playout and backpropagation. The board is put back the way it was. """
+
+        node = root
+        depth = 0
+
+        # 1) Selection
+        while not node.untried and node.children and node.winner == 0:
+            node = node.best_child(self.exploration)
+            board.play(node.move)
+            depth += 1
+
+        # 2) Expansion
+        if node.untried and node.winner == 0:
+            col = node.untried.pop(self.rng.randrange(len(node.untried)))
+            board.play(col)
+            depth += 1
+            child = Node(board, col, node)
+            node.children[col] = child
+            node = child
+
+        # 3) Playout
+        if node.winner:
+            winner = node.winner
+        else:
+            winner = random_playout(board, self.rng)
+
+        # 4) Backpropagation
+        while node is not None:
+            node.visits += 1
+            if winner == node.player:
+                node.wins += 1
+            elif winner == 0:
+                node.wins += 0.5                           # draws count as half a win for both sides
+            node = node.parent
+
+        for _ in range(depth):
+            board.undo()
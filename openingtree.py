@@ -0,0 +1,312 @@
+"""
+Module Name: openingtree.py
+
+    Holds the OpeningTree class. This is a trie of opening lines (the first few moves of each game) with Player 1 win,
+    Player 2 win and draw counts on every node, so you can look up how any opening line turned out across all the
+    simulated games. The simulator fills one in when it's asked to, and saves it next to the checkpoint file. \n
+    Trees of the same board size and depth can be merged, so runs from different processes or different sessions
+    can be added together.
+
+    Usage: python openingtree.py opening_tree_6x7_d6.cft --line DD
+           python openingtree.py worker1.cft worker2.cft --merge-into all.cft
+"""
+
+from __future__ import annotations
+from typing import *
+import argparse
+import base64
+import logging
+import os
+import struct
+import sys
+from array import array
+from string import ascii_uppercase
+
+from cfenums import CellState
+import beesutils
+
+
+MAGIC = b"CFOT1"                   # file format marker + version
+HEADER = struct.Struct("<IIIQ")    # rows, columns, depth, node count
+NO_CHILD = 0                       # the root is node 0 and never anybody's child, so 0 can mean 'no child'
+RESULT_INDEX = {CellState.PLAYER1: 0, CellState.PLAYER2: 1, CellState.EMPTY: 2}
+
+
+""" Notes about the layout:
+There are no node objects. Every node is a number, and everything about it lives in two flat arrays:
+    children[node * columns + col]   the node reached by playing col from this node (NO_CHILD if nobody has yet)
+    counts[node * 3 + result]        games through this node that ended in a Player 1 win (0), Player 2 win (1), draw (2)
+A new node is just another row added to the end of both arrays. That keeps it small (4 bytes per child slot,
+24 bytes of counts per node) and it saves to disk as two raw blocks of bytes.
+A game only adds nodes for its first 'depth' moves, so the size depends on the depth and how varied the openings are,
+not on the number of games. """
+
+
+class LineStats(NamedTuple):
+
+    line: str                      # column letters, e.g. "DDC". Empty string is the root (every game)
+    player1_wins: int
+    player2_wins: int
+    draws: int
+
+    @property
+    def games(self) -> int:
+
+        return self.player1_wins + self.player2_wins + self.draws
+
+    def describe(self) -> str:
+
+        games = self.games or 1
+        return (f"{self.line or '(start)':<12} {self.games:>10,} games | P1 {self.player1_wins / games:6.1%} | "
+                f"P2 {self.player2_wins / games:6.1%} | Draw {self.draws / games:6.1%}")
+
+
+class OpeningTree:
+    """ Trie of opening lines up to depth moves, stored in flat arrays. """
+
+    def __init__(self, rows: int, columns: int, depth: int):
+
+        self.rows = rows
+        self.columns = columns
+        self.depth = depth
+        self.children = array("i", [NO_CHILD] * columns)        # one row for the root
+        self.counts = array("q", [0, 0, 0])
+
+    @property
+    def node_count(self) -> int:
+
+        return len(self.counts) // 3
+
+    def add_node(self) -> int:
+
+        self.children.extend([NO_CHILD] * self.columns)
+        self.counts.extend((0, 0, 0))
+        return self.node_count - 1
+
+    def add_game(self, move_columns: Sequence[int], result: CellState) -> None:
+        """ Counts one finished game on the root and on every node along its first depth moves. """
+
+        outcome = RESULT_INDEX[result]
+        children, counts, columns = self.children, self.counts, self.columns
+        node = 0
+        counts[outcome] += 1
+        for col in move_columns[:self.depth]:
+            slot = node * columns + col
+            child = children[slot]
+            if child == NO_CHILD:
+                child = self.add_node()
+                children[slot] = child
+            node = child
+            counts[node * 3 + outcome] += 1
+
+    def merge(self, other: OpeningTree) -> None:
+        """ Adds every count in other to this tree. Both trees need the same board size and depth. """
+
+        if (other.rows, other.columns, other.depth) != (self.rows, self.columns, self.depth):
+            raise ValueError(f"Can't merge a {other.rows}x{other.columns} depth {other.depth} tree into a "
+                             f"{self.rows}x{self.columns} depth {self.depth} tree.")
+
+        columns = self.columns
+        stack = [(0, 0)]                                       # (node in self, same node in other)
+        while stack:
+            node, other_node = stack.pop()
+            for outcome in range(3):
+                self.counts[node * 3 + outcome] += other.counts[other_node * 3 + outcome]
+            for col in range(columns):
+                other_child = other.children[other_node * columns + col]
+                if other_child == NO_CHILD:
+                    continue
+                child = self.children[node * columns + col]
+                if child == NO_CHILD:
+                    child = self.add_node()
+                    self.children[node * columns + col] = child
+                stack.append((child, other_child))
+
+    ##########   Queries   ###########
+
+    def find(self, line: str) -> Optional[int]:
+        """ Node for a line of column letters, or None if no game has played that line (or it's deeper than the tree). """
+
+        node = 0
+        for letter in line.upper():
+            col = ascii_uppercase.find(letter)
+            if col < 0 or col >= self.columns:
+                raise ValueError(f"'{letter}' is not a column on a {self.rows}x{self.columns} board.")
+            node = self.children[node * self.columns + col]
+            if node == NO_CHILD:
+                return None
+        return node
+
+    def node_stats(self, node: int, line: str) -> LineStats:
+
+        return LineStats(line, *self.counts[node * 3:node * 3 + 3])
+
+    def line_stats(self, line: str) -> LineStats:
+        """ Results of every game that started with line. """
+
+        node = self.find(line)
+        if node is None:
+            return LineStats(line.upper(), 0, 0, 0)
+        return self.node_stats(node, line.upper())
+
+    def continuations(self, line: str) -> List[LineStats]:
+        """ Results for each move that was played after line, in column order. """
+
+        node = self.find(line)
+        if node is None:
+            return []
+        found = []
+        for col in range(self.columns):
+            child = self.children[node * self.columns + col]
+            if child != NO_CHILD:
+                found.append(self.node_stats(child, line.upper() + ascii_uppercase[col]))
+        return found
+
+    def top_lines(self, depth: int, limit: int = 10, min_games: int = 1) -> List[LineStats]:
+        """ The most played lines of exactly depth moves. """
+
+        lines = []
+        stack = [(0, "")]
+        while stack:
+            node, line = stack.pop()
+            if len(line) == depth:
+                stats = self.node_stats(node, line)
+                if stats.games >= min_games:
+                    lines.append(stats)
+                continue
+            for col in range(self.columns):
+                child = self.children[node * self.columns + col]
+                if child != NO_CHILD:
+                    stack.append((child, line + ascii_uppercase[col]))
+        lines.sort(key=lambda stats: stats.games, reverse=True)
+        return lines[:limit]
+
+    def print_summary(self, depth: int = 2, limit: int = 10) -> None:
+
+        depth = min(depth, self.depth)
+        print(beesutils.color(f"Opening tree: {self.node_count:,} lines up to {self.depth} moves. "
+                              f"Most played lines of {depth} moves:", "cyan"))
+        for stats in self.top_lines(depth, limit):
+            print(f"  {stats.describe()}")
+
+    ##########   Saving and loading   ###########
+
+    def to_bytes(self) -> bytes:
+        """ Header, then the children and counts arrays, all little-endian. """
+
+        children, counts = array("i", self.children), array("q", self.counts)     # copies, so byteswap doesn't touch the tree
+        if sys.byteorder == "big":
+            children.byteswap()
+            counts.byteswap()
+        return MAGIC + HEADER.pack(self.rows, self.columns, self.depth, self.node_count) + children.tobytes() + counts.tobytes()
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> OpeningTree:
+
+        if not data.startswith(MAGIC):
+            raise ValueError("Not an opening tree file (or a different version).")
+        if len(data) < len(MAGIC) + HEADER.size:
+            raise ValueError("Opening tree file is cut short.")          # unpack_from would raise struct.error
+        rows, columns, depth, node_count = HEADER.unpack_from(data, len(MAGIC))
+        start = len(MAGIC) + HEADER.size
+        children_end = start + node_count * columns * 4
+
+        tree = cls(rows, columns, depth)
+        tree.children = array("i")
+        tree.children.frombytes(data[start:children_end])
+        tree.counts = array("q")
+        tree.counts.frombytes(data[children_end:children_end + node_count * 3 * 8])
+        if sys.byteorder == "big":
+            tree.children.byteswap()
+            tree.counts.byteswap()
+        if len(tree.children) != node_count * columns or len(tree.counts) != node_count * 3:
+            raise ValueError("Opening tree file is cut short.")
+        return tree
+
+    def save(self, path: str) -> None:
+        """ Temporary file + os.replace, same as the simulation checkpoint, so a crash can't leave half a file. """
+
+        temp_file = path + ".tmp"
+        with open(temp_file, "wb") as file:
+            file.write(self.to_bytes())
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_file, path)
+
+    @classmethod
+    def load(cls, path: str) -> OpeningTree:
+
+        with open(path, "rb") as file:
+            return cls.from_bytes(file.read())
+
+    def to_dict(self) -> dict:
+        """ For the simulation checkpoint (JSON). """
+
+        return {"data": base64.b64encode(self.to_bytes()).decode("ascii")}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> OpeningTree:
+
+        return cls.from_bytes(base64.b64decode(data["data"]))
+
+
+def tree_file_name(rows: int, columns: int, depth: int) -> str:
+    """ The simulator adds every run to this file (in the working directory), one file per board size and depth. """
+
+    return f"opening_tree_{rows}x{columns}_d{depth}.cft"
+
+
+def side_file_name(path: str) -> str:
+    """ opening_tree_6x7_d6.cft -> opening_tree_6x7_d6.1.cft, or the first number that isn't taken. """
+
+    base, extension = os.path.splitext(path)
+    number = 1
+    while os.path.exists(f"{base}.{number}{extension}"):
+        number += 1
+    return f"{base}.{number}{extension}"
+
+
+def save_merged(tree: OpeningTree, path: str) -> Tuple[OpeningTree, str]:
+    """ Merges tree into the one already saved at path (if there is one) and saves the total.
+    If the saved file can't be read or merged, it's left alone and tree is saved to a side file instead,
+    so neither the old games nor the new ones are lost. Returns (the tree that was saved, the file it went to). """
+
+    total = tree
+    if os.path.exists(path):
+        try:
+            total = OpeningTree.load(path)
+            total.merge(tree)
+        except (OSError, ValueError) as e:
+            total, path = tree, side_file_name(path)
+            logging.error(f"Could not add to the saved opening tree ({e}). Saving this run to {path} instead.")
+    total.save(path)
+    return total, path
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Look up opening lines in saved opening trees, or merge tree files.")
+    parser.add_argument("files", nargs="+", help="Opening tree files. More than one are merged together.")
+    parser.add_argument("--line", default="", help="Opening line to look up, e.g. DDC. Default is the start position.")
+    parser.add_argument("--merge-into", default=None, help="Save the merged tree to this file.")
+    parser.add_argument("--top", type=int, default=0, help="Also list the N most played lines of --top-depth moves.")
+    parser.add_argument("--top-depth", type=int, default=2)
+    args = parser.parse_args()
+
+    try:
+        opening_tree = OpeningTree.load(args.files[0])
+        for file_name in args.files[1:]:
+            opening_tree.merge(OpeningTree.load(file_name))
+
+        if args.merge_into:
+            opening_tree.save(args.merge_into)
+            print(beesutils.color(f"Saved {len(args.files)} merged trees to {args.merge_into}.", "green"))
+
+        print(opening_tree.line_stats(args.line).describe())
+        for continuation in opening_tree.continuations(args.line):
+            print(f"  {continuation.describe()}")
+        if args.top:
+            for stats in opening_tree.top_lines(args.top_depth, args.top):
+                print(stats.describe())
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
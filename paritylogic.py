@@ -0,0 +1,153 @@
+"""
+Module Name: paritylogic.py
+
+    Odd/even threat knowledge (the 'zugzwang' rules that decide most Connect Four endgames). A threat is an empty cell
+    that would complete four in a row for one player. Which row it's on decides whether it's any use:
+    Player 1 (moves first) wins with threats on ODD rows, Player 2 wins with threats on EVEN rows (counting rows from the
+    bottom, the bottom row is row 1). \n
+    Everything here works on BitBoard masks, so it's cheap enough to run at every leaf of the search.
+"""
+
+from __future__ import annotations
+from typing import *
+
+from bitboard import BitBoard
+from gridmaker import get_static_tables
+
+
+PARITY_SCORE = 1000                # leaf score for a predicted parity win. Far below a real win, far above the positional score
+
+
+""" Notes about the rules:
+If the columns have an even number of cells, Player 2 can always answer in the same column Player 1 just played in
+('follow-up'). Then Player 1 ends up with every odd row and Player 2 with every even row. So:
+1) A threat of Player 1 on an odd row wins, because Player 2's follow-up hands Player 1 that cell eventually,
+   and anything else gives Player 1 back control of the zugzwang. This holds even if Player 2 has an even threat
+   in another column.
+2) Otherwise, a threat of Player 2 on an even row wins, because Player 1 is forced to play under it sooner or later.
+3) A threat directly above a lower threat of the opponent in the same column is useless. The column is dead
+   from the lower threat up, since nobody will play under it.
+Anything else (odd threats for Player 2, even threats for Player 1, or no threats at all) doesn't decide anything
+on its own, so there's no prediction.
+The rules only hold if the number of rows is even. On boards with an odd number of rows there's never a prediction. """
+
+
+class ParityMasks(NamedTuple):
+    """ Bitmasks in the BitBoard layout, one set per board size. """
+
+    odd: int                       # every cell on an odd row (1st, 3rd... from the bottom)
+    even: int                      # every cell on an even row
+    keep: Tuple[Tuple[int, int], ...]    # (shift, cells at least that high up their column), for smearing bits upwards
+
+
+class ThreatReport(NamedTuple):
+    """ Threats of each player, as (column, row) pairs. Row 1 is the bottom row. Only useful threats are listed (rule 3). """
+
+    player1_odd: List[Tuple[int, int]]
+    player1_even: List[Tuple[int, int]]
+    player2_odd: List[Tuple[int, int]]
+    player2_even: List[Tuple[int, int]]
+    predicted_winner: Optional[int]      # 1 or 2, None if the rules don't decide the position
+
+
+_parity_masks: Dict[Tuple[int, int], ParityMasks] = {}
+
+
+def parity_masks(rows: int, columns: int) -> ParityMasks:
+    """ Builds the masks from the parity table in gridmaker's static tables. Cached per board size. """
+
+    size = (rows, columns)
+    if size not in _parity_masks:
+        parity = get_static_tables(rows, columns).parity
+        stride = rows + 1
+        odd, even = 0, 0
+        for x in range(rows):
+            for y in range(columns):
+                bit = 1 << (y * stride + (rows - 1 - x))                    # BitBoard.bit_index
+                if parity[x][y]:
+                    odd |= bit
+                else:
+                    even |= bit
+
+        bottom_mask = sum(1 << (col * stride) for col in range(columns))
+        keep = []
+        shift = 1
+        while shift < rows:
+            keep.append((shift, bottom_mask * (((1 << rows) - 1) ^ ((1 << shift) - 1))))
+            shift *= 2
+
+        _parity_masks[size] = ParityMasks(odd, even, tuple(keep))
+    return _parity_masks[size]
+
+
+def cells_above(bits: int, masks: ParityMasks) -> int:
+    """ Every cell strictly above any of the bits, in the same column. The bits are smeared upwards by 1, 2, 4, 8... rows
+    at a time, and each step is masked so nothing spills over the top of a column into the next one. """
+
+    bits = (bits << 1) & masks.keep[0][1]
+    for shift, keep in masks.keep:
+        bits |= (bits << shift) & keep
+    return bits
+
+
+def useful_threats(board: BitBoard) -> Tuple[int, int]:
+    """ Returns (Player 1 threats, Player 2 threats) as bitmasks, minus the threats that sit above a threat of the
+    opponent in the same column (rule 3). """
+
+    masks = parity_masks(board.rows, board.columns)
+    to_move = board.winning_cells(board.current)
+    waiting = board.winning_cells(board.current ^ board.mask)
+    if board.moves % 2 == 0:                               # Player 1 to move
+        player1, player2 = to_move, waiting
+    else:
+        player1, player2 = waiting, to_move
+
+    return player1 & ~cells_above(player2, masks), player2 & ~cells_above(player1, masks)
+
+
+def predict_winner(board: BitBoard) -> Optional[int]:
+    """ Predicts the winner of a quiet position from the parity rules. Returns 1, 2 or None (no prediction). """
+
+    if board.rows % 2:
+        return None
+
+    masks = parity_masks(board.rows, board.columns)
+    player1, player2 = useful_threats(board)
+    if player1 & masks.odd:
+        return 1
+    if player2 & masks.even:
+        return 2
+    return None
+
+
+def parity_score(board: BitBoard) -> int:
+    """ Leaf score from the point of view of the player to move: PARITY_SCORE if the rules say they win,
+    minus PARITY_SCORE if the rules say the opponent wins, otherwise 0. """
+
+    winner = predict_winner(board)
+    if winner is None:
+        return 0
+    return PARITY_SCORE if winner == board.player_to_move else -PARITY_SCORE
+
+
+def classify_threats(board: BitBoard) -> ThreatReport:
+    """ Slow, readable version for debugging and display. Lists every useful threat of each player by column and row. """
+
+    masks = parity_masks(board.rows, board.columns)
+    player1, player2 = useful_threats(board)
+
+    def cells(bits: int) -> List[Tuple[int, int]]:
+        found = []
+        for col in range(board.columns):
+            for height in range(board.rows):
+                if bits >> (col * board.stride + height) & 1:
+                    found.append((col, height + 1))
+        return found
+
+    return ThreatReport(
+        player1_odd=cells(player1 & masks.odd),
+        player1_even=cells(player1 & masks.even),
+        player2_odd=cells(player2 & masks.odd),
+        player2_even=cells(player2 & masks.even),
+        predicted_winner=predict_winner(board),
+    )
@@ -0,0 +1,223 @@
+"""
+Module Name: perft.py
+
+    Perft ('performance test') for Connect Four. Counts every leaf of the game tree to a given depth, using the
+    game's own move generation (CheckingSystem.check_column) and win detection (CheckingSystem.check_win) on a
+    real Grid. Nothing is evaluated, so it measures pure move generation speed. \n
+    Because the count is exact, any faster board representation has to give the same numbers. --check runs the same
+    count on a BitBoard and compares them, depth by depth (and column by column with --divide).
+
+    Usage: python perft.py --depth 6
+           python perft.py --rows 6 --columns 7 --moves DDC --depth 5 --divide --check
+"""
+
+from __future__ import annotations
+from typing import *
+import argparse
+import logging
+import time
+from string import ascii_uppercase
+
+from cfenums import CellState
+from bitboard import BitBoard
+import beesutils
+
+if TYPE_CHECKING:
+    from gamemanager import GameManager
+
+
+""" Notes about what counts as a leaf:
+A position is a leaf if it's at the target depth, or if the game is over there (somebody won, or the board is full).
+A finished game is counted once no matter how much depth was left, and nothing is generated after it.
+So perft(0) is always 1, and perft(1) is the number of legal columns (or 1 if the game is already over).
+This is the number of move sequences of length <= depth that are legal games, counting each one only where it stops. """
+
+
+class PerftResult(NamedTuple):
+
+    depth: int
+    nodes: int                               # leaves at this depth
+    divide: Dict[int, int]                   # root column -> leaves under it (empty unless divide was asked for)
+    seconds: float
+
+    @property
+    def nodes_per_second(self) -> float:
+
+        return self.nodes / self.seconds if self.seconds > 0 else 0.0
+
+
+##########   Grid perft (the reference)   ###########
+
+class GridPerft:
+    """ Walks the tree on a GameManager's grid: the same placing, checking and undo as the real game. """
+
+    def __init__(self, game_manager: GameManager):
+
+        self.game_manager = game_manager
+        self.grid = game_manager.grid
+        self.check_column = game_manager.checking_system.check_column
+        self.check_win = game_manager.checking_system.check_win
+
+    def game_over(self) -> bool:
+
+        return (self.check_win(self.grid, test_mode=True) != CellState.EMPTY
+                or self.game_manager.remaining_cells == 0)
+
+    def count(self, depth: int) -> int:
+        """ Leaves below the current position. The game must not be over. """
+
+        game_manager = self.game_manager
+        nodes = 0
+        for col in range(self.grid.columns):
+            cell = self.check_column(col)
+            if cell is None:                                     # column is full
+                continue
+
+            game_manager.update_cell(cell)                       # same steps as game_loop
+            game_manager.record_move(cell)
+            game_manager.move_counter()
+            if depth == 1 or self.game_over():
+                nodes += 1
+            else:
+                game_manager.switch_player()
+                nodes += self.count(depth - 1)
+            game_manager.undo_move()                             # also puts the turn back
+        return nodes
+
+    def perft(self, depth: int, divide: bool = False) -> PerftResult:
+
+        start = time.perf_counter()
+        columns: Dict[int, int] = {}
+
+        if depth == 0 or self.game_over():
+            nodes = 1
+        else:
+            game_manager = self.game_manager
+            for col in range(self.grid.columns):
+                cell = self.check_column(col)
+                if cell is None:
+                    continue
+                game_manager.update_cell(cell)
+                game_manager.record_move(cell)
+                game_manager.move_counter()
+                if depth == 1 or self.game_over():
+                    columns[col] = 1
+                else:
+                    game_manager.switch_player()
+                    columns[col] = self.count(depth - 1)
+                game_manager.undo_move()
+            nodes = sum(columns.values())
+
+        return PerftResult(depth, nodes, columns if divide else {}, time.perf_counter() - start)
+
+
+##########   BitBoard perft (for cross-checking)   ###########
+
+def bitboard_count(board: BitBoard, depth: int) -> int:
+
+    nodes = 0
+    for col in range(board.columns):
+        if not board.can_play(col):
+            continue
+        board.play(col)
+        if depth == 1 or board.last_move_won() or board.is_full():
+            nodes += 1
+        else:
+            nodes += bitboard_count(board, depth - 1)
+        board.undo()
+    return nodes
+
+
+def bitboard_perft(board: BitBoard, depth: int, divide: bool = False) -> PerftResult:
+
+    start = time.perf_counter()
+    columns: Dict[int, int] = {}
+
+    if depth == 0 or (board.moves and board.last_move_won()) or board.is_full():
+        nodes = 1
+    else:
+        for col in range(board.columns):
+            if not board.can_play(col):
+                continue
+            board.play(col)
+            if depth == 1 or board.last_move_won() or board.is_full():
+                columns[col] = 1
+            else:
+                columns[col] = bitboard_count(board, depth - 1)
+            board.undo()
+        nodes = sum(columns.values())
+
+    return PerftResult(depth, nodes, columns if divide else {}, time.perf_counter() - start)
+
+
+##########   Running it   ###########
+
+def setup_position(rows: int, columns: int, moves: str) -> Tuple[GameManager, BitBoard]:
+    """ The same position as a GameManager (with its grid) and as a BitBoard. """
+
+    import engine                                                # the whole game, without the prompts
+    from analysis import parse_move_string
+
+    board = parse_move_string(moves, rows, columns)             # checks the move string, raises ValueError if it's bad
+    game_manager = engine.new_game(rows, columns)
+    game_manager.replay_moves(moves.upper())
+    game_manager.set_turn_from_history()         # replay_moves leaves the turn on the last mover after an early draw, perft plays on
+    return game_manager, board
+
+
+def run_perft(rows: int = 6, columns: int = 7, moves: str = "", depth: int = 5, divide: bool = False,
+              check: bool = False) -> List[Tuple[PerftResult, Optional[PerftResult]]]:
+    """ Runs perft for every depth from 1 to depth and prints a line for each. With check, the BitBoard count runs
+    too and any difference is printed in red. Returns (grid result, BitBoard result or None) for each depth. """
+
+    game_manager, board = setup_position(rows, columns, moves)
+    grid_perft = GridPerft(game_manager)
+    results = []
+
+    print(beesutils.color(f"Perft on {rows}x{columns}, position '{moves or '(empty board)'}'", "cyan"))
+    for current_depth in range(1, depth + 1):
+        show_divide = divide and current_depth == depth           # only the last depth is split up by column
+        grid_result = grid_perft.perft(current_depth, show_divide)
+        line = (f"depth {current_depth:>2}: {grid_result.nodes:>12,} nodes  {grid_result.seconds:8.3f}s  "
+                f"{grid_result.nodes_per_second:>12,.0f} nodes/sec")
+
+        bit_result = None
+        if check:
+            bit_result = bitboard_perft(board, current_depth, show_divide)
+            status = beesutils.color("match", "green") if bit_result.nodes == grid_result.nodes else beesutils.color(
+                f"MISMATCH: BitBoard counted {bit_result.nodes:,}", "red")
+            line += f" | BitBoard {bit_result.nodes_per_second:>12,.0f} nodes/sec, {status}"
+        print(line)
+        results.append((grid_result, bit_result))
+
+    if divide:
+        grid_result, bit_result = results[-1]
+        print(beesutils.color(f"Divide at depth {depth}:", "cyan"))
+        for col, nodes in grid_result.divide.items():
+            line = f"  {ascii_uppercase[col]}: {nodes:,}"
+            if bit_result is not None and bit_result.divide.get(col) != nodes:
+                line += beesutils.color(f"  (BitBoard: {bit_result.divide.get(col)})", "red")
+            print(line)
+
+    return results
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Count the leaves of the Connect Four game tree (perft).")
+    parser.add_argument("--rows", type=int, default=6)
+    parser.add_argument("--columns", type=int, default=7)
+    parser.add_argument("--moves", default="", help="Start position as column letters, e.g. DDCEF. Default is the empty board.")
+    parser.add_argument("--depth", type=int, default=5)
+    parser.add_argument("--divide", action="store_true", help="Also print the count under each root column.")
+    parser.add_argument("--check", action="store_true", help="Count on a BitBoard too and compare.")
+    args = parser.parse_args()
+
+    if not (4 <= args.rows <= 20 and 4 <= args.columns <= 26):
+        parser.error("Board size must be between 4x4 and 20x26.")
+
+    logging.disable(logging.INFO)                                # the game's debug logging would swamp the timing
+    try:
+        run_perft(args.rows, args.columns, args.moves, args.depth, args.divide, args.check)
+    except ValueError as e:                                      # bad move string
+        parser.error(str(e))
@@ -0,0 +1,99 @@
+"""
+Module Name: prewarm.py
+
+    Holds the Prewarmer class. While the setup prompts are waiting for the user to type something, the computer
+    players' start-up work runs on background threads, so the first computer move is as fast as the ones after it. \n
+    Each job starts as soon as the choice it depends on is known:
+        player types -> external engine processes are started and handshaked
+        engine       -> the parallel search's worker processes are started
+        board size   -> the static tables and bitboard masks for that size are built
+"""
+
+from __future__ import annotations
+from typing import *
+import logging
+import threading
+import time
+
+from cfenums import PlayerType
+from gridmaker import get_static_tables
+import searchlogic
+import paritylogic
+import beesutils
+
+if TYPE_CHECKING:
+    from gamemanager import GameManager
+
+
+""" Notes about thread safety:
+Every job only fills in something that would otherwise be built on first use (a cache keyed by board size,
+a process pool, an engine process). If the main thread gets there first, the table is just built twice and one copy wins,
+the contents are the same either way. Engines and the pool are different: two threads starting the same one would
+start two processes, so wait() has to be called before the game uses them. main_game does that right after
+init_move_calculators. Input() releases the GIL, so the jobs get the whole CPU while a prompt is waiting. """
+
+
+class Prewarmer:
+    """ Runs the start-up jobs in the background. Call the job methods as the choices come in, then wait(). """
+
+    def __init__(self, game_manager: GameManager):
+
+        self.game_manager = game_manager
+        self.threads: List[threading.Thread] = []
+        self.timings: Dict[str, float] = {}         # job name -> seconds it took, for the debug log
+
+    def run(self, name: str, job: Callable[[], None]) -> None:
+
+        def timed_job() -> None:
+            start = time.perf_counter()
+            try:
+                job()
+            except Exception as e:                   # a failed warm-up only means that part is cold, the game carries on
+                logging.debug(beesutils.color(f"Warm-up '{name}' failed: {e}", "red"))
+            self.timings[name] = time.perf_counter() - start
+
+        self.threads.append(beesutils.thread_runner(timed_job))
+
+    def start_engines(self) -> None:
+        """ Starts the external engine processes. init_move_calculators keeps the ones that already exist. """
+
+        game_manager = self.game_manager
+        if not game_manager.engine_commands:
+            return
+        import engineprotocol                            # only loaded when there are external engine players
+
+        for player_num, command in game_manager.engine_commands.items():
+            if player_num not in game_manager.engine_players:
+                engine_process = engineprotocol.EngineProcess(command, f"Player {player_num} engine")
+                game_manager.engine_players[player_num] = engine_process
+                self.run(f"engine {player_num}", engine_process.start)
+
+    def start_search_pool(self) -> None:
+
+        workers = self.game_manager.search_workers
+        if PlayerType.COMPUTER in (self.game_manager.player1_type, self.game_manager.player2_type) and workers > 1:
+            self.run("search pool", lambda: searchlogic.start_pool_processes(workers))
+
+    def warm_size(self, rows: int, columns: int) -> None:
+
+        self.run(f"{rows}x{columns} tables", lambda: warm_size(rows, columns))
+
+    def wait(self) -> None:
+        """ Blocks until every job is done. Most of the time they finished while the prompts were up. """
+
+        start = time.perf_counter()
+        for thread in self.threads:
+            thread.join()
+        self.threads.clear()
+        waited = time.perf_counter() - start
+        logging.debug(beesutils.color(f"Warm-up jobs: {', '.join(f'{name} {seconds:.3f}s' for name, seconds in self.timings.items())}"
+                                      f" | waited {waited:.3f}s for them", "cyan"))
+
+
+def warm_size(rows: int, columns: int) -> None:
+    """ Builds every per-size cache. No warm-up search: every move gets a new NegamaxSearch with an empty
+    transposition table, so a search here would leave nothing behind for the game to use. """
+
+    get_static_tables(rows, columns)
+    searchlogic.weight_masks(rows, columns)
+    paritylogic.parity_masks(rows, columns)
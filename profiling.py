@@ -0,0 +1,196 @@
+"""
+Module Name: profiling.py
+
+    Profiling and memory tools for the real game loop. A session runs for a set number of moves or games, then
+    prints its report and switches itself off. \n
+    ProfileSession wraps the moves in cProfile and prints the hottest functions.
+    MemorySession takes a tracemalloc snapshot at the start and at the end, and measures the deep size of each part
+    of the game (grid, caches, search engines, simulator) at both points, so growth shows up per subsystem. \n
+    Start them from the debug prompt with 'profile' and 'memory', or from the command line:
+    python connect_four.py --profile-games 20 --memory-moves 200
+"""
+
+from __future__ import annotations
+from typing import *
+import cProfile
+import io
+import logging
+import pstats
+import tracemalloc
+
+import beesutils
+
+if TYPE_CHECKING:
+    from gamemanager import GameManager
+
+
+PROFILE_TOP = 25                   # functions listed in the profile report
+MEMORY_TOP = 15                    # source lines listed in the memory report
+TRACEMALLOC_FRAMES = 1             # more frames gives better tracebacks but slows everything down a lot
+
+
+class SessionLength(NamedTuple):
+
+    count: int
+    unit: str                      # "moves" or "games"
+
+
+def parse_session_length(text: str) -> SessionLength:
+    """ '20' or '20 games' -> 20 games, '200 moves' or '200m' -> 200 moves. Raises ValueError on anything else. """
+
+    words = text.lower().replace("moves", " moves").replace("games", " games").split()
+    if not words:
+        raise ValueError("Enter a number, e.g. '20 games' or '200 moves'.")
+    number = words[0].rstrip("mg")
+    unit = "moves" if words[0].endswith("m") or (len(words) > 1 and words[1].startswith("m")) else "games"
+    count = int(number)
+    if count < 1:
+        raise ValueError("The number must be at least 1.")
+    return SessionLength(count, unit)
+
+
+##########   Sessions   ###########
+
+class ProfileSession:
+    """ cProfile over the next N moves or games. """
+
+    kind = "profile"
+
+    def __init__(self, length: SessionLength, sort_key: str = "cumulative", top: int = PROFILE_TOP):
+
+        self.length = length
+        self.remaining = length.count
+        self.sort_key = sort_key                   # any pstats sort key: "cumulative", "tottime", "calls"...
+        self.top = top
+        self.profiler = cProfile.Profile()
+
+    def start(self, sessions: DebugSessions) -> None:
+
+        self.profiler.enable()
+
+    def finish(self, sessions: DebugSessions) -> None:
+
+        self.profiler.disable()
+        stream = io.StringIO()
+        stats = pstats.Stats(self.profiler, stream=stream)
+        stats.strip_dirs().sort_stats(self.sort_key).print_stats(self.top)
+
+        print(beesutils.color(f"\n##########   Profile: {self.length.count} {self.length.unit}, sorted by {self.sort_key}   ###########", "cyan"))
+        print(stream.getvalue())
+
+
+class MemorySession:
+    """ tracemalloc snapshots and deep sizes per subsystem, before and after the next N moves or games. """
+
+    kind = "memory"
+
+    def __init__(self, length: SessionLength, top: int = MEMORY_TOP):
+
+        self.length = length
+        self.remaining = length.count
+        self.top = top
+        self.started_tracing = False               # only stop tracemalloc if this session was the one that started it
+        self.snapshot: Optional[tracemalloc.Snapshot] = None
+        self.sizes_before: Dict[str, int] = {}
+
+    def start(self, sessions: DebugSessions) -> None:
+
+        self.sizes_before = sessions.deep_sizes()         # measured before tracing starts, so the walk isn't traced
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+            self.started_tracing = True
+        self.snapshot = tracemalloc.take_snapshot()
+
+    def finish(self, sessions: DebugSessions) -> None:
+
+        snapshot = tracemalloc.take_snapshot()
+        traced_now, traced_peak = tracemalloc.get_traced_memory()
+        if self.started_tracing:
+            tracemalloc.stop()
+        sizes_after = sessions.deep_sizes()
+
+        print(beesutils.color(f"\n##########   Memory: {self.length.count} {self.length.unit}   ###########", "cyan"))
+        print(f"{'Subsystem':<18}{'Before':>12}{'After':>12}{'Growth':>12}")
+        for name in sizes_after:
+            before, after = self.sizes_before.get(name, 0), sizes_after[name]
+            growth = ("+" if after >= before else "-") + beesutils.format_bytes(abs(after - before))
+            print(f"{name:<18}{beesutils.format_bytes(before):>12}{beesutils.format_bytes(after):>12}{growth:>12}")
+
+        print(f"\nTraced memory: {beesutils.format_bytes(traced_now)} now, {beesutils.format_bytes(traced_peak)} peak")
+        print(f"Top {self.top} source lines by growth:")
+        ignore = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, "<frozen importlib._bootstrap*>")]
+        differences = snapshot.filter_traces(ignore).compare_to(self.snapshot.filter_traces(ignore), "lineno")
+        for difference in differences[:self.top]:
+            print(f"  {difference}")
+        print()
+
+
+Session = Union[ProfileSession, MemorySession]
+
+
+class DebugSessions:
+    """ The running sessions of one GameManager. game_loop calls tick() after every move and at the end of every game.
+    Extra objects to measure (e.g. the simulator) are put in game_manager.debug_tracked. GameManager only creates this
+    (and imports this module) once the first session is started, see GameManager.start_debug_session. """
+
+    def __init__(self, game_manager: GameManager):
+
+        self.game_manager = game_manager
+        self.sessions: List[Session] = []
+
+    def start(self, session: Session) -> None:
+
+        for running in self.sessions:
+            if running.kind == session.kind:              # cProfile can't run twice at once, and one memory report is enough
+                print(beesutils.color(f"A {session.kind} session is already running.", "red"))
+                return
+        print(beesutils.color(f"Starting {session.kind} session for the next {session.length.count} {session.length.unit}.", "green"))
+        session.start(self)
+        self.sessions.append(session)
+
+    def tick(self, unit: str) -> None:
+        """ Counts one move or one game. Sessions that are done print their report and are dropped. """
+
+        if not self.sessions:                             # the normal case, this runs every move
+            return
+        for session in list(self.sessions):
+            if session.length.unit == unit:
+                session.remaining -= 1
+                if session.remaining <= 0:
+                    self.sessions.remove(session)
+                    session.finish(self)
+
+    def finish_all(self) -> None:
+        """ Reports whatever is still running, e.g. the run ended before the session's count was reached. """
+
+        for session in list(self.sessions):
+            logging.debug(beesutils.color(f"Ending {session.kind} session early, {session.remaining} {session.length.unit} left.", "cyan"))
+            self.sessions.remove(session)
+            session.finish(self)
+
+    def subsystems(self) -> Dict[str, object]:
+        """ The parts of the game that are measured separately. Whatever doesn't exist yet is left out. """
+
+        game_manager = self.game_manager
+        calculator = getattr(game_manager, "comp_move_calc", None)
+        parts = {
+            "grid": getattr(game_manager, "grid", None),
+            "move history": [game_manager.move_columns, game_manager.redo_columns, game_manager.column_heights,
+                             getattr(game_manager, "line_blockers", None)],
+        }
+        if calculator is not None:
+            parts["result cache"] = calculator.result_cache
+            parts["search engines"] = [calculator.last_search, calculator.mcts_engine, calculator.focused_search]
+        parts.update(game_manager.debug_tracked)
+        return {name: obj for name, obj in parts.items() if obj is not None}
+
+    def deep_sizes(self) -> Dict[str, int]:
+        """ Deep size of each subsystem in bytes. The other subsystems and the GameManager (which most of them point
+        back to) are left out of each count, so nothing is counted twice. """
+
+        subsystems = self.subsystems()
+        sizes = {}
+        for name, obj in subsystems.items():
+            others = [other for other_name, other in subsystems.items() if other_name != name]
+            sizes[name] = beesutils.get_deep_size(obj, exclude=others + [self.game_manager])
+        return sizes
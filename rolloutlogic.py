@@ -0,0 +1,158 @@
+"""
+Module Name: rolloutlogic.py
+
+    Holds the NumPy batch rollout kernel. Given a position, it plays thousands of random (or slightly center-biased)
+    games to the end at the same time, one NumPy operation per move for the whole batch, and counts how each first
+    move turned out. Useful for rollout-based engines and for analysing positions.
+"""
+
+from __future__ import annotations
+from typing import *
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from bitboard import BitBoard
+
+
+class RolloutStats(NamedTuple):
+    """ Results for one first move, from the point of view of the player who made it. """
+
+    wins: int
+    draws: int
+    losses: int
+
+    @property
+    def score(self) -> float:
+        """ Win rate with draws counted as half a win. """
+
+        total = self.wins + self.draws + self.losses
+        return (self.wins + 0.5 * self.draws) / total if total else 0.0
+
+
+# (row step, column step) for each of the 4 line directions. Row 0 is the TOP row, same as the Grid class.
+DIRECTIONS = ((0, 1), (1, 0), (1, 1), (1, -1))
+
+
+def numpy_from_bitboard(board: BitBoard) -> np.ndarray:
+    """ Converts a BitBoard into the same layout as Grid.numpy_grid (0 = empty, 1 = Player 1, 2 = Player 2). """
+
+    grid = np.zeros((board.rows, board.columns), dtype=np.int8)
+    player_bits = board.current
+    to_move = board.player_to_move
+    for col in range(board.columns):
+        for height in range(board.heights[col]):
+            bit = 1 << (col * board.stride + height)
+            owner = to_move if player_bits & bit else 3 - to_move
+            grid[board.rows - 1 - height, col] = owner
+    return grid
+
+
+def _placed_wins(boards: np.ndarray, games: np.ndarray, rows_placed: np.ndarray,
+                 cols_placed: np.ndarray, player: int) -> np.ndarray:
+    """ Checks only the lines through the disc that was just placed in each game. Returns a bool array. """
+
+    rows, columns = boards.shape[1], boards.shape[2]
+    won = np.zeros(len(games), dtype=bool)
+
+    for dr, dc in DIRECTIONS:
+        count = np.ones(len(games), dtype=np.int8)
+        for sign in (1, -1):
+            still_going = np.ones(len(games), dtype=bool)
+            for step in range(1, 4):
+                r = rows_placed + sign * step * dr
+                c = cols_placed + sign * step * dc
+                in_bounds = (r >= 0) & (r < rows) & (c >= 0) & (c < columns)
+                same = boards[games, np.clip(r, 0, rows - 1), np.clip(c, 0, columns - 1)] == player
+                still_going &= in_bounds & same
+                count += still_going
+        won |= count >= 4
+
+    return won
+
+
+def batch_rollouts(numpy_grid: np.ndarray, player_to_move: Optional[int] = None, playouts_per_move: int = 1000,
+                   bias: float = 0.0, seed: Optional[int] = None) -> Dict[int, RolloutStats]:
+    """ Plays playouts_per_move games after every legal first move, all in lockstep. \n
+    numpy_grid: position in the Grid.numpy_grid layout. player_to_move: 1 or 2, worked out from the disc count if None. \n
+    bias: 0 is uniformly random. Higher values make the random moves prefer the center columns. \n
+    Returns {column index: RolloutStats} counted from the point of view of player_to_move.
+    An immediate win counts as playouts_per_move wins. """
+
+    if playouts_per_move < 1:
+        raise ValueError(f"playouts_per_move must be at least 1, got {playouts_per_move}.")
+    if not bias >= 0:                                              # also catches NaN
+        raise ValueError(f"bias must be 0 or more, got {bias}.")   # a negative bias can make a column's weight negative
+
+    rng = np.random.default_rng(seed)
+    start = np.asarray(numpy_grid, dtype=np.int8)
+    rows, columns = start.shape
+
+    if player_to_move is None:
+        player_to_move = 1 if np.count_nonzero(start) % 2 == 0 else 2
+    elif player_to_move not in (1, 2):
+        raise ValueError(f"player_to_move must be 1 or 2, got {player_to_move}.")
+
+    start_heights = np.count_nonzero(start, axis=0).astype(np.int16)
+    first_moves = [col for col in range(columns) if start_heights[col] < rows]
+    if not first_moves:
+        raise ValueError("Cannot run rollouts on a full board.")
+
+    # Every game in the batch gets its own copy of the board. Game i starts with first move first_moves[i // playouts_per_move].
+    batch = len(first_moves) * playouts_per_move
+    boards = np.repeat(start[np.newaxis], batch, axis=0)
+    heights = np.repeat(start_heights[np.newaxis], batch, axis=0)
+    first_cols = np.repeat(np.array(first_moves, dtype=np.int16), playouts_per_move)
+    results = np.full(batch, -1, dtype=np.int8)                   # -1 = still playing, 0 = draw, 1/2 = winner
+    remaining = rows * columns - int(np.count_nonzero(start))
+
+    center = (columns - 1) / 2
+    col_weights = 1.0 + bias * (center + 1 - np.abs(np.arange(columns) - center))
+
+    player = player_to_move
+    move_number = 0
+    all_games = np.arange(batch)
+
+    while remaining > 0:
+        games = all_games[results == -1]
+        if len(games) == 0:
+            break
+
+        if move_number == 0:
+            cols = first_cols[games]
+        else:
+            # weighted random choice among the columns that aren't full
+            weights = col_weights * (heights[games] < rows)
+            cumulative = np.cumsum(weights, axis=1)
+            picks = rng.random(len(games)) * cumulative[:, -1]
+            cols = (cumulative <= picks[:, np.newaxis]).sum(axis=1)
+            cols = np.minimum(cols, columns - 1)
+
+        placed_rows = rows - 1 - heights[games, cols]
+        boards[games, placed_rows, cols] = player
+        heights[games, cols] += 1
+
+        won = _placed_wins(boards, games, placed_rows.astype(np.intp), cols.astype(np.intp), player)
+        results[games[won]] = player
+
+        remaining -= 1
+        move_number += 1
+        player = 3 - player
+
+    results[results == -1] = 0                                     # board filled up with no winner
+
+    stats: Dict[int, RolloutStats] = {}
+    for i, col in enumerate(first_moves):
+        chunk = results[i * playouts_per_move:(i + 1) * playouts_per_move]
+        wins = int(np.count_nonzero(chunk == player_to_move))
+        draws = int(np.count_nonzero(chunk == 0))
+        stats[col] = RolloutStats(wins, draws, playouts_per_move - wins - draws)
+    return stats
+
+
+def best_rollout_column(numpy_grid: np.ndarray, player_to_move: Optional[int] = None, playouts_per_move: int = 1000,
+                        bias: float = 0.0, seed: Optional[int] = None) -> int:
+    """ Convenience wrapper: runs batch_rollouts and returns the column with the best score. """
+
+    stats = batch_rollouts(numpy_grid, player_to_move, playouts_per_move, bias, seed)
+    return max(stats, key=lambda col: stats[col].score)
@@ -0,0 +1,421 @@
+"""
+Module Name: searchlogic.py
+
+    Holds the NegamaxSearch class and the parallel root-split search. This is the minimax-style engine that
+    ComputerMoveCalculator uses when the search engine is chosen instead of the heuristic AI. \n
+    All the searching is done on a BitBoard, never on the Grid/Cell objects.
+"""
+
+from __future__ import annotations
+from typing import *
+import logging
+import os
+import time
+
+from bitboard import BitBoard
+from gridmaker import get_static_tables
+from paritylogic import parity_score
+import beesutils
+
+if TYPE_CHECKING:
+    from concurrent.futures import ProcessPoolExecutor
+
+
+WIN_SCORE = 1_000_000              # a win is worth this minus the number of discs played (faster wins score higher)
+INFINITY = 10_000_000              # bigger than any possible score
+TT_MAX_ENTRIES = 1_000_000         # transposition table is cleared when it grows past this
+DEFAULT_NODE_BUDGET = 20_000       # nodes per move for the focused search
+FOCUS_MOVES = 4                    # the focused search looks around this many of the most recent moves...
+FOCUS_RADIUS = 2                   # ...this many columns to each side of them
+SPEEDUP_WARMUP_DEPTH = 4           # untimed search measure_speedup runs first, so both sides start with warm tables
+MAX_FOCUS_COLUMNS = 7              # most columns searched per node, same as a default board (threat columns are never dropped)
+
+# Transposition table flags
+EXACT, LOWER, UPPER = 0, 1, 2
+
+
+class SearchAborted(Exception):
+    """ Raised inside the search when the time or node budget runs out. """
+
+
+class SearchResult(NamedTuple):
+    column: int                    # best column index
+    score: int                     # score of the best column, from the point of view of the player to move
+    scores: Dict[int, int]         # score of every root column that was searched
+    nodes: int                     # number of positions visited
+    elapsed: float                 # seconds
+    depth: int
+
+
+#############    Static helpers    ##############
+
+_weight_masks: Dict[Tuple[int, int], List[Tuple[int, int]]] = {}
+
+
+def weight_masks(rows: int, columns: int) -> List[Tuple[int, int]]:
+    """ Returns a list of (weight, cell mask) pairs, one for each distinct weight. A cell's weight is the number of
+    possible four-in-a-rows through it, taken from the static tables in gridmaker. Cached per board size. """
+
+    size = (rows, columns)
+    if size not in _weight_masks:
+        line_counts = get_static_tables(rows, columns).line_counts
+        stride = rows + 1
+        masks: Dict[int, int] = {}
+        for x in range(rows):
+            for y in range(columns):
+                weight = line_counts[x][y]
+                masks[weight] = masks.get(weight, 0) | (1 << (y * stride + (rows - 1 - x)))     # BitBoard.bit_index
+        _weight_masks[size] = sorted(masks.items())
+    return _weight_masks[size]
+
+
+def center_order(columns: int) -> List[int]:
+    """ Column indices sorted from the center outwards. Good moves tend to be in the middle, so searching them first
+    gives alpha-beta more cutoffs. """
+
+    center = columns // 2
+    return sorted(range(columns), key=lambda col: (abs(col - center), col))
+
+
+############   Negamax Search   #############
+
+class NegamaxSearch:
+    """ Depth-limited negamax search with alpha-beta pruning and a transposition table. \n
+    Scores are always from the point of view of the player to move. """
+
+    def __init__(self, max_depth: int, tt_max_entries: int = TT_MAX_ENTRIES):
+
+        self.max_depth = max_depth
+        self.nodes = 0
+        self.transposition_table: Dict[int, Tuple[int, int, int]] = {}
+        self.tt_max_entries = tt_max_entries
+        self.node_limit: Optional[int] = None          # only set while search_with_budget is running
+        self.deadline: Optional[float] = None
+        self.move_order: Optional[List[int]] = None    # columns to try at every node. None = every column, center first
+
+    def evaluate(self, board: BitBoard) -> int:
+        """ Static evaluation at the leaves. Rewards discs on cells that are part of many possible four-in-a-rows,
+        plus a big bonus (or penalty) if the odd/even threat rules in paritylogic say who wins the endgame. """
+
+        opponent = board.current ^ board.mask
+        score = parity_score(board)
+        for weight, cell_mask in weight_masks(board.rows, board.columns):
+            score += weight * ((board.current & cell_mask).bit_count() - (opponent & cell_mask).bit_count())
+        return score
+
+    def negamax(self, board: BitBoard, depth: int, alpha: int, beta: int) -> int:
+
+        self.nodes += 1
+        if self.node_limit is not None and self.nodes > self.node_limit:
+            raise SearchAborted
+        if self.deadline is not None and self.nodes % 1024 == 0 and time.perf_counter() > self.deadline:
+            raise SearchAborted
+
+        legal = [col for col in self.move_order or center_order(board.columns) if board.can_play(col)]
+        if not legal and self.move_order:                      # every focus column is full but the board isn't,
+            legal = [col for col in center_order(board.columns) if board.can_play(col)]    # so look at the rest
+        if not legal:
+            return 0                                           # board is full, draw
+
+        for col in legal:
+            if board.is_winning_move(col):
+                return WIN_SCORE - board.moves                 # win on the spot
+
+        if depth <= 0:
+            return self.evaluate(board)
+
+        # Mirror images share one entry, unless the moves are limited to some columns (FocusedSearch).
+        # The focus columns aren't symmetric, so the mirror image of a position searches a different set of moves.
+        key = board.key() if self.move_order else board.canonical_key()
+        entry = self.transposition_table.get(key)
+        if entry is not None and entry[0] >= depth:
+            entry_depth, flag, value = entry
+            if flag == EXACT:
+                return value
+            elif flag == LOWER:
+                alpha = max(alpha, value)
+            else:
+                beta = min(beta, value)
+            if alpha >= beta:
+                return value
+
+        original_alpha = alpha
+        best = -INFINITY
+        for col in legal:
+            board.play(col)
+            score = -self.negamax(board, depth - 1, -beta, -alpha)
+            board.undo()
+            if score > best:
+                best = score
+            if best > alpha:
+                alpha = best
+            if alpha >= beta:
+                break                                          # cutoff, the opponent won't allow this line
+
+        if len(self.transposition_table) > self.tt_max_entries:
+            self.transposition_table.clear()
+
+        if best <= original_alpha:
+            flag = UPPER
+        elif best >= beta:
+            flag = LOWER
+        else:
+            flag = EXACT
+        self.transposition_table[key] = (depth, flag, best)
+        return best
+
+    def search(self, board: BitBoard, all_scores: bool = False) -> SearchResult:
+        """ Searches every legal column and returns the best one. \n
+        If all_scores is True, every column is searched with a full window so the scores are exact
+        (slower, but useful for analysis). Otherwise only the best column's score is exact. """
+
+        start = time.perf_counter()
+        self.nodes = 0
+        board = board.copy()                                   # never touch the caller's board
+
+        legal = [col for col in self.move_order or center_order(board.columns) if board.can_play(col)]
+        if not legal:
+            raise ValueError("Cannot search a full board.")
+
+        scores: Dict[int, int] = {}
+        alpha = -INFINITY
+        for col in legal:
+            if board.is_winning_move(col):
+                score = WIN_SCORE - board.moves
+            else:
+                board.play(col)
+                window_alpha = -INFINITY if all_scores else alpha
+                score = -self.negamax(board, self.max_depth - 1, -INFINITY, -window_alpha)
+                board.undo()
+            scores[col] = score
+            alpha = max(alpha, score)
+
+        best_col = max(legal, key=lambda col: scores[col])     # max() keeps the first (most central) of any ties
+        elapsed = time.perf_counter() - start
+        return SearchResult(best_col, scores[best_col], scores, self.nodes, elapsed, self.max_depth)
+
+
+    def search_with_budget(self, board: BitBoard, time_limit: Optional[float] = None, node_limit: Optional[int] = None,
+                           max_depth: Optional[int] = None, all_scores: bool = False) -> SearchResult:
+        """ Iterative deepening: searches depth 1, 2, 3... until the time or node budget runs out, and returns the
+        result of the deepest search that finished. Depth 1 always finishes, so there's always a move. \n
+        max_depth defaults to the number of empty cells (searching deeper than that is pointless). """
+
+        start = time.perf_counter()
+        max_depth = max_depth or (board.rows * board.columns - board.moves)
+        nodes_used = 0
+        best: Optional[SearchResult] = None
+
+        try:
+            for depth in range(1, max_depth + 1):
+                self.max_depth = depth
+                if best is not None:                           # no limits on depth 1
+                    self.node_limit = node_limit - nodes_used if node_limit is not None else None
+                    self.deadline = start + time_limit if time_limit is not None else None
+                try:
+                    result = self.search(board, all_scores)
+                except SearchAborted:
+                    nodes_used += self.nodes
+                    break
+                nodes_used += result.nodes
+                best = result
+                if abs(result.score) >= WIN_SCORE - board.rows * board.columns:
+                    break                                      # forced win or loss found, deeper won't change it
+        finally:
+            self.node_limit = None
+            self.deadline = None
+
+        return best._replace(nodes=nodes_used, elapsed=time.perf_counter() - start)
+
+
+############   Focused search   #############
+
+def threat_columns(board: BitBoard) -> Set[int]:
+    """ Columns where either player could win on the next disc, or on the disc after that (the cell above the
+    playable one). Those are the columns a search can't afford to ignore. """
+
+    threats = board.winning_cells(board.current) | board.winning_cells(board.current ^ board.mask)
+    playable = board.playable_mask()
+    threats &= playable | (playable << 1)
+    column_bits = (1 << board.stride) - 1
+    return {col for col in board.legal_columns() if (threats >> (col * board.stride)) & column_bits}
+
+
+def focus_columns(board: BitBoard, recent_columns: List[int], radius: int = FOCUS_RADIUS,
+                  max_columns: int = MAX_FOCUS_COLUMNS) -> List[int]:
+    """ The active region of the board: threat columns first, then the columns near the most recent moves,
+    closest to the last move first. Only legal columns are returned, and never more than max_columns
+    (unless there are even more threat columns than that). """
+
+    legal = board.legal_columns()
+    threats = threat_columns(board)
+    last = recent_columns[-1] if recent_columns else board.columns // 2
+
+    nearby = set()
+    for col in recent_columns or [last]:
+        nearby.update(range(col - radius, col + radius + 1))
+    candidates = [col for col in legal if col in nearby or col in threats]
+    if not candidates:
+        candidates = legal                                     # everything near the action is full, look further out
+
+    candidates.sort(key=lambda col: (col not in threats, abs(col - last), col))
+    return candidates[:max(max_columns, len(threats))]
+
+
+class FocusedSearch(NegamaxSearch):
+    """ Negamax with a fixed node budget per move, that only looks at the active region of the board. \n
+    The plain search costs more per move on bigger boards (more columns at every node), so a 20x26 game is
+    much slower than a 6x7 one. This one picks the focus columns once per move and searches only those, with
+    the same node budget no matter how big the board is. The trade-off: a threat that only appears deep in the
+    search, far away from the focus columns, won't be seen. """
+
+    def __init__(self, node_budget: int = DEFAULT_NODE_BUDGET, recent_moves: int = FOCUS_MOVES):
+
+        super().__init__(1)
+        self.node_budget = node_budget
+        self.recent_moves = recent_moves
+
+    def choose_move(self, board: BitBoard, move_columns: List[int]) -> SearchResult:
+        """ move_columns is the game's move history (GameManager.move_columns). """
+
+        self.move_order = focus_columns(board, move_columns[-self.recent_moves:])
+        self.transposition_table.clear()                       # the entries only hold for one set of focus columns
+        try:
+            return self.search_with_budget(board, node_limit=self.node_budget)
+        finally:
+            self.move_order = None
+
+
+############   Parallel root split   #############
+
+""" Notes about the parallel search:
+Every legal root column is sent to a worker process as its own task. The workers share one number, the best
+score found so far (_shared_alpha). Before a worker searches its column it reads that number and uses it as its
+alpha bound, so once one column has a good score the other workers can prune much harder.
+A column searched with a raised bound can come back 'fail-low', which only means it is NOT better than the best
+one. That is all we need to pick the move, so the results are merged by taking the highest score. """
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_workers = 0
+_shared_alpha = None                     # multiprocessing.Value, the parent and every worker hold the same one
+
+
+def _init_worker(shared_alpha) -> None:
+    """ Runs once in each worker process when the pool starts. """
+
+    global _shared_alpha
+    _shared_alpha = shared_alpha
+
+
+def _search_root_column(board: BitBoard, col: int, depth: int) -> Tuple[int, int, int, bool]:
+    """ Worker task. Returns (column, score, nodes, exact). """
+
+    if board.is_winning_move(col):
+        score = WIN_SCORE - board.moves
+        nodes = 1
+        exact = True
+    else:
+        search = NegamaxSearch(depth)
+        alpha = _shared_alpha.value
+        board.play(col)
+        score = -search.negamax(board, depth - 1, -INFINITY, -alpha)
+        nodes = search.nodes
+        exact = score > alpha
+
+    with _shared_alpha.get_lock():
+        if score > _shared_alpha.value:
+            _shared_alpha.value = score
+    return col, score, nodes, exact
+
+
+def get_pool(workers: int) -> ProcessPoolExecutor:
+    """ Starts the process pool the first time it's needed and keeps it alive between moves,
+    so we only pay the process startup cost once. """
+
+    global _pool, _pool_workers, _shared_alpha
+
+    if _pool is None or _pool_workers != workers:
+        import multiprocessing                                 # only loaded if the parallel search is actually used
+        from concurrent.futures import ProcessPoolExecutor
+
+        shutdown_pool()
+        # Not 'fork': the pool is often started while other threads are running (prewarm.py), and forking a process
+        # with threads can copy a lock some other thread was holding. Python 3.12 warns about it too.
+        start_method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+        context = multiprocessing.get_context(start_method)
+        _shared_alpha = context.Value("q", -INFINITY)
+        _pool = ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker,
+                                    initargs=(_shared_alpha,))
+        _pool_workers = workers
+        logging.debug(beesutils.color(f"Search process pool started with {workers} workers ({start_method}).", "cyan"))
+    return _pool
+
+
+def start_pool_processes(workers: int) -> None:
+    """ The pool only starts its processes when tasks come in, so it's given one tiny task per worker
+    and this waits until they're all back. After this, the worker processes are up and running. """
+
+    pool = get_pool(workers)
+    for future in [pool.submit(os.getpid) for _ in range(workers)]:
+        future.result()
+
+
+def shutdown_pool() -> None:
+
+    global _pool, _pool_workers
+    if _pool is not None:
+        _pool.shutdown()
+        _pool = None
+        _pool_workers = 0
+
+
+def parallel_search(board: BitBoard, depth: int, workers: Optional[int] = None) -> SearchResult:
+    """ Splits the root columns across a process pool and merges the results into one move. """
+
+    workers = workers or os.cpu_count() or 1
+    start = time.perf_counter()
+    pool = get_pool(workers)
+
+    legal = [col for col in center_order(board.columns) if board.can_play(col)]
+    if not legal:
+        raise ValueError("Cannot search a full board.")
+
+    with _shared_alpha.get_lock():
+        _shared_alpha.value = -INFINITY                        # fresh bound for this search
+
+    futures = [pool.submit(_search_root_column, board, col, depth) for col in legal]    # center columns go first
+    results = [future.result() for future in futures]
+
+    scores = {col: score for col, score, nodes, exact in results}
+    nodes = sum(result[2] for result in results)
+    exact_cols = {col for col, score, nodes, exact in results if exact}
+
+    # highest score wins. If a fail-low column ties the best score, prefer the one with an exact score.
+    best_col = max(legal, key=lambda col: (scores[col], col in exact_cols))
+    elapsed = time.perf_counter() - start
+    return SearchResult(best_col, scores[best_col], scores, nodes, elapsed, depth)
+
+
+def measure_speedup(board: BitBoard, depth: int, workers: Optional[int] = None) -> Dict[str, float]:
+    """ Runs the same search single-process and in parallel and reports how much faster the parallel one was. """
+
+    workers = workers or os.cpu_count() or 1
+    start_pool_processes(workers)                              # the worker processes start outside the timed section
+
+    warmup_depth = min(depth, SPEEDUP_WARMUP_DEPTH)            # untimed: fills the per-size tables in this process
+    NegamaxSearch(warmup_depth).search(board)                  # and in the workers, and pages in the code of both
+    parallel_search(board, warmup_depth, workers)
+
+    serial = NegamaxSearch(depth).search(board)
+    parallel = parallel_search(board, depth, workers)
+
+    report = {
+        "workers": workers,
+        "serial_time": serial.elapsed,
+        "parallel_time": parallel.elapsed,
+        "speedup": serial.elapsed / parallel.elapsed if parallel.elapsed > 0 else 0.0,
+        "serial_nodes": serial.nodes,
+        "parallel_nodes": parallel.nodes,
+        "same_move": serial.column == parallel.column,
+    }
+    return report
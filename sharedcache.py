@@ -0,0 +1,147 @@
+"""
+Module Name: sharedcache.py
+
+    Holds the SharedPositionCache class. This is a fixed-size position cache in multiprocessing.shared_memory that
+    every worker process of a tournament (or any other process pool) reads and writes, so a position worked out in
+    one process is a cache hit in all the others. The memory use is set once when the cache is created and doesn't
+    grow with the number of positions or the number of workers. \n
+    There are no locks. Each slot carries a checksum, and a reader that sees a slot in the middle of being
+    written (or a slot that holds a different position) just treats it as a miss.
+"""
+
+from __future__ import annotations
+from typing import *
+import hashlib
+import logging
+
+import beesutils
+
+if TYPE_CHECKING:
+    from multiprocessing.shared_memory import SharedMemory
+
+
+DEFAULT_SLOTS = 1 << 16            # 65536 slots
+PAYLOAD_SIZE = 64                  # bytes of data per slot
+FINGERPRINT_SIZE = 8
+CHECK_SIZE = 8
+SLOT_SIZE = FINGERPRINT_SIZE + PAYLOAD_SIZE + CHECK_SIZE
+
+
+""" Notes about the slot layout:
+    [ fingerprint (8 bytes) | payload (64 bytes) | check (8 bytes) ]
+The position key is hashed once. Part of the hash picks the slot, and another part is the fingerprint stored in the slot,
+so two positions that land in the same slot are told apart on read. The check is a hash of fingerprint + payload.
+A writer just overwrites the whole slot. If two processes write the same slot at the same time, or a reader copies it
+halfway through a write, the check won't match and the read counts as a miss. A fingerprint of 0 means the slot is empty. """
+
+
+class SharedPositionCache:
+    """ Flat array of hashed slots in shared memory. Use create() in the parent process and attach() in the workers. """
+
+    def __init__(self, memory: SharedMemory, slots: int, owner: bool):
+
+        self.memory = memory
+        self.buffer = memory.buf
+        self.slots = slots
+        self.owner = owner                         # only the process that created the memory frees it
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def create(cls, slots: int = DEFAULT_SLOTS) -> SharedPositionCache:
+
+        from multiprocessing.shared_memory import SharedMemory
+
+        memory = SharedMemory(create=True, size=slots * SLOT_SIZE)
+        memory.buf[:slots * SLOT_SIZE] = bytes(slots * SLOT_SIZE)          # every fingerprint 0 = every slot empty
+        logging.debug(beesutils.color(f"Shared position cache {memory.name}: {slots} slots, {slots * SLOT_SIZE // 1024} KB", "cyan"))
+        return cls(memory, slots, owner=True)
+
+    @classmethod
+    def attach(cls, name: str, slots: int = DEFAULT_SLOTS) -> SharedPositionCache:
+
+        from multiprocessing.shared_memory import SharedMemory
+
+        try:
+            memory = SharedMemory(name=name, track=False)          # Python 3.13+: don't let this process free it on exit
+        except TypeError:
+            memory = SharedMemory(name=name)    # older versions: pool workers share the parent's resource tracker, so this is still freed once
+        return cls(memory, slots, owner=False)
+
+    @property
+    def name(self) -> str:
+
+        return self.memory.name
+
+    @staticmethod
+    def hash_key(key: bytes) -> Tuple[int, int]:
+        """ Returns (fingerprint, slot selector). The fingerprint is never 0, that marks an empty slot. """
+
+        digest = hashlib.blake2b(key, digest_size=16).digest()
+        fingerprint = int.from_bytes(digest[:8], "little") or 1
+        return fingerprint, int.from_bytes(digest[8:], "little")
+
+    @staticmethod
+    def check_bytes(fingerprint_bytes: bytes, payload: bytes) -> bytes:
+
+        return hashlib.blake2b(fingerprint_bytes + payload, digest_size=CHECK_SIZE).digest()
+
+    def get(self, key: bytes) -> Optional[bytes]:
+        """ Returns the payload stored for the key, or None if it's not there (or was caught mid-write). """
+
+        fingerprint, selector = self.hash_key(key)
+        start = (selector % self.slots) * SLOT_SIZE
+        slot = bytes(self.buffer[start:start + SLOT_SIZE])             # one copy, then everything is checked on the copy
+
+        fingerprint_bytes = slot[:FINGERPRINT_SIZE]
+        payload = slot[FINGERPRINT_SIZE:FINGERPRINT_SIZE + PAYLOAD_SIZE]
+        if (int.from_bytes(fingerprint_bytes, "little") != fingerprint
+                or slot[-CHECK_SIZE:] != self.check_bytes(fingerprint_bytes, payload)):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return payload
+
+    def put(self, key: bytes, payload: bytes) -> None:
+        """ Stores up to PAYLOAD_SIZE bytes for the key, replacing whatever was in its slot. """
+
+        if len(payload) > PAYLOAD_SIZE:
+            raise ValueError(f"Payload is {len(payload)} bytes, a slot holds {PAYLOAD_SIZE}.")
+
+        fingerprint, selector = self.hash_key(key)
+        start = (selector % self.slots) * SLOT_SIZE
+        fingerprint_bytes = fingerprint.to_bytes(FINGERPRINT_SIZE, "little")
+        payload = payload.ljust(PAYLOAD_SIZE, b"\0")
+        self.buffer[start:start + SLOT_SIZE] = fingerprint_bytes + payload + self.check_bytes(fingerprint_bytes, payload)
+
+    def close(self) -> None:
+        """ Detaches from the memory. The owner also frees it. """
+
+        self.buffer = None
+        self.memory.close()
+        if self.owner:
+            self.memory.unlink()
+
+
+##########   Process-wide cache   ###########
+
+_attached_cache: Optional[SharedPositionCache] = None       # the cache this process uses, if any
+
+
+def attach_shared_cache(name: str, slots: int = DEFAULT_SLOTS) -> None:
+    """ Pool initializer. Attaches the worker process to the parent's cache. """
+
+    global _attached_cache
+    _attached_cache = SharedPositionCache.attach(name, slots)
+
+
+def use_shared_cache(cache: Optional[SharedPositionCache]) -> None:
+    """ Sets the cache for this process directly (e.g. the parent, with the cache it created). None turns it off. """
+
+    global _attached_cache
+    _attached_cache = cache
+
+
+def shared_cache() -> Optional[SharedPositionCache]:
+
+    return _attached_cache
@@ -8,17 +8,133 @@ Module Name: simmode.py
 from __future__ import annotations
 from typing import *
 import logging
+import json
+import math
+import os
+import random
+import time
 
 if TYPE_CHECKING:
     from gamemanager import GameManager
     from gridmaker import Cell, Grid
 
+from string import ascii_uppercase
+
 import beesutils
+import openingtree
 from cfenums import PlayerType, CellState
 
 
 
 time_format = "%H:%M:%S"                         ## for the timestamp.
+progress_interval = 5.0                          ## seconds between progress lines
+fill_buckets = 10                                ## board fill is grouped into 10% buckets for the draw rate
+checkpoint_file = "sim_checkpoint.json"          ## saved in the working directory
+checkpoint_interval = 30.0                       ## seconds between checkpoint saves
+
+
+def wilson_interval(successes: int, total: int, z: float = 1.96) -> Tuple[float, float]:
+    """ 95% confidence interval for a proportion. Behaves better than the plain +/- formula when the rate is near 0 or 1. """
+
+    if total == 0:
+        return 0.0, 1.0
+    rate = successes / total
+    denominator = 1 + z * z / total
+    center = (rate + z * z / (2 * total)) / denominator
+    spread = z * math.sqrt(rate * (1 - rate) / total + z * z / (4 * total * total)) / denominator
+    return max(0.0, center - spread), min(1.0, center + spread)
+
+
+class SimulationStats:
+    """ Running statistics for a simulation. Only counters are kept (nothing per game),
+    so the memory use is the same for 10 games or 10 million. """
+
+    def __init__(self, rows: int, columns: int):
+        self.rows = rows
+        self.columns = columns
+        total_cells = rows * columns
+
+        self.games = 0
+        self.results = {"PLAYER1": 0, "PLAYER2": 0, "EMPTY": 0}                 # keyed by CellState name
+        self.length_histogram = [0] * (total_cells + 1)                          # index = number of moves in the game
+        self.first_move = [[0, 0, 0] for _ in range(columns)]                    # [P1 wins, P2 wins, draws] by first column
+        self.winning_column = [0] * columns                                      # column of the move that won the game
+        self.fill_games = [0] * fill_buckets                                     # games that ended at each board fill
+        self.fill_draws = [0] * fill_buckets
+        self.dead_draws = 0                                                      # draws called before the board was full
+
+    def record(self, game_result: CellState, moves: int, first_column: Optional[int], last_column: Optional[int]) -> None:
+
+        self.games += 1
+        self.results[game_result.name] += 1
+        self.length_histogram[moves] += 1
+
+        if first_column is not None:
+            index = {CellState.PLAYER1: 0, CellState.PLAYER2: 1, CellState.EMPTY: 2}[game_result]
+            self.first_move[first_column][index] += 1
+
+        if game_result != CellState.EMPTY and last_column is not None:
+            self.winning_column[last_column] += 1
+
+        bucket = min(moves * fill_buckets // len(self.length_histogram), fill_buckets - 1)
+        self.fill_games[bucket] += 1
+        if game_result == CellState.EMPTY:
+            self.fill_draws[bucket] += 1           # a dead draw counts at the fill where it was called, not at 100%
+            if moves < self.rows * self.columns:
+                self.dead_draws += 1
+
+    def to_dict(self) -> dict:
+        """ Everything needed to rebuild the stats, for the checkpoint file. """
+
+        return dict(self.__dict__)
+
+    @classmethod
+    def from_dict(cls, data: dict) -> SimulationStats:
+
+        stats = cls(data["rows"], data["columns"])
+        stats.__dict__.update(data)
+        return stats
+
+    def print_summary(self) -> None:
+
+        if self.games == 0:
+            return
+
+        print(beesutils.color("\nWin rates (95% confidence interval):", "cyan"))
+        for name, label in (("PLAYER1", "Player 1"), ("PLAYER2", "Player 2"), ("EMPTY", "Draw")):
+            count = self.results[name]
+            low, high = wilson_interval(count, self.games)
+            print(f"  {label}: {count / self.games:.1%}  [{low:.1%} - {high:.1%}]")
+
+        lengths = [(moves, count) for moves, count in enumerate(self.length_histogram) if count]
+        average = sum(moves * count for moves, count in lengths) / self.games
+        print(beesutils.color(f"Game length (moves): average {average:.1f}, "
+                              f"shortest {lengths[0][0]}, longest {lengths[-1][0]}", "cyan"))
+        biggest = max(count for moves, count in lengths)
+        for moves, count in lengths:
+            bar = "#" * max(1, round(40 * count / biggest))
+            print(f"  {moves:>3}: {bar} {count}")
+
+        print(beesutils.color("First move column: Player 1 win rate | Player 2 win rate | games", "cyan"))
+        for col, (p1_wins, p2_wins, draws) in enumerate(self.first_move):
+            games = p1_wins + p2_wins + draws
+            if games:
+                print(f"  {ascii_uppercase[col]}: {p1_wins / games:.1%} | {p2_wins / games:.1%} | {games}")
+
+        wins = sum(self.winning_column)
+        if wins:
+            print(beesutils.color("Winning move column (share of all wins):", "cyan"))
+            print("  " + " | ".join(f"{ascii_uppercase[col]}: {count / wins:.1%}"
+                                    for col, count in enumerate(self.winning_column) if count))
+
+        print(beesutils.color("Draw rate by board fill when the game ended:", "cyan"))
+        for bucket in range(fill_buckets):
+            if self.fill_games[bucket]:
+                low = bucket * 100 // fill_buckets
+                print(f"  {low:>3}-{low + 100 // fill_buckets}%: {self.fill_draws[bucket] / self.fill_games[bucket]:.1%} "
+                      f"of {self.fill_games[bucket]} games")
+        if self.dead_draws:
+            print(f"  {self.dead_draws} draws were called early, once neither player could make four in a row.")
 
 
 class GameSimulator:
@@ -29,6 +145,9 @@ class GameSimulator:
         self.game_loop = game_loop
         self.grid = game_manager.grid
         self.display = game_display
+        self.stats: Optional[SimulationStats] = None        # the current run's stats and exporter, kept here so the
+        self.exporter = None                                # 'memory' debug session can measure them
+        self.opening_tree = None
 
     def run_simulations(self):
 
@@ -42,16 +161,25 @@ class GameSimulator:
         logging.debug(beesutils.color("Also note you are in DEBUG mode. It will pause every turn.", "cyan"))
         logging.debug(beesutils.color("Toggle debug off to let it run automatically.", "cyan"))
 
-        while True:
-            simulation_count = input("Enter a number (or 'debug'): ")
-            if simulation_count == "debug":
-                beesutils.log_level_toggle()
-                continue
-            try:
-                simulation_count = int(simulation_count)
-                break
-            except ValueError:
-                print("Please enter a number.")
+        checkpoint = self.load_checkpoint()
+        if checkpoint is not None:
+            print(beesutils.color(f"Found an unfinished run: {checkpoint['completed']} of {checkpoint['simulation_count']} games done.", "cyan"))
+            if input("Type 'R' to resume it, anything else starts a new run: ").upper() != "R":
+                checkpoint = None
+
+        if checkpoint is not None:
+            simulation_count = checkpoint["simulation_count"]
+        else:
+            while True:
+                simulation_count = input("Enter a number (or 'debug'): ")
+                if simulation_count == "debug":
+                    beesutils.log_level_toggle()
+                    continue
+                try:
+                    simulation_count = int(simulation_count)
+                    break
+                except ValueError:
+                    print("Please enter a number.")
 
         hide_board: bool = False
         ultrasim: bool = False    
@@ -67,6 +195,26 @@ class GameSimulator:
         elif hide_board_inp == "ULTRASIM":
             hide_board = True
             ultrasim = True
+
+        # printing a line for every game gets slow when thousands of games per second are being played
+        print_each_game = input("Print a line for every game? (N to only show progress updates, anything else prints): ").upper() != "N"
+
+        export_folder = input("To export every position as training data (.npy shards), type a folder name. Enter skips: ").strip()
+        exporter = None
+        if export_folder:
+            import dataexport                                       # needs NumPy, so it's only loaded when exporting
+            resume_index = None
+            saved_export = checkpoint.get("export") if checkpoint is not None else None
+            if saved_export and saved_export["folder"] == os.path.abspath(export_folder):
+                resume_index = saved_export["shard_index"]          # drop shards from games that will be played again
+            exporter = dataexport.TrainingDataExporter(export_folder, grid.rows, grid.columns, resume_index=resume_index)
+
+        opening_tree = None
+        if checkpoint is not None and "opening_tree" in checkpoint:
+            opening_tree = openingtree.OpeningTree.from_dict(checkpoint["opening_tree"])      # carries on with the same tree
+            print(beesutils.color(f"Resuming the opening tree ({opening_tree.depth} moves deep).", "cyan"))
+        else:
+            opening_tree = self.choose_opening_tree()
         
         player1_wins, player2_wins, draws = 0, 0, 0
         win_direction_dict = {
@@ -75,28 +223,108 @@ class GameSimulator:
             "down-right wins": 0,
             "down-left wins": 0,
         }           
+        stats = SimulationStats(grid.rows, grid.columns)
+        start_game = 0
+        previous_seconds = 0.0                                          # run time before the last resume
+
+        if checkpoint is not None:
+            start_game = checkpoint["completed"]
+            player1_wins, player2_wins, draws = checkpoint["player1_wins"], checkpoint["player2_wins"], checkpoint["draws"]
+            win_direction_dict = checkpoint["win_direction_dict"]
+            stats = SimulationStats.from_dict(checkpoint["stats"])
+            previous_seconds = checkpoint["seconds"]
+            self.set_rng_states(checkpoint["rng_states"])
+            print(beesutils.color(f"Resuming from game {start_game + 1}.", "green"))
+
+        self.stats, self.exporter, self.opening_tree = stats, exporter, opening_tree
         timestamp2 = beesutils.timestamp()
-                            
-        for i in range(simulation_count):
-            game_result: CellState = game_loop(hide_board, ultrasim)   
-            print(f"Game {i+1} completed. Game result: {game_result.name}") 
-
-            if game_result == CellState.PLAYER1:
-                player1_wins += 1
-            elif game_result == CellState.PLAYER2:
-                player2_wins += 1
-            else:
-                draws += 1
-
-            if game_result != CellState.EMPTY:        # <-- I honestly have no idea why this line needs to be here but apparently it does
-                win_direction_dict[f"{game_manager.winner_direction} wins"] += 1
-
-            grid.reset_grid()                                                # reset the grid
-            display.reset_display(grid)                                 # reset the display
-            game_manager.reset_game(grid.total_cells)                        # reset the game manager
+        start_time = time.perf_counter()
+        next_progress = start_time + progress_interval
+        next_checkpoint = start_time + checkpoint_interval
+
+        def checkpoint_state(completed: int, rng_states: dict) -> dict:
+
+            state = {
+                "rows": grid.rows,
+                "columns": grid.columns,
+                "engine_config": self.engine_config(),
+                "simulation_count": simulation_count,
+                "completed": completed,
+                "player1_wins": player1_wins,
+                "player2_wins": player2_wins,
+                "draws": draws,
+                "win_direction_dict": win_direction_dict,
+                "stats": stats.to_dict(),
+                "seconds": previous_seconds + time.perf_counter() - start_time,
+                "rng_states": rng_states,
+            }
+            if opening_tree is not None:
+                state["opening_tree"] = opening_tree.to_dict()
+            if exporter:
+                state["export"] = exporter.checkpoint()             # flushes, so the shards on disk match 'completed'
+            return state
+
+        completed = start_game
+        game_rng_states = self.get_rng_states()
+        try:
+            for i in range(start_game, simulation_count):
+                game_rng_states = self.get_rng_states()                 # so an interrupted game can be replayed exactly
+                game_result: CellState = game_loop(hide_board, ultrasim)   
+                if print_each_game:
+                    print(f"Game {i+1} completed. Game result: {game_result.name}") 
+
+                if game_result == CellState.PLAYER1:
+                    player1_wins += 1
+                elif game_result == CellState.PLAYER2:
+                    player2_wins += 1
+                else:
+                    draws += 1
+
+                if game_result != CellState.EMPTY:        # <-- I honestly have no idea why this line needs to be here but apparently it does
+                    win_direction_dict[f"{game_manager.winner_direction} wins"] += 1
+
+                moves = game_manager.player1_moves + game_manager.player2_moves
+                stats.record(game_result, moves, game_manager.first_move_column, game_manager.last_move_column)
+                if exporter:
+                    exporter.add_game(game_manager.move_columns, game_result)
+                if opening_tree is not None:
+                    opening_tree.add_game(game_manager.move_columns, game_result)
+                completed = i + 1
+
+                now = time.perf_counter()
+                if now >= next_progress:
+                    self.print_progress(i + 1, simulation_count, i + 1 - start_game, now - start_time)
+                    next_progress = now + progress_interval
+
+                grid.reset_grid()                                                # reset the grid
+                display.reset_display(grid)                                 # reset the display
+                game_manager.reset_game(grid.total_cells)                        # reset the game manager
+
+                if now >= next_checkpoint:
+                    self.save_checkpoint(checkpoint_state(completed, self.get_rng_states()))    # between games, on a clean board
+                    next_checkpoint = now + checkpoint_interval
+
+        except KeyboardInterrupt:
+            # the game that was interrupted is thrown away, the grid gets reset so the next run starts clean
+            grid.reset_grid()
+            game_manager.reset_game(grid.total_cells)
+            self.save_checkpoint(checkpoint_state(completed, game_rng_states))
+            if exporter:
+                exporter.close()
+            print(beesutils.color(f"\nSimulation interrupted after {completed} games. Progress saved to {checkpoint_file}.", "red"))
+            print(beesutils.color("Run the simulation again and choose 'R' to resume.", "cyan"))
+            return
+
+        if opening_tree is not None:            # saved before the checkpoint goes, the checkpoint is its only other copy
+            total_tree, tree_file = openingtree.save_merged(
+                opening_tree, openingtree.tree_file_name(grid.rows, grid.columns, opening_tree.depth))
+        self.clear_checkpoint()
+        if exporter:
+            exporter.close()
             
         elapsed_time: float = beesutils.elapsed_calc(timestamp2)
         elapsed_formatted: str = beesutils.format_elapsed(elapsed_time)            
+        run_seconds = previous_seconds + time.perf_counter() - start_time
 
         print(beesutils.color(f"\nSimulation of {simulation_count} games completed."))
         print(beesutils.color(f"Player 1 wins: {player1_wins},", "red"), end=" ")
@@ -105,7 +333,127 @@ class GameSimulator:
         for key, value in win_direction_dict.items():
             print(f"{key}: {value}", end=" | ")
 
+        stats.print_summary()
+
+        if opening_tree is not None:
+            opening_tree.print_summary()
+            print(beesutils.color(f"Opening tree added to {tree_file} ({total_tree.line_stats('').games:,} games in total).", "green"))
+
         print(f"\nStart time: {timestamp2.strftime(time_format)}, End time: {beesutils.timestamp().strftime(time_format)}")
         print(f"Simulations took {elapsed_formatted}")
+        print(f"Exact run time: {run_seconds:.2f}s | Throughput: {simulation_count / run_seconds if run_seconds else 0:.1f} games/sec")
+
+    def choose_opening_tree(self) -> Optional[openingtree.OpeningTree]:
+        """ Asks how many moves deep the opening tree should go. Enter skips it. """
+
+        print("To keep win/draw counts for every opening line, type how many moves deep to track them (e.g. 6).")
+        while True:
+            choice = input("Opening tree depth (Enter skips): ").strip()
+            if not choice:
+                return None
+            try:
+                depth = int(choice)
+            except ValueError:
+                print("Please enter a number.")
+                continue
+            if depth < 1:
+                print("The depth must be at least 1.")
+                continue
+            print(beesutils.color(f"Tracking opening lines up to {depth} moves. Saved to "
+                                  f"{openingtree.tree_file_name(self.grid.rows, self.grid.columns, depth)} at the end of the run.", "cyan"))
+            return openingtree.OpeningTree(self.grid.rows, self.grid.columns, depth)
+
+    @staticmethod
+    def print_progress(games_done: int, simulation_count: int, session_games: int, seconds: float) -> None:
+        """ Prints how many games are done, the current speed and the estimated time left.
+        session_games and seconds only count this session, so the speed is right after a resume. """
+
+        rate = session_games / seconds if seconds else 0.0
+        eta = (simulation_count - games_done) / rate if rate else 0.0
+        minutes, secs = divmod(int(eta), 60)
+        print(beesutils.color(f"[{games_done}/{simulation_count}] {rate:.1f} games/sec | ETA {minutes}m {secs:02}s", "cyan"))
+
+    ############  Checkpoints  ############
+
+    def get_rng_states(self) -> dict:
+        """ The random number generators the computer players use. Saving them means a resumed run
+        plays exactly the same games it would have played without the interruption. """
+
+        states = {"random": random.getstate()}
+        mcts_engine = getattr(self.game_manager.comp_move_calc, "mcts_engine", None)
+        if mcts_engine is not None:
+            states["mcts"] = mcts_engine.rng.getstate()
+        return states
+
+    def set_rng_states(self, states: dict) -> None:
+
+        def to_tuple(state: list) -> tuple:
+            """ JSON turns the state tuples into lists, random.setstate needs them back as tuples. """
+            return tuple(to_tuple(item) if isinstance(item, list) else item for item in state)
+
+        random.setstate(to_tuple(states["random"]))
+        mcts_engine = getattr(self.game_manager.comp_move_calc, "mcts_engine", None)
+        if mcts_engine is not None and "mcts" in states:
+            mcts_engine.rng.setstate(to_tuple(states["mcts"]))
+
+    @staticmethod
+    def save_checkpoint(state: dict) -> None:
+        """ Writes to a temporary file first and then swaps it in with os.replace, which is atomic.
+        So if the program dies in the middle of a save, the old checkpoint is still intact. """
+
+        temp_file = checkpoint_file + ".tmp"
+        with open(temp_file, "w", encoding="utf-8") as file:
+            json.dump(state, file)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_file, checkpoint_file)
+        logging.debug(beesutils.color(f"Checkpoint saved: {state['completed']} games completed.", "cyan"))
+
+    def engine_config(self) -> dict:
+        """ Every setting that changes how the games are played. A checkpoint is only resumed if all of them match,
+        otherwise the rest of the run would be played by different players than the first part.
+        Already in the form it comes back from JSON (string keys, lists), so the two can be compared directly. """
+
+        game_manager = self.game_manager
+        return {
+            "player_types": [game_manager.player1_type.name, game_manager.player2_type.name],
+            "engine_type": game_manager.engine_type.name,
+            "randomness_threshold": game_manager.randomness_threshold,
+            "search_depth": game_manager.search_depth,
+            "search_workers": game_manager.search_workers,
+            "mcts_playouts": game_manager.mcts_playouts,
+            "mcts_time_limit": game_manager.mcts_time_limit,
+            "search_node_budget": game_manager.search_node_budget,
+            "engine_commands": {str(player_num): list(command) for player_num, command in game_manager.engine_commands.items()},
+            "engine_time_limit": game_manager.engine_time_limit,
+        }
+
+    def load_checkpoint(self) -> Optional[dict]:
+        """ Returns the saved state if there's a checkpoint for the same board size and engine settings, otherwise None. """
+
+        if not os.path.exists(checkpoint_file):
+            return None
+        try:
+            with open(checkpoint_file, "r", encoding="utf-8") as file:
+                state = json.load(file)
+        except (OSError, ValueError) as e:
+            logging.error(f"Could not read checkpoint file: {e}")
+            return None
+
+        if (state["rows"], state["columns"]) != (self.grid.rows, self.grid.columns):
+            logging.debug(beesutils.color("Checkpoint is for a different board size. Ignoring it.", "cyan"))
+            return None
+        saved_config, engine_config = state.get("engine_config", {}), self.engine_config()
+        changed = [name for name in engine_config if saved_config.get(name) != engine_config[name]]
+        if changed:
+            logging.debug(beesutils.color(f"Checkpoint is for different engine settings ({', '.join(changed)}). Ignoring it.", "cyan"))
+            return None
+        return state
+
+    @staticmethod
+    def clear_checkpoint() -> None:
+
+        if os.path.exists(checkpoint_file):
+            os.remove(checkpoint_file)
 
     ###### End of Simulation mode #######
\ No newline at end of file
@@ -0,0 +1,10 @@
+"""
+Module Name: conftest.py
+
+    The game is a flat folder of modules, not a package, so the tests put that folder on the import path.
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
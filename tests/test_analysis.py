@@ -0,0 +1,59 @@
+import pytest
+
+from analysis import PositionAnalysis, analyze_many, analyze_position, parse_move_string, read_positions
+
+
+def mirror(move_string: str) -> str:
+
+    return "".join("ABCDEFG"[6 - "ABCDEFG".index(letter)] for letter in move_string)
+
+
+def test_parse_move_string():
+
+    board = parse_move_string(" ddc ", 6, 7)
+    assert board.history == [3, 3, 2]
+
+
+@pytest.mark.parametrize("moves", ["DDH", "DD?", "AAAAAAA", "AGAGAGAB"])    # not a column (twice), full column, game already won
+def test_parse_move_string_rejects_bad_strings(moves):
+
+    with pytest.raises(ValueError):
+        parse_move_string(moves, 6, 7)
+
+
+def test_analyze_position():
+
+    analysis = analyze_position("AGAGA", depth=2)                   # Player 2 has to block column A
+    assert analysis.status == "ok"
+    assert list(analysis.scores) == list("ABCDEFG")              # in column order
+    assert analysis.best_move == "A"
+    assert analysis.best_score == max(analysis.scores.values())
+
+    assert analyze_position("AGAGAGA").status == "won"
+
+
+def test_analyze_many_keeps_the_input_order_and_reports_bad_input():
+
+    positions = ["DD", "# a comment", "", "XX", "AGAGAGA", "DC"]
+    results = list(analyze_many(positions, depth=2, workers=1))
+    assert [result.moves for result in results] == ["DD", "XX", "AGAGAGA", "DC"]
+    assert [result.status.split(":")[0] for result in results] == ["ok", "invalid", "won", "ok"]
+    assert all(isinstance(result, PositionAnalysis) for result in results)
+
+
+def test_analyze_many_mirror_cache_flips_the_scores():
+
+    moves = "CDEBB"
+    results = list(analyze_many([moves, mirror(moves)], depth=3, workers=1))
+    original, mirrored = results
+    assert original.nodes == mirrored.nodes                        # the mirror image came from the cache
+    assert mirrored.scores == {mirror(letter): score for letter, score in original.scores.items()}
+    assert list(mirrored.scores) == list("ABCDEFG")
+    assert mirrored.scores == analyze_position(mirror(moves), depth=3).scores  # and it's what a real search says
+
+
+def test_read_positions_from_a_file(tmp_path):
+
+    path = tmp_path / "positions.txt"
+    path.write_text("DD\n\n# skip\n  DC  \n", encoding="utf-8")
+    assert list(read_positions(str(path))) == ["DD", "DC"]
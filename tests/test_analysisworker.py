@@ -0,0 +1,45 @@
+import io
+import json
+
+import pytest
+
+from analysisworker import AnalysisWorker, run
+
+
+def answers_for(*lines: str) -> list:
+
+    output = io.StringIO()
+    run(io.StringIO("\n".join(lines) + "\n"), output)
+    return [json.loads(line) for line in output.getvalue().splitlines()]
+
+
+def test_good_request():
+
+    answer, = answers_for('{"id": 1, "moves": "DD", "depth": 3}')
+    assert answer["status"] == "ok"
+    assert answer["best_move"] in "ABCDEFG"
+    assert answer["depth"] == 3
+
+
+@pytest.mark.parametrize("request_text", [
+    '{"id": 4, "moves": "D", "nodes": 1e400}',             # JSON infinity
+    '{"id": 4, "moves": "D", "time": -1}',
+    '{"id": 4, "moves": "D", "time": "fast"}',
+    '{"id": 4, "moves": "D", "depth": true}',
+    '{"id": 4, "moves": "D", "depth": 2.5}',
+    '{"id": 4, "rows": 1e400}',
+    '{"id": 4, "moves": "Z"}',
+    '[1, 2]',
+    'not json',
+])
+def test_bad_request_gets_an_error_and_the_worker_keeps_going(request_text):
+
+    answers = answers_for(request_text, '{"id": 5, "moves": "D", "depth": 2}')
+    assert answers[0]["status"] == "error"
+    assert answers[1] == {**answers[1], "id": 5, "status": "ok"}
+
+
+def test_finished_positions():
+
+    worker = AnalysisWorker()
+    assert worker.handle({"moves": "DEDEDED"})["status"] == "won"
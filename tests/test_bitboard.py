@@ -0,0 +1,67 @@
+import pytest
+
+from bitboard import BitBoard
+
+
+def test_play_and_undo():
+
+    board = BitBoard(6, 7)
+    board.play(3)
+    board.play(3)
+    assert (board.moves, board.heights[3], board.history, board.player_to_move) == (2, 2, [3, 3], 1)
+    assert board.undo() == 3
+    assert board.undo() == 3
+    assert (board.current, board.mask, board.mirror_current, board.mirror_mask) == (0, 0, 0, 0)
+
+
+def test_full_column_and_full_board():
+
+    board = BitBoard.from_moves(4, 4, [0, 0, 0, 0])
+    assert not board.can_play(0)
+    assert board.legal_columns() == [1, 2, 3]
+    with pytest.raises(ValueError):
+        BitBoard.from_moves(4, 4, [0] * 5)
+
+    board = BitBoard.from_moves(4, 4, [col for col in range(4) for _ in range(4)])
+    assert board.is_full() and board.legal_columns() == []
+
+
+@pytest.mark.parametrize("moves", [
+    [0, 6, 0, 6, 0, 6, 0],                 # vertical
+    [0, 0, 1, 1, 2, 2, 3],                 # horizontal
+    [0, 1, 1, 2, 2, 3, 2, 3, 3, 6, 3],     # diagonal /
+    [6, 5, 5, 4, 4, 3, 4, 3, 3, 0, 3],     # diagonal \
+])
+def test_wins(moves):
+
+    board = BitBoard.from_moves(6, 7, moves[:-1])
+    assert board.is_winning_move(moves[-1])
+    board.play(moves[-1])
+    assert board.last_move_won()
+
+
+def test_winning_cells():
+
+    board = BitBoard.from_moves(6, 7, [0, 6, 1, 6, 3])        # Player 1: A, B, D on the bottom row
+    player1 = board.current ^ board.mask
+    assert board.winning_cells(player1) == board.move_bit(2)  # C completes xx_x
+    assert board.winning_cells(board.current) == 0            # Player 2 only has two in column G
+
+
+def test_canonical_key_matches_the_mirror_image():
+
+    moves = [0, 3, 1, 1, 5, 2]
+    board = BitBoard.from_moves(6, 7, moves)
+    mirror = BitBoard.from_moves(6, 7, [6 - col for col in moves])
+    assert board.canonical_key() == mirror.canonical_key()
+    assert board.key() == mirror.mirror_key()
+    assert board.is_mirrored() != mirror.is_mirrored()
+    assert board.canonical_key() != BitBoard.from_moves(6, 7, [0, 3, 1, 1, 5, 3]).canonical_key()
+
+
+def test_symmetric_position_is_not_mirrored():
+
+    board = BitBoard.from_moves(6, 7, [3, 2, 3, 4])
+    assert board.key() == board.mirror_key() == board.canonical_key()
+    assert not board.is_mirrored()
+    assert board.mirror_column(0) == 6
@@ -0,0 +1,72 @@
+import logging
+
+import pytest
+
+import engine
+
+
+@pytest.fixture(autouse=True)
+def quiet_logging():
+
+    logging.disable(logging.INFO)
+    yield
+    logging.disable(logging.NOTSET)
+
+
+def count_bitboards(calculator, monkeypatch) -> list:
+
+    built = []
+    current_bitboard = calculator.current_bitboard
+
+    def counting_bitboard():
+        built.append(1)
+        return current_bitboard()
+
+    monkeypatch.setattr(calculator, "current_bitboard", counting_bitboard)
+    return built
+
+
+def test_heuristic_move_builds_one_bitboard(monkeypatch):
+
+    game_manager = engine.new_game(6, 7, randomness_threshold=0.0)
+    game_manager.replay_moves("DDCE")
+    calculator = game_manager.comp_move_calc
+    built = count_bitboards(calculator, monkeypatch)
+    cell = calculator.computer_move()
+    assert 0 <= cell.y < 7
+    assert len(built) == 1
+
+
+def test_parity_filter_runs_once_per_position(monkeypatch):
+
+    import complogic
+
+    predictions = []
+    predict_winner = complogic.paritylogic.predict_winner
+    monkeypatch.setattr(complogic.paritylogic, "predict_winner", lambda board: predictions.append(1) or predict_winner(board))
+
+    game_manager = engine.new_game(6, 7, randomness_threshold=0.0)
+    calculator = game_manager.comp_move_calc
+    game_manager.replay_moves("DDCE")
+    calculator.computer_move()
+    assert predictions
+    predictions.clear()
+
+    calculator.computer_move()                             # same position
+    game_manager.replay_moves("DDEC")                      # its mirror image
+    calculator.computer_move()
+    assert not predictions
+
+
+@pytest.mark.parametrize("moves", ["CBFDFFAAECC", "EFBDBBGGCEE", "DDCE", "DDEC"])   # the first two keep 3 of 7 columns
+def test_cached_parity_filter_matches_parity_filter(moves):
+
+    game_manager = engine.new_game(6, 7)
+    calculator = game_manager.comp_move_calc
+    for position in ("CBFDFFAAECC", "DDCE", moves):        # fill the cache from one side, then read it from either
+        game_manager.replay_moves(position)
+        calculator.get_possible_moves()
+        cache_entry, board = calculator.get_cache_entry()
+        cells = [cell for cell in calculator.possible_moves if cell != "FULL"]
+        cached = calculator.cached_parity_filter(cells, cache_entry, board)
+    assert [cell.y for cell in cached] == [cell.y for cell in calculator.parity_filter(cells, board)]
@@ -0,0 +1,43 @@
+import os
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from cfenums import CellState
+from dataexport import TrainingDataExporter, load_shard, shard_paths
+
+
+def test_shard_size_comes_from_the_byte_budget(tmp_path):
+
+    small = TrainingDataExporter(str(tmp_path / "small"), 6, 7, shard_bytes=10_000)
+    big = TrainingDataExporter(str(tmp_path / "big"), 20, 26, shard_bytes=10_000)
+    assert small.buffer.nbytes <= 10_000 and big.buffer.nbytes <= 10_000
+    assert small.shard_size > big.shard_size
+
+
+def test_games_split_across_shards(tmp_path):
+
+    exporter = TrainingDataExporter(str(tmp_path), 6, 7, shard_bytes=46 * 5)     # 5 positions per shard
+    exporter.add_game([3, 3, 2, 2, 1, 1, 0], CellState.PLAYER1)
+    exporter.close()
+
+    shards = [load_shard(path) for path in shard_paths(str(tmp_path))]
+    assert [len(shard) for shard in shards] == [5, 2]
+    assert list(shards[0]["move"]) == [3, 3, 2, 2, 1]
+    assert list(shards[0]["result"][:2]) == [1, -1]
+
+
+def test_resume_drops_shards_written_after_the_checkpoint(tmp_path):
+
+    exporter = TrainingDataExporter(str(tmp_path), 6, 7)
+    exporter.add_game([3, 4], CellState.EMPTY)
+    saved = exporter.checkpoint()
+    exporter.add_game([2, 2], CellState.EMPTY)
+    exporter.close()                                          # shard written after the checkpoint, then a crash
+    assert len(shard_paths(str(tmp_path))) == 2
+
+    resumed = TrainingDataExporter(str(tmp_path), 6, 7, resume_index=saved["shard_index"])
+    assert resumed.shard_index == saved["shard_index"]
+    assert len(shard_paths(str(tmp_path))) == 1
+    assert os.path.basename(shard_paths(str(tmp_path))[0]) == "shard_00000.npy"
@@ -0,0 +1,38 @@
+import io
+
+import pytest
+
+from engineprotocol import CalculatorEngine, serve
+
+
+def test_go_node_limit_only_lasts_one_move():
+
+    calculator_engine = CalculatorEngine("focused:nodes=300")
+    calculator_engine.set_position("")
+    calculator_engine.go(None, 50, None)
+    assert calculator_engine.calculator.focused_search.node_budget == 300
+
+
+def test_go_depth_only_lasts_one_move():
+
+    calculator_engine = CalculatorEngine("search:depth=2")
+    calculator_engine.set_position("DD")
+    calculator_engine.go(None, None, 1)
+    assert calculator_engine.calculator.search_depth == 2
+
+
+def test_dead_draw_position_is_rejected():
+
+    calculator_engine = CalculatorEngine("heuristic")
+    calculator_engine.new_game(4, 4)
+    with pytest.raises(ValueError):
+        calculator_engine.set_position("CCDABDCDCDAB")         # 4 cells left, but nobody can make four any more
+
+
+def test_serve_reports_a_finished_position():
+
+    output = io.StringIO()
+    serve(CalculatorEngine("heuristic"), io.StringIO("newgame 4 4\nposition moves CCDABDCDCDAB\nposition moves AB\ngo\n"), output)
+    lines = output.getvalue().splitlines()
+    assert lines[0] == "error The game in that position is already over."
+    assert lines[-1].startswith("bestmove ")
@@ -0,0 +1,141 @@
+import logging
+
+import pytest
+
+import engine
+from cfenums import CellState, PlayerType, TurnToken
+
+
+@pytest.fixture(autouse=True)
+def quiet_logging():
+
+    logging.disable(logging.INFO)
+    yield
+    logging.disable(logging.NOTSET)
+
+
+def snapshot(game_manager) -> tuple:
+
+    grid = game_manager.grid
+    return ([[cell.cell_state for cell in row] for row in grid.grid_matrix], list(game_manager.column_heights),
+            game_manager.turn_token, game_manager.remaining_cells, game_manager.player1_moves,
+            game_manager.player2_moves, list(game_manager.move_columns))
+
+
+def test_undo_and_redo_round_trip():
+
+    np = pytest.importorskip("numpy")
+    game_manager = engine.new_game(6, 7)
+    game_manager.grid.numpy_grid                           # built now, so undo and redo have to keep it in sync
+    game_manager.replay_moves("DD")
+    before, numpy_before = snapshot(game_manager), game_manager.grid.numpy_grid.copy()
+    game_manager.replay_moves("DDCE")
+    after, numpy_after = snapshot(game_manager), game_manager.grid.numpy_grid.copy()
+
+    assert game_manager.undo_move().y == 4
+    assert game_manager.undo_move().y == 2
+    assert snapshot(game_manager) == before
+    assert np.array_equal(game_manager.grid.numpy_grid, numpy_before)
+
+    assert game_manager.redo_move().y == 2
+    assert game_manager.redo_move().y == 4
+    assert game_manager.redo_move() is None
+    assert snapshot(game_manager) == after
+    assert np.array_equal(game_manager.grid.numpy_grid, numpy_after)
+
+
+def test_undo_with_nothing_played():
+
+    game_manager = engine.new_game(6, 7)
+    assert game_manager.undo_move() is None
+    assert game_manager.turn_token == TurnToken.PLAYER1
+
+
+def test_new_move_clears_redo():
+
+    game_manager = engine.new_game(6, 7)
+    game_manager.replay_moves("DC")
+    game_manager.undo_move()
+    cell = game_manager.checking_system.check_column(0)
+    engine.play_cell(game_manager, cell)
+    assert game_manager.redo_move() is None
+    assert game_manager.move_columns == [3, 0]
+
+
+def test_replay_moves():
+
+    game_manager = engine.new_game(6, 7)
+    assert game_manager.replay_moves("AGAGAGA") == CellState.PLAYER1
+    assert game_manager.turn_token == TurnToken.PLAYER1         # the game is over, the turn stays with the winner
+    assert game_manager.replay_moves("dd") == CellState.EMPTY
+    assert (game_manager.move_columns, game_manager.remaining_cells) == ([3, 3], 40)
+
+
+@pytest.mark.parametrize("moves", ["DDZ", "DD1", "AAAAAAA"])      # not a column, not a letter, column A is full
+def test_replay_moves_rejects_bad_strings(moves):
+
+    game_manager = engine.new_game(6, 7)
+    game_manager.replay_moves("CC")
+    with pytest.raises(ValueError):
+        game_manager.replay_moves(moves)
+    assert game_manager.move_columns == []                      # left reset
+    assert game_manager.remaining_cells == 42
+    assert all(cell.cell_state == CellState.EMPTY for row in game_manager.grid.grid_matrix for cell in row)
+
+
+def test_undo_and_redo_at_the_move_prompt(monkeypatch):
+
+    game_manager = engine.new_game(6, 7)
+    game_manager.player1_type = PlayerType.HUMAN             # Player 2 stays a computer
+    game_manager.replay_moves("DE")
+    answers = iter(["undo", "undo", "redo", "undo", "c"])
+    monkeypatch.setattr("builtins.input", lambda prompt="": next(answers))
+    redraws = []
+    game_manager.human_move_calc.redraw = lambda: redraws.append(1)
+
+    cell = game_manager.human_move_calc.human_move()
+    assert cell.y == 2
+    assert game_manager.move_columns == []                  # the last undo took back both moves again
+    assert len(redraws) == 3                                # the second undo had nothing to take back
+
+
+def line_tracking(game_manager) -> tuple:
+
+    return [bytes(blockers) for blockers in game_manager.line_blockers], list(game_manager.live_lines)
+
+
+def test_blocked_position_is_a_dead_draw():
+
+    game_manager = engine.new_game(4, 4)
+    game_manager.replay_moves("CCDABDCDCDAB")              # 4 empty cells left, every line has both colors in it
+    assert game_manager.remaining_cells == 4
+    assert game_manager.live_lines == [0, 0, 0]
+    assert game_manager.is_dead_draw
+
+
+def test_open_position_is_not_a_dead_draw():
+
+    game_manager = engine.new_game(4, 4)
+    assert game_manager.live_lines == [0, 10, 10]           # 4 rows, 4 columns, 2 diagonals
+    game_manager.replay_moves("CCDABDCDCDA")               # one move before the dead draw above
+    assert not game_manager.is_dead_draw
+    game_manager.replay_moves("DD")
+    assert not game_manager.is_dead_draw
+
+
+def test_line_tracking_is_restored_by_undo():
+
+    game_manager = engine.new_game(6, 7)
+    game_manager.replay_moves("DDC")
+    before = line_tracking(game_manager)
+    game_manager.replay_moves("DDCEC")
+    game_manager.undo_move()
+    game_manager.undo_move()
+    assert line_tracking(game_manager) == before
+
+    game_manager = engine.new_game(4, 4)
+    game_manager.replay_moves("CCDABDCDCDAB")
+    game_manager.undo_move()
+    assert not game_manager.is_dead_draw
+    game_manager.redo_move()
+    assert game_manager.is_dead_draw
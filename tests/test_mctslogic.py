@@ -0,0 +1,20 @@
+import pytest
+
+from bitboard import BitBoard
+from mctslogic import MCTSEngine
+
+
+@pytest.mark.parametrize("playouts, time_limit", [(0, None), (None, 0.0), (0, 0.0)])
+def test_no_budget_still_picks_a_legal_move(playouts, time_limit):
+
+    board = BitBoard(6, 7)
+    engine = MCTSEngine(playouts, time_limit, seed=1)
+    assert engine.choose_move(board) in board.legal_columns()
+    assert engine.last_playouts == 1
+
+
+def test_playout_count_is_exact():
+
+    engine = MCTSEngine(100, seed=1)
+    engine.choose_move(BitBoard(6, 7))
+    assert engine.last_playouts == 100
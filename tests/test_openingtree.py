@@ -0,0 +1,73 @@
+import pytest
+
+from cfenums import CellState
+from openingtree import OpeningTree, MAGIC, save_merged
+
+
+def make_tree() -> OpeningTree:
+
+    tree = OpeningTree(6, 7, 3)
+    tree.add_game([3, 3, 2, 4, 1], CellState.PLAYER1)
+    tree.add_game([3, 2, 2], CellState.PLAYER2)
+    tree.add_game([0], CellState.EMPTY)
+    return tree
+
+
+def test_add_game_counts_the_first_depth_moves():
+
+    tree = make_tree()
+    assert tree.line_stats("").games == 3
+    assert tree.line_stats("D") == ("D", 1, 1, 0)
+    assert tree.line_stats("DDC").player1_wins == 1
+    assert tree.find("DDCE") is None                       # deeper than the tree
+    assert [stats.line for stats in tree.continuations("D")] == ["DC", "DD"]
+
+
+def test_round_trip():
+
+    tree = make_tree()
+    loaded = OpeningTree.from_bytes(tree.to_bytes())
+    assert (loaded.rows, loaded.columns, loaded.depth) == (6, 7, 3)
+    assert loaded.children == tree.children
+    assert loaded.counts == tree.counts
+    assert OpeningTree.from_dict(tree.to_dict()).counts == tree.counts
+
+
+@pytest.mark.parametrize("cut", [len(MAGIC), len(MAGIC) + 5, -1])
+def test_short_file_raises_value_error(cut):
+
+    with pytest.raises(ValueError):
+        OpeningTree.from_bytes(make_tree().to_bytes()[:cut])
+
+
+def test_merge_adds_counts_and_new_lines():
+
+    tree, other = make_tree(), OpeningTree(6, 7, 3)
+    other.add_game([3, 3, 2], CellState.PLAYER2)
+    other.add_game([6, 6], CellState.PLAYER1)
+    tree.merge(other)
+    assert tree.line_stats("").games == 5
+    assert tree.line_stats("DDC") == ("DDC", 1, 1, 0)
+    assert tree.line_stats("GG").player1_wins == 1
+
+    with pytest.raises(ValueError):
+        tree.merge(OpeningTree(6, 7, 4))
+
+
+def test_save_merged(tmp_path):
+
+    path = str(tmp_path / "tree.cft")
+    save_merged(make_tree(), path)
+    total, saved_to = save_merged(make_tree(), path)
+    assert saved_to == path
+    assert OpeningTree.load(path).line_stats("").games == total.line_stats("").games == 6
+
+
+def test_save_merged_keeps_an_unreadable_file(tmp_path):
+
+    path = tmp_path / "tree.cft"
+    path.write_bytes(MAGIC + b"\x01")
+    total, saved_to = save_merged(make_tree(), str(path))
+    assert saved_to == str(tmp_path / "tree.1.cft")
+    assert path.read_bytes() == MAGIC + b"\x01"            # left alone
+    assert OpeningTree.load(saved_to).line_stats("").games == 3
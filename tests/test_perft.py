@@ -0,0 +1,47 @@
+import logging
+
+import pytest
+
+from bitboard import BitBoard
+from perft import GridPerft, bitboard_perft, setup_position
+
+PERFT_6X7 = [1, 7, 49, 343, 2401, 16807, 117649, 823536]        # index = depth
+
+
+@pytest.fixture(autouse=True)
+def quiet_logging():
+
+    logging.disable(logging.INFO)                          # the game's debug logging, same as the perft CLI
+    yield
+    logging.disable(logging.NOTSET)
+
+
+@pytest.mark.parametrize("depth", range(8))
+def test_bitboard_perft_6x7(depth):
+
+    assert bitboard_perft(BitBoard(6, 7), depth).nodes == PERFT_6X7[depth]
+
+
+@pytest.mark.parametrize("depth", range(5))
+def test_grid_perft_6x7(depth):                            # the grid is much slower, the small depths are enough
+
+    game_manager, _ = setup_position(6, 7, "")
+    assert GridPerft(game_manager).perft(depth).nodes == PERFT_6X7[depth]
+
+
+@pytest.mark.parametrize("moves", ["AGAGA", "DDCEF", "AAAAAABBB"])
+def test_grid_and_bitboard_agree(moves):
+
+    game_manager, board = setup_position(6, 7, moves)
+    grid_result = GridPerft(game_manager).perft(3, divide=True)
+    bit_result = bitboard_perft(board, 3, divide=True)
+    assert grid_result.divide == bit_result.divide
+    assert grid_result.nodes == bit_result.nodes
+
+
+def test_finished_games_are_leaves():
+
+    # Player 1 wins by playing A, so that line is one leaf however deep the count goes
+    board = BitBoard.from_moves(6, 7, [0, 6, 0, 6, 0, 5])
+    assert bitboard_perft(board, 1).nodes == 7
+    assert bitboard_perft(board, 2, divide=True).divide[0] == 1
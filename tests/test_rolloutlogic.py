@@ -0,0 +1,50 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from bitboard import BitBoard
+from rolloutlogic import batch_rollouts, best_rollout_column, numpy_from_bitboard
+
+
+def test_counts_add_up():
+
+    stats = batch_rollouts(np.zeros((6, 7), dtype=np.int8), playouts_per_move=50, bias=1.0, seed=1)
+    assert sorted(stats) == list(range(7))
+    for column_stats in stats.values():
+        assert column_stats.wins + column_stats.draws + column_stats.losses == 50
+
+
+def test_finds_the_immediate_win():
+
+    board = BitBoard(6, 7)
+    for col in (0, 6, 0, 6, 0, 5):                          # player 1 has three in column A
+        board.play(col)
+    grid = numpy_from_bitboard(board)
+    assert best_rollout_column(grid, playouts_per_move=20, seed=1) == 0
+    assert batch_rollouts(grid, playouts_per_move=20, seed=1)[0].wins == 20
+
+
+def test_full_columns_are_skipped():
+
+    grid = np.zeros((4, 4), dtype=np.int8)
+    grid[:, 1] = [1, 2, 1, 2]
+    assert 1 not in batch_rollouts(grid, playouts_per_move=10, seed=1)
+
+
+@pytest.mark.parametrize("settings", [{"playouts_per_move": 0}, {"bias": -0.5}, {"bias": float("nan")},
+                                      {"player_to_move": 3}])
+def test_bad_settings(settings):
+
+    with pytest.raises(ValueError):
+        batch_rollouts(np.zeros((6, 7), dtype=np.int8), **settings)
+
+
+def test_analysis_rollout_scores():
+
+    from analysis import rollout_scores
+
+    scores = rollout_scores("AGAGA", playouts_per_move=20, seed=1)        # Player 2 has to block column A
+    assert sorted(scores) == list("ABCDEFG")
+    assert all(0.0 <= score <= 1.0 for score in scores.values())
+    assert max(scores, key=scores.get) == "A"
+    assert rollout_scores("AGAGAGA") == {}                  # already won
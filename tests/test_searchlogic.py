@@ -0,0 +1,53 @@
+import searchlogic
+from bitboard import BitBoard
+
+
+def test_measure_speedup_starts_the_workers_before_timing(monkeypatch):
+
+    running_at_start = []
+    timed_search = searchlogic.parallel_search
+
+    def parallel_search(board, depth, workers=None):
+        running_at_start.append(len(searchlogic._pool._processes))
+        return timed_search(board, depth, workers)
+
+    monkeypatch.setattr(searchlogic, "parallel_search", parallel_search)
+    try:
+        report = searchlogic.measure_speedup(BitBoard(6, 7), 3, workers=2)
+    finally:
+        searchlogic.shutdown_pool()
+
+    assert running_at_start == [2, 2]                      # the warm-up search, then the timed one
+    assert report["workers"] == 2
+    assert report["same_move"]
+
+
+def test_full_focus_columns_are_not_a_draw():
+
+    # column A is full, and Player 1 (to move) wins in column B
+    board = BitBoard.from_moves(6, 7, [0, 0, 0, 0, 0, 0, 1, 2, 1, 2, 1, 2])
+    search = searchlogic.NegamaxSearch(3)
+    search.move_order = [0]
+    assert search.negamax(board, 2, -searchlogic.INFINITY, searchlogic.INFINITY) == searchlogic.WIN_SCORE - 12
+
+
+def test_focused_search_does_not_share_mirror_entries():
+
+    board = BitBoard.from_moves(6, 7, [6, 3, 5])
+    assert board.is_mirrored()
+    search = searchlogic.NegamaxSearch(3)
+    search.move_order = [6, 5, 4]
+    search.negamax(board, 2, -searchlogic.INFINITY, searchlogic.INFINITY)
+    assert board.key() in search.transposition_table
+    assert board.canonical_key() not in search.transposition_table
+
+    search = searchlogic.NegamaxSearch(3)                  # the plain search does share them
+    search.negamax(board, 2, -searchlogic.INFINITY, searchlogic.INFINITY)
+    assert board.canonical_key() in search.transposition_table
+
+
+def test_focused_search_picks_a_legal_move():
+
+    board = BitBoard.from_moves(6, 7, [3, 3, 2, 4])
+    result = searchlogic.FocusedSearch(2000).choose_move(board, board.history)
+    assert board.can_play(result.column)
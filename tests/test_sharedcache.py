@@ -0,0 +1,55 @@
+import pytest
+
+import engine
+from bitboard import BitBoard
+from complogic import SHARED_SEARCH_RESULT
+from sharedcache import SharedPositionCache, FINGERPRINT_SIZE, PAYLOAD_SIZE, SLOT_SIZE
+
+
+@pytest.fixture
+def cache():
+
+    cache = SharedPositionCache.create(64)
+    yield cache
+    cache.close()
+
+
+def test_put_and_get(cache):
+
+    cache.put(b"position", b"\x03\x07")
+    assert cache.get(b"position") == b"\x03\x07".ljust(PAYLOAD_SIZE, b"\0")
+    assert cache.get(b"other position") is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_attached_cache_sees_the_same_slots(cache):
+
+    cache.put(b"position", b"\x01")
+    attached = SharedPositionCache.attach(cache.name, cache.slots)
+    try:
+        assert attached.get(b"position") is not None
+    finally:
+        attached.close()
+
+
+def test_corrupt_slot_is_a_miss(cache):
+
+    cache.put(b"position", b"\x03\x07")
+    fingerprint, selector = SharedPositionCache.hash_key(b"position")
+    start = (selector % cache.slots) * SLOT_SIZE + FINGERPRINT_SIZE
+    cache.buffer[start] ^= 0xFF                            # what a reader would see halfway through a write
+    assert cache.get(b"position") is None
+
+
+def test_payload_too_big(cache):
+
+    with pytest.raises(ValueError):
+        cache.put(b"position", bytes(PAYLOAD_SIZE + 1))
+
+
+def test_shared_key_takes_deep_settings():
+
+    calculator = engine.new_game(6, 7).comp_move_calc
+    board = BitBoard(6, 7)
+    keys = {calculator.shared_key(SHARED_SEARCH_RESULT, board, depth) for depth in (4, 260, 300)}
+    assert len(keys) == 3
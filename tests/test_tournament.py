@@ -0,0 +1,100 @@
+import logging
+import math
+import random
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import tournament
+from tournament import (SPRTSettings, elo_from_score, elo_with_error, make_pairings, parse_engine_config,
+                        run_pairing, sprt_bounds, sprt_llr)
+
+
+@pytest.fixture(autouse=True)
+def quiet_logging():
+
+    logging.disable(logging.INFO)
+    yield
+    logging.disable(logging.NOTSET)
+
+
+##########   Elo   ###########
+
+def test_elo_from_score():
+
+    assert elo_from_score(0.5) == 0
+    assert elo_from_score(0.75) == pytest.approx(190.85, abs=0.01)       # 400 * log10(3)
+    assert elo_from_score(0.25) == pytest.approx(-190.85, abs=0.01)
+    assert math.isfinite(elo_from_score(1.0)) and math.isfinite(elo_from_score(0.0))
+
+
+def test_elo_with_error():
+
+    assert elo_with_error(0, 0, 0) == (0.0, math.inf)
+
+    elo, margin = elo_with_error(60, 20, 20)
+    assert elo == pytest.approx(elo_from_score(0.7))
+    assert elo_with_error(20, 20, 60) == pytest.approx((-elo, margin))  # same result from the other side
+    assert elo_with_error(600, 200, 200)[1] < margin / 3                 # 10x the games, about a third of the error
+
+
+##########   SPRT   ###########
+
+def test_sprt_bounds():
+
+    lower, upper = sprt_bounds(SPRTSettings(alpha=0.05, beta=0.05))
+    assert (lower, upper) == pytest.approx((-math.log(19), math.log(19)))
+
+
+@pytest.mark.parametrize("wins, draws, losses, expected", [
+    (300, 100, 100, "H1"),          # clearly stronger
+    (1000, 0, 1000, "H0"),          # dead even, H0 (0 Elo) is much more likely than H1 (30 Elo)
+    (110, 0, 100, None),            # not enough games to tell yet
+])
+def test_sprt_accept_and_reject(wins, draws, losses, expected):
+
+    lower, upper = sprt_bounds(SPRTSettings())
+    llr = sprt_llr(wins, draws, losses, 0.0, 30.0)
+    result = "H1" if llr >= upper else "H0" if llr <= lower else None
+    assert result == expected
+
+
+def test_sprt_llr_without_decisive_games():
+
+    assert sprt_llr(0, 0, 0, 0.0, 30.0) == 0.0
+    assert sprt_llr(0, 50, 0, 0.0, 30.0) == 0.0
+
+
+##########   Pairings and scheduling   ###########
+
+def test_make_pairings():
+
+    configs = [parse_engine_config(text) for text in ("heuristic", "search:depth=2", "mcts:playouts=50")]
+    assert len(make_pairings(configs, "round-robin")) == 3
+    assert make_pairings(configs, "gauntlet") == [(configs[0], configs[1]), (configs[0], configs[2])]
+    with pytest.raises(ValueError):
+        make_pairings(configs[:1], "round-robin")
+    with pytest.raises(ValueError):
+        make_pairings(configs, "swiss")
+
+
+def test_run_pairing_plays_max_games():
+
+    config_a, config_b = parse_engine_config("heuristic"), parse_engine_config("heuristic:randomness=0.5,name=random")
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        result = run_pairing(pool, 1, config_a, config_b, 6, 7, 6, None, random.Random(1))
+    assert result.wins + result.draws + result.losses == 6                 # 3 pairs, each engine moves first once
+    assert (result.engine_a, result.engine_b, result.status) == ("heuristic", "random", "max games")
+
+
+def test_same_seed_plays_the_same_games():
+
+    config_a, config_b = parse_engine_config("mcts:playouts=40"), parse_engine_config("heuristic")
+    tournament._matches.clear()
+    games = []
+    for _ in range(2):                                     # the second run reuses the match, like a worker does
+        tournament._play_game_pair(config_a, config_b, 6, 7, 1234)
+        match = tournament._matches[(config_a, config_b, 6, 7)]
+        games.append(list(match.game_manager.move_columns))
+    tournament._matches.clear()
+    assert games[0] == games[1]
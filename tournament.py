@@ -0,0 +1,346 @@
+"""
+Module Name: tournament.py
+
+    Holds the engine tournament runner. It plays round-robin or gauntlet matches between different computer
+    engine configurations (heuristic randomness, search depth, MCTS budget...), alternates who moves first,
+    runs the games on a process pool and reports the Elo difference with error bars. \n
+    Each pairing can stop early with a sequential probability ratio test (SPRT) once the result is clear.
+
+    Usage: python tournament.py --engine heuristic --engine heuristic:randomness=0.05 --engine search:depth=4
+"""
+
+from __future__ import annotations
+from typing import *
+import argparse
+import itertools
+import logging
+import math
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+from cfenums import CellState, EngineType, TurnToken
+from gamemanager import GameManager
+from complogic import ComputerMoveCalculator
+import engine
+import sharedcache
+import beesutils
+
+
+class EngineConfig(NamedTuple):
+    """ Settings for one computer player. Same settings the GameManager holds for the interactive game. """
+
+    name: str
+    engine_type: EngineType = EngineType.HEURISTIC
+    randomness_threshold: float = 0.2
+    search_depth: int = 6
+    mcts_playouts: Optional[int] = 2000
+    mcts_time_limit: Optional[float] = None
+    search_node_budget: int = 20_000
+
+
+class SPRTSettings(NamedTuple):
+    """ H0: engine A is elo0 stronger than B. H1: engine A is elo1 stronger than B.
+    alpha and beta are the false positive / false negative rates. """
+
+    elo0: float = 0.0
+    elo1: float = 30.0
+    alpha: float = 0.05
+    beta: float = 0.05
+
+
+class PairingResult(NamedTuple):
+    """ Result of one pairing, counted from engine A's point of view. """
+
+    engine_a: str
+    engine_b: str
+    wins: int
+    draws: int
+    losses: int
+    elo: float
+    margin: float                  # 95% error bar on the Elo
+    llr: float
+    status: str                    # "H1 accepted", "H0 accepted" or "max games"
+
+
+##########   Engine configs   ###########
+
+def parse_engine_config(text: str) -> EngineConfig:
+    """ Builds an EngineConfig from a string like 'search:depth=4' or 'mcts:playouts=500,name=mcts500'. \n
+    Engine types: heuristic, search, mcts, focused. Options: randomness, depth, playouts, time, nodes, name. """
+
+    engine_name, _, options = text.partition(":")
+    try:
+        engine_type = {"heuristic": EngineType.HEURISTIC, "search": EngineType.SEARCH, "mcts": EngineType.MCTS,
+                       "focused": EngineType.FOCUSED}[engine_name.lower()]
+    except KeyError:
+        raise ValueError(f"Unknown engine type: {engine_name}. Choose from heuristic, search, mcts, focused.")
+
+    settings = {"name": text, "engine_type": engine_type}
+    for option in filter(None, options.split(",")):
+        key, _, value = option.partition("=")
+        if key == "name":
+            settings["name"] = value
+        elif key == "randomness":
+            settings["randomness_threshold"] = float(value)
+        elif key == "depth":
+            settings["search_depth"] = int(value)
+        elif key == "playouts":
+            settings["mcts_playouts"] = int(value)
+        elif key == "time":
+            settings["mcts_playouts"] = None
+            settings["mcts_time_limit"] = float(value)
+        elif key == "nodes":
+            settings["search_node_budget"] = int(value)
+        else:
+            raise ValueError(f"Unknown engine option: {key}")
+
+    return EngineConfig(**settings)
+
+
+def build_calculator(game_manager: GameManager, config: EngineConfig) -> ComputerMoveCalculator:
+    """ ComputerMoveCalculator reads its settings from the GameManager when it's created, so we set them first. """
+
+    game_manager.engine_type = config.engine_type
+    game_manager.randomness_threshold = config.randomness_threshold
+    game_manager.search_depth = config.search_depth
+    game_manager.search_workers = 1                    # the tournament already runs one game per process
+    game_manager.mcts_playouts = config.mcts_playouts
+    game_manager.mcts_time_limit = config.mcts_time_limit
+    game_manager.search_node_budget = config.search_node_budget
+    return ComputerMoveCalculator(game_manager)
+
+
+##########   Headless match   ###########
+
+class HeadlessMatch:
+    """ Plays computer vs computer games with no display and no input. Same steps as game_loop in connect_four.py. """
+
+    def __init__(self, config_a: EngineConfig, config_b: EngineConfig, rows: int, columns: int):
+
+        self.game_manager = engine.new_game(rows, columns)
+        self.grid = self.game_manager.grid
+        self.calculators = {
+            "A": build_calculator(self.game_manager, config_a),
+            "B": build_calculator(self.game_manager, config_b),
+        }
+
+    def seed(self, seed: int) -> None:
+        """ The heuristic AI uses the random module, which the caller seeds. MCTS has its own random number
+        generator, so each MCTS engine is reseeded here (A and B get different streams). """
+
+        for offset, calculator in enumerate(self.calculators.values()):
+            if calculator.mcts_engine is not None:
+                calculator.mcts_engine.reseed(seed + offset)
+
+    def play_game(self, a_moves_first: bool) -> CellState:
+        """ Plays one game and returns the winning engine as a CellState of the seat it sat in. """
+
+        grid = self.grid
+        game_manager = self.game_manager
+        grid.reset_grid()
+        game_manager.reset_game(grid.total_cells)
+
+        seats = {TurnToken.PLAYER1: "A" if a_moves_first else "B",
+                 TurnToken.PLAYER2: "B" if a_moves_first else "A"}
+
+        while True:
+            calculator = self.calculators[seats[game_manager.turn_token]]
+            current_cell = calculator.computer_move()
+
+            winner = engine.play_cell(game_manager, current_cell)
+            if winner != CellState.EMPTY:
+                return winner
+            if game_manager.remaining_cells == 0 or game_manager.is_dead_draw:
+                return CellState.EMPTY
+            game_manager.switch_player()
+
+
+_matches: Dict[tuple, HeadlessMatch] = {}                 # one per pairing in each worker process, reused between tasks
+
+
+def _play_game_pair(config_a: EngineConfig, config_b: EngineConfig, rows: int, columns: int, seed: int) -> Tuple[int, int, int]:
+    """ Worker task. Plays 2 games, one with each engine moving first. Returns (A wins, draws, B wins). """
+
+    random.seed(seed)
+    match_key = (config_a, config_b, rows, columns)
+    if match_key not in _matches:
+        _matches.clear()
+        _matches[match_key] = HeadlessMatch(config_a, config_b, rows, columns)
+    match = _matches[match_key]
+    match.seed(seed)                                      # so the same seed replays the same 2 games
+
+    a_wins, draws, b_wins = 0, 0, 0
+    for a_moves_first in (True, False):
+        winner = match.play_game(a_moves_first)
+        if winner == CellState.EMPTY:
+            draws += 1
+        elif (winner == CellState.PLAYER1) == a_moves_first:
+            a_wins += 1
+        else:
+            b_wins += 1
+    return a_wins, draws, b_wins
+
+
+##########   Statistics   ###########
+
+def elo_from_score(score: float) -> float:
+
+    score = min(max(score, 1e-6), 1 - 1e-6)            # a perfect score would be infinite Elo
+    return -400 * math.log10(1 / score - 1)
+
+
+def elo_with_error(wins: int, draws: int, losses: int) -> Tuple[float, float]:
+    """ Returns (Elo difference, 95% error margin) from A's point of view. """
+
+    games = wins + draws + losses
+    if games == 0:
+        return 0.0, float("inf")
+
+    score = (wins + 0.5 * draws) / games
+    variance = (wins * (1 - score) ** 2 + draws * (0.5 - score) ** 2 + losses * score ** 2) / games
+    std_error = math.sqrt(variance / games)
+
+    elo = elo_from_score(score)
+    low = elo_from_score(score - 1.96 * std_error)
+    high = elo_from_score(score + 1.96 * std_error)
+    return elo, (high - low) / 2
+
+
+def sprt_llr(wins: int, draws: int, losses: int, elo0: float, elo1: float) -> float:
+    """ Log-likelihood ratio of H1 (elo1) vs H0 (elo0), using the normal approximation of the game scores. """
+
+    games = wins + draws + losses
+    if games == 0 or wins + losses == 0:
+        return 0.0
+
+    score = (wins + 0.5 * draws) / games
+    variance = (wins * (1 - score) ** 2 + draws * (0.5 - score) ** 2 + losses * score ** 2) / games
+    if variance == 0:
+        return 0.0
+
+    score0 = 1 / (1 + 10 ** (-elo0 / 400))
+    score1 = 1 / (1 + 10 ** (-elo1 / 400))
+    return games * (score1 - score0) * (2 * score - score0 - score1) / (2 * variance)
+
+
+def sprt_bounds(settings: SPRTSettings) -> Tuple[float, float]:
+
+    lower = math.log(settings.beta / (1 - settings.alpha))
+    upper = math.log((1 - settings.beta) / settings.alpha)
+    return lower, upper
+
+
+##########   Tournament runner   ###########
+
+def run_pairing(pool: ProcessPoolExecutor, workers: int, config_a: EngineConfig, config_b: EngineConfig,
+                rows: int, columns: int, max_games: int, sprt: Optional[SPRTSettings], rng: random.Random) -> PairingResult:
+    """ Plays up to max_games between A and B. Only a couple of tasks per worker are in flight at a time,
+    so an SPRT stop doesn't leave a big queue of games that were already paid for. """
+
+    wins, draws, losses = 0, 0, 0
+    games_submitted = 0
+    pending = set()
+    status = "max games"
+    llr = 0.0
+    lower, upper = sprt_bounds(sprt) if sprt else (-math.inf, math.inf)
+
+    while True:
+        while games_submitted < max_games and len(pending) < workers * 2:
+            pending.add(pool.submit(_play_game_pair, config_a, config_b, rows, columns, rng.getrandbits(32)))
+            games_submitted += 2
+
+        if not pending:
+            break
+
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            a_wins, pair_draws, b_wins = future.result()
+            wins += a_wins
+            draws += pair_draws
+            losses += b_wins
+
+        if sprt:
+            llr = sprt_llr(wins, draws, losses, sprt.elo0, sprt.elo1)
+            if llr >= upper or llr <= lower:
+                status = "H1 accepted" if llr >= upper else "H0 accepted"
+                for future in pending:
+                    future.cancel()
+                break
+
+    elo, margin = elo_with_error(wins, draws, losses)
+    return PairingResult(config_a.name, config_b.name, wins, draws, losses, elo, margin, llr, status)
+
+
+def make_pairings(configs: List[EngineConfig], mode: str) -> List[Tuple[EngineConfig, EngineConfig]]:
+    """ mode: 'round-robin' plays every pair, 'gauntlet' plays the first config against each of the others. """
+
+    if len(configs) < 2:
+        raise ValueError("A tournament needs at least 2 engine configs.")
+
+    if mode == "round-robin":
+        return list(itertools.combinations(configs, 2))
+    elif mode == "gauntlet":
+        return [(configs[0], other) for other in configs[1:]]
+    raise ValueError(f"Invalid tournament mode: {mode}. Choose 'round-robin' or 'gauntlet'.")
+
+
+def run_tournament(configs: List[EngineConfig], mode: str = "round-robin", rows: int = 6, columns: int = 7,
+                   max_games: int = 1000, workers: Optional[int] = None, sprt: Optional[SPRTSettings] = SPRTSettings(),
+                   seed: Optional[int] = None, cache_slots: int = sharedcache.DEFAULT_SLOTS) -> List[PairingResult]:
+    """ mode: 'round-robin' plays every pair, 'gauntlet' plays the first config against each of the others. \n
+    Every worker attaches to one SharedPositionCache of cache_slots slots, so a position one worker has worked out
+    is a cache hit for all of them. cache_slots=0 turns the shared cache off. """
+
+    pairings = make_pairings(configs, mode)
+    workers = workers or os.cpu_count() or 1
+    rng = random.Random(seed)
+    results = []
+
+    shared = sharedcache.SharedPositionCache.create(cache_slots) if cache_slots > 0 else None
+    pool_options = {"initializer": sharedcache.attach_shared_cache, "initargs": (shared.name, cache_slots)} if shared else {}
+
+    try:
+        with ProcessPoolExecutor(max_workers=workers, **pool_options) as pool:
+            for config_a, config_b in pairings:
+                print(beesutils.color(f"Playing {config_a.name} vs {config_b.name}...", "cyan"))
+                result = run_pairing(pool, workers, config_a, config_b, rows, columns, max_games, sprt, rng)
+                print_pairing(result)
+                results.append(result)
+    finally:
+        if shared is not None:
+            shared.close()                             # the workers are gone by now, this frees the memory
+
+    return results
+
+
+def print_pairing(result: PairingResult) -> None:
+
+    games = result.wins + result.draws + result.losses
+    print(f"{result.engine_a} vs {result.engine_b}: +{result.wins} ={result.draws} -{result.losses} ({games} games) | "
+          f"Elo {result.elo:+.1f} ± {result.margin:.1f} | LLR {result.llr:.2f} | {beesutils.color(result.status, 'green')}")
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Play a tournament between computer engine configurations.")
+    parser.add_argument("--engine", action="append", required=True,
+                        help="Engine config, e.g. 'heuristic:randomness=0.1', 'search:depth=4', 'mcts:time=0.2'. Repeat for each engine.")
+    parser.add_argument("--mode", choices=["round-robin", "gauntlet"], default="round-robin")
+    parser.add_argument("--rows", type=int, default=6)
+    parser.add_argument("--columns", type=int, default=7)
+    parser.add_argument("--games", type=int, default=1000, help="Maximum games per pairing.")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--no-sprt", action="store_true", help="Always play the maximum number of games.")
+    parser.add_argument("--elo0", type=float, default=0.0)
+    parser.add_argument("--elo1", type=float, default=30.0)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--cache-slots", type=int, default=sharedcache.DEFAULT_SLOTS,
+                        help="Slots in the position cache shared by all workers (0 = no shared cache).")
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)                      # keep the engines quiet
+    engine_configs = [parse_engine_config(text) for text in args.engine]
+    sprt_settings = None if args.no_sprt else SPRTSettings(args.elo0, args.elo1)
+    run_tournament(engine_configs, args.mode, args.rows, args.columns, args.games, args.workers, sprt_settings, args.seed,
+                   args.cache_slots)